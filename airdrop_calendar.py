@@ -0,0 +1,112 @@
+from datetime import date, datetime, time as dt_time, timedelta
+from typing import Dict, List, Optional, Tuple
+
+import pytz
+from pymongo import UpdateOne
+
+from database import get_collection
+from utils import utc_instant
+
+
+# Longest range one calendar request may cover
+MAX_CALENDAR_DAYS = 92
+
+
+def resolve_timezone(tz_name: str):
+    try:
+        return pytz.timezone(tz_name)
+    except pytz.UnknownTimeZoneError:
+        raise ValueError(f"Unknown timezone: {tz_name}")
+
+
+def calendar_range(tz, start: Optional[date], end: Optional[date]) -> Tuple[date, date]:
+    """Local date range to aggregate, defaulting to the viewer's current month"""
+    today = datetime.now(tz).date()
+    start = start or (end or today).replace(day=1)
+    if end is None:
+        next_month = (start.replace(day=28) + timedelta(days=4)).replace(day=1)
+        end = next_month - timedelta(days=1)
+    if end < start:
+        raise ValueError("'to' must not be before 'from'")
+    if (end - start).days + 1 > MAX_CALENDAR_DAYS:
+        raise ValueError(f"Calendar range is limited to {MAX_CALENDAR_DAYS} days")
+    return start, end
+
+
+def utc_bounds(tz, start: date, end: date) -> Tuple[datetime, datetime]:
+    """UTC instants of local midnight on `start` and the day after `end`"""
+    lower = tz.localize(datetime.combine(start, dt_time(0, 0)))
+    upper = tz.localize(datetime.combine(end + timedelta(days=1), dt_time(0, 0)))
+    return (
+        lower.astimezone(pytz.utc).replace(tzinfo=None),
+        upper.astimezone(pytz.utc).replace(tzinfo=None),
+    )
+
+
+def calendar_pipeline(tz_name: str, lower: datetime, upper: datetime, per_day: int) -> List[Dict]:
+    """Bucket events into local days of `tz_name`; the $match is served by deleted_event_at"""
+    return [
+        {"$match": {"deleted": False, "event_at": {"$gte": lower, "$lt": upper}}},
+        {"$sort": {"event_at": 1}},
+        {"$group": {
+            "_id": {"$dateTrunc": {"date": "$event_at", "unit": "day", "timezone": tz_name}},
+            "count": {"$sum": 1},
+            "items": {"$push": {
+                "id": {"$toString": "$_id"},
+                "project": "$project",
+                "alias": "$alias",
+                "local_time": {"$dateToString": {"date": "$event_at", "format": "%H:%M", "timezone": tz_name}},
+                "event_at": "$event_at",
+                "phase": "$phase",
+                "image_url": "$image_url",
+            }},
+        }},
+        {"$sort": {"_id": 1}},
+        {"$project": {
+            "_id": 0,
+            "date": {"$dateToString": {"date": "$_id", "format": "%Y-%m-%d", "timezone": tz_name}},
+            "count": 1,
+            "items": {"$slice": ["$items", per_day]},
+        }},
+    ]
+
+
+async def get_airdrop_calendar(
+    tz_name: str,
+    start: Optional[date] = None,
+    end: Optional[date] = None,
+    per_day: int = 20,
+) -> Dict:
+    """Per-local-day airdrop counts and summaries as seen from `tz_name`"""
+    tz = resolve_timezone(tz_name)
+    start, end = calendar_range(tz, start, end)
+    lower, upper = utc_bounds(tz, start, end)
+
+    days = await get_collection().aggregate(
+        calendar_pipeline(tz.zone, lower, upper, per_day)
+    ).to_list(length=None)
+    return {
+        "tz": tz.zone,
+        "start": start,
+        "end": end,
+        "total": sum(day["count"] for day in days),
+        "days": days,
+    }
+
+
+async def backfill_event_at() -> int:
+    """Derive `event_at` for airdrops stored before it existed"""
+    collection = get_collection()
+    cursor = collection.find(
+        {"event_at": {"$exists": False}, "time_iso": {"$type": "string"}},
+        {"time_iso": 1}
+    )
+    updates = []
+    async for doc in cursor:
+        try:
+            updates.append(UpdateOne({"_id": doc["_id"]}, {"$set": {"event_at": utc_instant(doc["time_iso"])}}))
+        except ValueError:
+            print(f"Skipping event_at backfill for {doc['_id']}: invalid time_iso")
+    if updates:
+        await collection.bulk_write(updates, ordered=False)
+    return len(updates)
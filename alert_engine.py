@@ -0,0 +1,224 @@
+import asyncio
+import os
+from bisect import bisect_left, bisect_right
+from collections import OrderedDict, deque
+from datetime import datetime, timedelta
+from typing import Deque, Dict, List, Optional, Tuple
+
+import httpx
+from bson import ObjectId
+
+from database import get_collection
+from valuation import latest_prices
+
+
+ALERTS_COLLECTION = "price_alerts"
+
+# Recently delivered (rule, tick) pairs remembered for dedup
+DEDUP_SIZE = 10000
+
+
+def get_alert_collection():
+    return get_collection(ALERTS_COLLECTION)
+
+
+def serialize_alert(doc: Dict) -> Dict:
+    doc["id"] = str(doc.pop("_id"))
+    return doc
+
+
+class ThresholdBook:
+    """Thresholds of one coin in sorted order, parallel to their rule ids"""
+
+    def __init__(self):
+        self.prices: List[float] = []
+        self.rule_ids: List[str] = []
+
+    def add(self, threshold: float, rule_id: str) -> None:
+        position = bisect_right(self.prices, threshold)
+        self.prices.insert(position, threshold)
+        self.rule_ids.insert(position, rule_id)
+
+    def remove(self, threshold: float, rule_id: str) -> None:
+        position = bisect_left(self.prices, threshold)
+        while position < len(self.prices) and self.prices[position] == threshold:
+            if self.rule_ids[position] == rule_id:
+                del self.prices[position]
+                del self.rule_ids[position]
+                return
+            position += 1
+
+    def crossed_up(self, previous: float, price: float) -> List[str]:
+        """Rules with previous < threshold <= price"""
+        return self.rule_ids[bisect_right(self.prices, previous):bisect_right(self.prices, price)]
+
+    def crossed_down(self, previous: float, price: float) -> List[str]:
+        """Rules with price <= threshold < previous"""
+        return self.rule_ids[bisect_left(self.prices, price):bisect_left(self.prices, previous)]
+
+
+class PriceAlertEngine:
+    """
+    Evaluates price-alert rules as coin ticks arrive. Each coin keeps one
+    sorted threshold book for upward and one for downward rules, so a tick
+    only bisects to the thresholds it crossed since the previous tick.
+    Triggered alerts go through a queue to the webhook sink (or just the
+    local event log when no webhook is configured).
+    """
+
+    def __init__(self, webhook_url: Optional[str] = None, default_cooldown: float = 300.0,
+                 max_events: int = 500, timeout: float = 5.0):
+        self.webhook_url = webhook_url
+        self.default_cooldown = default_cooldown
+        self.timeout = timeout
+        self.rules: Dict[str, Dict] = {}
+        self.up: Dict[str, ThresholdBook] = {}
+        self.down: Dict[str, ThresholdBook] = {}
+        self.last_prices: Dict[str, float] = {}
+        self.events: Deque[Dict] = deque(maxlen=max_events)
+        self._delivered: "OrderedDict[Tuple[str, datetime], None]" = OrderedDict()
+        self._queue: Optional["asyncio.Queue[Dict]"] = None
+        self._worker: Optional[asyncio.Task] = None
+        self._client: Optional[httpx.AsyncClient] = None
+
+    @classmethod
+    def from_env(cls) -> "PriceAlertEngine":
+        return cls(
+            webhook_url=os.getenv("ALERT_WEBHOOK_URL") or None,
+            default_cooldown=float(os.getenv("ALERT_COOLDOWN_SECONDS", "300")),
+            max_events=int(os.getenv("ALERT_EVENT_LOG_SIZE", "500")),
+        )
+
+    # -- rule index ---------------------------------------------------------
+
+    async def rebuild(self) -> int:
+        """Reload rules and seed each coin's last price from its latest tick"""
+        self.rules.clear()
+        self.up.clear()
+        self.down.clear()
+        async for doc in get_alert_collection().find({"active": True}):
+            self.add(serialize_alert(doc))
+        prices = await latest_prices({rule["coin_id"] for rule in self.rules.values()})
+        for coin_id, latest in prices.items():
+            self.last_prices.setdefault(coin_id, latest["price"])
+        return len(self.rules)
+
+    def add(self, rule: Dict) -> None:
+        self.remove(rule["id"])
+        self.rules[rule["id"]] = rule
+        if rule["direction"] in ("above", "any"):
+            self.up.setdefault(rule["coin_id"], ThresholdBook()).add(rule["threshold"], rule["id"])
+        if rule["direction"] in ("below", "any"):
+            self.down.setdefault(rule["coin_id"], ThresholdBook()).add(rule["threshold"], rule["id"])
+
+    def remove(self, rule_id: str) -> None:
+        rule = self.rules.pop(rule_id, None)
+        if rule is None:
+            return
+        for books in (self.up, self.down):
+            book = books.get(rule["coin_id"])
+            if book is not None:
+                book.remove(rule["threshold"], rule_id)
+
+    # -- evaluation ---------------------------------------------------------
+
+    def on_tick(self, coin_id: str, price: float, time: Optional[datetime] = None) -> List[Dict]:
+        """Check a new tick against the rules it crossed; returns the queued alerts"""
+        time = time or datetime.utcnow()
+        if time.tzinfo is not None:
+            time = time.replace(tzinfo=None) - time.utcoffset()
+        previous = self.last_prices.get(coin_id)
+        self.last_prices[coin_id] = price
+        if previous is None or price == previous:
+            return []
+
+        if price > previous:
+            book, direction = self.up.get(coin_id), "above"
+            crossed = book.crossed_up(previous, price) if book else []
+        else:
+            book, direction = self.down.get(coin_id), "below"
+            crossed = book.crossed_down(previous, price) if book else []
+
+        fired = []
+        for rule_id in crossed:
+            rule = self.rules[rule_id]
+            if not self._should_fire(rule, time):
+                continue
+            rule["last_triggered_at"] = time
+            event = {
+                "rule_id": rule_id,
+                "coin_id": coin_id,
+                "threshold": rule["threshold"],
+                "direction": direction,
+                "price": price,
+                "previous_price": previous,
+                "time": time,
+                "note": rule.get("note"),
+            }
+            if self._queue is not None:
+                self._queue.put_nowait(event)
+            else:
+                self.events.append(event)
+            fired.append(event)
+        return fired
+
+    def _should_fire(self, rule: Dict, time: datetime) -> bool:
+        key = (rule["id"], time)
+        if key in self._delivered:
+            return False
+        last = rule.get("last_triggered_at")
+        cooldown = rule.get("cooldown_seconds")
+        cooldown = self.default_cooldown if cooldown is None else cooldown
+        if last is not None and time - last < timedelta(seconds=cooldown):
+            return False
+        self._delivered[key] = None
+        while len(self._delivered) > DEDUP_SIZE:
+            self._delivered.popitem(last=False)
+        return True
+
+    # -- delivery -----------------------------------------------------------
+
+    async def _deliver(self, event: Dict) -> None:
+        self.events.append(event)
+        await get_alert_collection().update_one(
+            {"_id": ObjectId(event["rule_id"])},
+            {"$set": {"last_triggered_at": event["time"]}}
+        )
+        if self.webhook_url:
+            payload = {**event, "time": event["time"].isoformat()}
+            response = await self._client.post(self.webhook_url, json=payload)
+            response.raise_for_status()
+        print(f"🔔 {event['coin_id']} crossed {event['direction']} {event['threshold']} (price {event['price']})")
+
+    async def _run(self) -> None:
+        while True:
+            event = await self._queue.get()
+            try:
+                await self._deliver(event)
+            except asyncio.CancelledError:
+                raise
+            except Exception as e:
+                print(f"Price alert delivery failed for rule {event['rule_id']}: {str(e)}")
+            finally:
+                self._queue.task_done()
+
+    def start(self) -> None:
+        if self._worker is not None:
+            return
+        self._queue = asyncio.Queue()
+        if self.webhook_url:
+            self._client = httpx.AsyncClient(timeout=httpx.Timeout(self.timeout))
+        self._worker = asyncio.create_task(self._run())
+
+    async def stop(self) -> None:
+        if self._worker is not None:
+            self._worker.cancel()
+            await asyncio.gather(self._worker, return_exceptions=True)
+            self._worker = None
+            self._queue = None
+        if self._client is not None:
+            await self._client.aclose()
+            self._client = None
+
+
+price_alerts = PriceAlertEngine.from_env()
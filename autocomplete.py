@@ -0,0 +1,120 @@
+import heapq
+import re
+from bisect import bisect_left, insort
+from typing import Dict, List, Optional, Tuple
+
+from utils import serialize_airdrop
+
+
+WORD_RE = re.compile(r"\w+", re.UNICODE)
+
+# Name fields indexed for prefix lookups, by rank (project names beat aliases)
+NAME_FIELDS = ("project", "alias")
+
+# Match kinds, best first
+EXACT, PREFIX, WORD_PREFIX = 0, 1, 2
+
+
+def fold(text: Optional[str]) -> str:
+    """Case-folded, whitespace-normalized form used for keys and queries"""
+    if not text:
+        return ""
+    return " ".join(str(text).split()).casefold()
+
+
+def name_keys(name: str) -> List[Tuple[str, bool]]:
+    """(key, is_full_name) pairs: the whole name plus every later word start"""
+    folded = fold(name)
+    if not folded:
+        return []
+    keys = [(folded, True)]
+    for match in WORD_RE.finditer(folded):
+        if match.start() > 0:
+            keys.append((folded[match.start():], False))
+    return keys
+
+
+class AirdropNameIndex:
+    """
+    Sorted-array prefix index over airdrop project and alias names.
+    Kept in sync by the admin airdrop routes and rebuilt from MongoDB at startup.
+    """
+
+    def __init__(self):
+        self.ready = False
+        # (key, field rank, is_full_name, doc_id), sorted so a prefix is one contiguous slice
+        self.entries: List[Tuple[str, int, bool, str]] = []
+        self.docs: Dict[str, Dict[str, str]] = {}
+
+    async def rebuild(self, collection) -> int:
+        """Reload the whole index from the airdrop collection"""
+        self.clear()
+        cursor = collection.find({"deleted": False}, {field: 1 for field in NAME_FIELDS})
+        entries = []
+        async for doc in cursor:
+            doc = serialize_airdrop(doc)
+            self.docs[doc["id"]] = self._summary(doc)
+            entries.extend(self._entries(doc))
+        entries.sort()
+        self.entries = entries
+        self.ready = True
+        return len(self.docs)
+
+    def clear(self) -> None:
+        self.ready = False
+        self.entries = []
+        self.docs.clear()
+
+    @staticmethod
+    def _summary(doc: Dict) -> Dict[str, str]:
+        return {"id": doc["id"], "project": doc.get("project"), "alias": doc.get("alias")}
+
+    @staticmethod
+    def _entries(doc: Dict) -> List[Tuple[str, int, bool, str]]:
+        entries = []
+        for rank, field in enumerate(NAME_FIELDS):
+            for key, full in name_keys(doc.get(field)):
+                entries.append((key, rank, full, doc["id"]))
+        return entries
+
+    def add(self, doc: Dict) -> None:
+        """Insert or replace a serialized airdrop"""
+        self.remove(doc["id"])
+        self.docs[doc["id"]] = self._summary(doc)
+        for entry in self._entries(doc):
+            insort(self.entries, entry)
+
+    def remove(self, doc_id: str) -> None:
+        """Drop an airdrop from the index (no-op when absent)"""
+        doc = self.docs.pop(doc_id, None)
+        if doc is None:
+            return
+        for entry in self._entries(doc):
+            position = bisect_left(self.entries, entry)
+            if position < len(self.entries) and self.entries[position] == entry:
+                del self.entries[position]
+
+    def suggest(self, q: str, limit: int = 10) -> List[Dict[str, str]]:
+        """Top `limit` airdrops whose project or alias (or one of their words) starts with `q`"""
+        prefix = fold(q)
+        if not prefix:
+            return []
+
+        best: Dict[str, Tuple[int, int, int, str]] = {}
+        position = bisect_left(self.entries, (prefix,))
+        while position < len(self.entries):
+            key, rank, full, doc_id = self.entries[position]
+            if not key.startswith(prefix):
+                break
+            position += 1
+            kind = EXACT if full and key == prefix else PREFIX if full else WORD_PREFIX
+            # Shorter names first: a closer completion of what was typed
+            score = (kind, rank, len(key), key)
+            if doc_id not in best or score < best[doc_id]:
+                best[doc_id] = score
+
+        top = heapq.nsmallest(limit, best.items(), key=lambda item: (item[1], item[0]))
+        return [dict(self.docs[doc_id]) for doc_id, _ in top]
+
+
+airdrop_name_index = AirdropNameIndex()
@@ -0,0 +1,181 @@
+import asyncio
+import contextvars
+import os
+from datetime import datetime, timedelta
+from typing import Dict, Optional
+
+from pymongo.errors import DuplicateKeyError
+
+from database import get_collection
+
+
+CHANGES_COLLECTION = "airdrop_changes"
+COUNTERS_COLLECTION = "counters"
+COUNTER_ID = "airdrop_changes"
+
+# Entries kept after compaction; clients older than this must resync
+RETAIN_ENTRIES = int(os.getenv("AIRDROP_CHANGES_RETAIN", "1000"))
+# Compact the log every N appended entries
+COMPACT_EVERY = int(os.getenv("AIRDROP_CHANGES_COMPACT_EVERY", "100"))
+# Allocated sequence numbers not written within this many seconds are treated as abandoned
+PENDING_TIMEOUT = float(os.getenv("AIRDROP_CHANGES_PENDING_TIMEOUT", "30"))
+
+
+async def next_change_seq() -> int:
+    """
+    Allocate the next change sequence number. The counter increment and the
+    number's registration in `pending` are one conditional update, so a
+    reader never sees an allocated number that is neither pending nor written.
+    """
+    counters = get_collection(COUNTERS_COLLECTION)
+    while True:
+        counter = await counters.find_one({"_id": COUNTER_ID}, {"seq": 1})
+        seq = (counter or {}).get("seq", 0) + 1
+        try:
+            result = await counters.update_one(
+                {"_id": COUNTER_ID, "seq": seq - 1},
+                {
+                    "$set": {"seq": seq},
+                    "$setOnInsert": {"floor": 0},
+                    "$push": {"pending": {"seq": seq, "at": datetime.utcnow()}},
+                },
+                upsert=counter is None,
+            )
+        except DuplicateKeyError:
+            # Another writer created the counter first
+            continue
+        if result.modified_count or result.upserted_id is not None:
+            return seq
+
+
+def stable_seq(counter: Dict, now: Optional[datetime] = None) -> int:
+    """Highest sequence number below which every entry has been written (or abandoned)"""
+    now = now or datetime.utcnow()
+    live = [
+        pending["seq"] for pending in counter.get("pending") or []
+        if (now - pending["at"]).total_seconds() < PENDING_TIMEOUT
+    ]
+    return min(live) - 1 if live else counter.get("seq", 0)
+
+
+async def get_change_state() -> Dict[str, int]:
+    """Current and stable sequence numbers, and the oldest sequence still answerable"""
+    counter = await get_collection(COUNTERS_COLLECTION).find_one({"_id": COUNTER_ID})
+    if not counter:
+        return {"seq": 0, "stable": 0, "floor": 0}
+    return {"seq": counter.get("seq", 0), "stable": stable_seq(counter), "floor": counter.get("floor", 0)}
+
+
+async def record_airdrop_change(op: str, airdrop_id: str, item: Optional[Dict] = None) -> int:
+    """Append an upsert or delete (tombstone) entry to the airdrop change log"""
+    seq = await next_change_seq()
+    try:
+        await get_collection(CHANGES_COLLECTION).insert_one({
+            "seq": seq,
+            "op": op,
+            "airdrop_id": airdrop_id,
+            "item": dict(item) if item is not None else None,
+            "at": datetime.utcnow(),
+        })
+    finally:
+        await get_collection(COUNTERS_COLLECTION).update_one({"_id": COUNTER_ID}, {"$pull": {"pending": {"seq": seq}}})
+    if COMPACT_EVERY > 0 and seq % COMPACT_EVERY == 0:
+        schedule_compaction()
+    return seq
+
+
+_compaction: Optional[asyncio.Task] = None
+
+
+async def run_compaction() -> None:
+    try:
+        await compact_airdrop_changes()
+    except Exception as e:
+        print(f"Airdrop change log compaction failed: {str(e)}")
+
+
+def schedule_compaction() -> None:
+    """
+    Compact in a background task, off the write's request path. The task runs in
+    an empty context so it is bound by neither the request deadline nor its query budget.
+    """
+    global _compaction
+    if _compaction is not None and not _compaction.done():
+        return
+    _compaction = asyncio.create_task(run_compaction(), context=contextvars.Context())
+
+
+async def compact_airdrop_changes(retain: int = RETAIN_ENTRIES) -> Dict[str, int]:
+    """
+    Drop entries superseded by a newer entry for the same airdrop, then trim
+    the log to the newest `retain` entries and raise the resync floor.
+    """
+    changes = get_collection(CHANGES_COLLECTION)
+    counters = get_collection(COUNTERS_COLLECTION)
+    # Only the fully written prefix is compacted; entries still being inserted are left alone
+    state = await get_change_state()
+    stable = state["stable"]
+    cutoff = datetime.utcnow() - timedelta(seconds=PENDING_TIMEOUT)
+    await counters.update_one({"_id": COUNTER_ID}, {"$pull": {"pending": {"at": {"$lt": cutoff}}}})
+
+    latest = await changes.aggregate([
+        {"$match": {"seq": {"$lte": stable}}},
+        {"$group": {"_id": "$airdrop_id", "seq": {"$max": "$seq"}}}
+    ]).to_list(length=None)
+    keep = [entry["seq"] for entry in latest]
+    superseded = await changes.delete_many({"seq": {"$nin": keep, "$lte": stable}})
+
+    trimmed = 0
+    floor = None
+    if len(keep) > retain:
+        keep.sort()
+        floor = keep[len(keep) - retain - 1]
+        result = await changes.delete_many({"seq": {"$lte": floor}})
+        trimmed = result.deleted_count
+        await counters.update_one(
+            {"_id": COUNTER_ID},
+            {"$max": {"floor": floor}}
+        )
+
+    return {"superseded": superseded.deleted_count, "trimmed": trimmed, "floor": floor or 0}
+
+
+async def get_airdrop_changes(since: int, limit: int = 500, state: Optional[Dict[str, int]] = None) -> Dict:
+    """Upserts and tombstones after `since`, or a resync signal when it predates the log"""
+    state = state or await get_change_state()
+    if since < state["floor"] or since > state["seq"]:
+        return {
+            "since": since,
+            "latest_seq": state["seq"],
+            "resync_required": True,
+            "has_more": False,
+            "changes": [],
+        }
+
+    # Read only up to the stable seq: a later entry may already exist while an earlier one is still being written
+    cursor = get_collection(CHANGES_COLLECTION).find(
+        {"seq": {"$gt": since, "$lte": state["stable"]}},
+        {"_id": 0, "seq": 1, "op": 1, "airdrop_id": 1, "item": 1},
+    ).sort("seq", 1).limit(limit + 1)
+    entries = await cursor.to_list(length=limit + 1)
+
+    has_more = len(entries) > limit
+    entries = entries[:limit]
+    changes = [
+        {
+            "seq": entry["seq"],
+            "op": entry["op"],
+            "id": entry["airdrop_id"],
+            "item": entry.get("item"),
+        }
+        for entry in entries
+    ]
+    # Report the last delivered seq rather than the counter, so an entry whose
+    # seq is allocated but not yet inserted is picked up by the next poll
+    return {
+        "since": since,
+        "latest_seq": changes[-1]["seq"] if changes else since,
+        "resync_required": False,
+        "has_more": has_more,
+        "changes": changes,
+    }
@@ -0,0 +1,65 @@
+import struct
+import sys
+from array import array
+from datetime import datetime
+from typing import Dict, Iterable
+
+# Binary layout (little-endian): magic, version, flags, coin_id length, count,
+# then the utf-8 coin_id, int64 times (epoch ms) and float64 prices
+BINARY_MAGIC = b"CPS1"
+BINARY_VERSION = 1
+BINARY_HEADER = struct.Struct("<4sBBHI")
+BINARY_MEDIA_TYPE = "application/vnd.coin-series"
+FLAG_DELTA = 1
+
+EPOCH = datetime(1970, 1, 1)
+
+
+def epoch_ms(value: datetime) -> int:
+    """Milliseconds since the epoch for a naive UTC datetime"""
+    if value.tzinfo is not None:
+        value = value.replace(tzinfo=None) - value.utcoffset()
+    delta = value - EPOCH
+    return (delta.days * 86400 + delta.seconds) * 1000 + delta.microseconds // 1000
+
+
+class SeriesBuffer:
+    """Column buffers for a price series: int64 epoch-ms times and float64 prices"""
+
+    def __init__(self):
+        self.times = array("q")
+        self.prices = array("d")
+
+    def extend(self, docs: Iterable[Dict], price_field: str = "price") -> None:
+        times, prices = self.times, self.prices
+        for doc in docs:
+            times.append(epoch_ms(doc["time"]))
+            prices.append(doc[price_field])
+
+    def delta_times(self) -> array:
+        """First time absolute, every following one relative to its predecessor"""
+        times = self.times
+        deltas = array("q", times[:1])
+        deltas.extend(times[i] - times[i - 1] for i in range(1, len(times)))
+        return deltas
+
+    def to_json(self, coin_id: str, delta: bool = False) -> Dict:
+        times = self.delta_times() if delta else self.times
+        return {
+            "coin_id": coin_id,
+            "encoding": "delta" if delta else "absolute",
+            "count": len(self.times),
+            "times": times.tolist(),
+            "prices": self.prices.tolist(),
+        }
+
+    def to_binary(self, coin_id: str, delta: bool = False) -> bytes:
+        times = self.delta_times() if delta else array("q", self.times)
+        prices = array("d", self.prices)
+        if sys.byteorder == "big":
+            times.byteswap()
+            prices.byteswap()
+        name = coin_id.encode()
+        header = BINARY_HEADER.pack(BINARY_MAGIC, BINARY_VERSION, FLAG_DELTA if delta else 0, len(name), len(times))
+        return b"".join((header, name, times.tobytes(), prices.tobytes()))
+
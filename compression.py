@@ -0,0 +1,195 @@
+import gzip
+import hashlib
+from collections import OrderedDict
+from typing import Dict, List, Optional, Tuple
+
+try:
+    import brotli
+except ImportError:  # brotli is optional, gzip is always available
+    brotli = None
+
+
+COMPRESSIBLE_TYPES = ("application/json", "text/", "application/javascript", "application/xml")
+
+
+def negotiate_encoding(accept_encoding: Optional[str]) -> Optional[str]:
+    """Pick the best supported encoding ("br" or "gzip") from an Accept-Encoding header"""
+    if not accept_encoding:
+        return None
+
+    weights: Dict[str, float] = {}
+    for part in accept_encoding.split(","):
+        token, _, params = part.strip().partition(";")
+        token = token.strip().lower()
+        if not token:
+            continue
+        q = 1.0
+        params = params.strip()
+        if params.startswith("q="):
+            try:
+                q = float(params[2:])
+            except ValueError:
+                q = 0.0
+        weights[token] = q
+
+    supported = ["br", "gzip"] if brotli is not None else ["gzip"]
+    wildcard = weights.get("*")
+    best, best_q = None, 0.0
+    for encoding in supported:
+        q = weights.get(encoding, wildcard if wildcard is not None else 0.0)
+        if q > best_q:
+            best, best_q = encoding, q
+    return best
+
+
+def compress_body(body: bytes, encoding: str, gzip_level: int = 6, brotli_quality: int = 5) -> bytes:
+    """Compress a response body with the negotiated encoding"""
+    if encoding == "br":
+        return brotli.compress(body, quality=brotli_quality)
+    return gzip.compress(body, compresslevel=gzip_level, mtime=0)
+
+
+def body_digest(body: bytes) -> bytes:
+    """Content key of a response body; hashing costs a fraction of compressing"""
+    return hashlib.blake2b(body, digest_size=16).digest()
+
+
+class CompressedBodyCache:
+    """LRU of compressed bodies keyed by (body digest, encoding)"""
+
+    def __init__(self, max_entries: int = 256):
+        self.max_entries = max_entries
+        self._entries: "OrderedDict[Tuple[bytes, str], bytes]" = OrderedDict()
+
+    def get(self, key: Tuple[bytes, str]) -> Optional[bytes]:
+        body = self._entries.get(key)
+        if body is not None:
+            self._entries.move_to_end(key)
+        return body
+
+    def put(self, key: Tuple[bytes, str], body: bytes) -> None:
+        if self.max_entries <= 0:
+            return
+        self._entries[key] = body
+        self._entries.move_to_end(key)
+        while len(self._entries) > self.max_entries:
+            self._entries.popitem(last=False)
+
+    def clear(self) -> None:
+        self._entries.clear()
+
+    def __len__(self) -> int:
+        return len(self._entries)
+
+
+def _header(headers: List[Tuple[bytes, bytes]], name: bytes) -> Optional[str]:
+    for key, value in headers:
+        if key.lower() == name:
+            return value.decode("latin-1")
+    return None
+
+
+class CompressionMiddleware:
+    """
+    ASGI middleware compressing buffered responses with gzip or brotli.
+    Responses carrying an ETag (the ones clients fetch repeatedly) reuse the
+    compressed variant of an identical body instead of compressing again.
+    The cache is keyed by the body itself, never by the ETag, so a handler
+    whose ETag misses a change cannot be answered with a stale body.
+    Streaming responses are passed through untouched.
+    """
+
+    def __init__(
+        self,
+        app,
+        minimum_size: int = 1024,
+        cache_size: int = 256,
+        gzip_level: int = 6,
+        brotli_quality: int = 5,
+    ):
+        self.app = app
+        self.minimum_size = minimum_size
+        self.gzip_level = gzip_level
+        self.brotli_quality = brotli_quality
+        self.cache = CompressedBodyCache(cache_size)
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http":
+            await self.app(scope, receive, send)
+            return
+
+        request_headers = scope.get("headers") or []
+        encoding = negotiate_encoding(_header(request_headers, b"accept-encoding"))
+        if encoding is None:
+            await self.app(scope, receive, send)
+            return
+
+        start_message = None
+        chunks: List[bytes] = []
+        streaming = False
+
+        async def send_wrapper(message):
+            nonlocal start_message, streaming
+
+            if message["type"] == "http.response.start":
+                start_message = message
+                return
+
+            if message["type"] != "http.response.body":
+                await send(message)
+                return
+
+            if streaming:
+                await send(message)
+                return
+
+            more_body = message.get("more_body", False)
+            if more_body and not chunks:
+                # First chunk of a streamed body: do not buffer, send as-is
+                streaming = True
+                await send(start_message)
+                await send(message)
+                return
+
+            chunks.append(message.get("body", b""))
+            if more_body:
+                return
+
+            await self._send_buffered(encoding, start_message, b"".join(chunks), send)
+
+        await self.app(scope, receive, send_wrapper)
+
+    async def _send_buffered(self, encoding: str, start_message, body: bytes, send) -> None:
+        headers = list(start_message.get("headers", []))
+        content_type = _header(headers, b"content-type") or ""
+
+        compressible = (
+            start_message.get("status", 200) == 200
+            and len(body) >= self.minimum_size
+            and _header(headers, b"content-encoding") is None
+            and content_type.startswith(COMPRESSIBLE_TYPES)
+        )
+        if not compressible:
+            await send(start_message)
+            await send({"type": "http.response.body", "body": body})
+            return
+
+        key = None
+        compressed = None
+        if _header(headers, b"etag"):
+            key = (body_digest(body), encoding)
+            compressed = self.cache.get(key)
+
+        if compressed is None:
+            compressed = compress_body(body, encoding, self.gzip_level, self.brotli_quality)
+            if key is not None:
+                self.cache.put(key, compressed)
+
+        headers = [(k, v) for k, v in headers if k.lower() not in (b"content-length", b"vary")]
+        vary = _header(start_message.get("headers", []), b"vary")
+        headers.append((b"vary", (f"{vary}, Accept-Encoding" if vary else "Accept-Encoding").encode("latin-1")))
+        headers.append((b"content-encoding", encoding.encode("latin-1")))
+        headers.append((b"content-length", str(len(compressed)).encode("latin-1")))
+
+        await send({**start_message, "headers": headers})
+        await send({"type": "http.response.body", "body": compressed})
@@ -1,17 +1,35 @@
 from motor.motor_asyncio import AsyncIOMotorClient
-from typing import Optional
+from pymongo import ASCENDING, DESCENDING, IndexModel
+from pymongo.collation import Collation
+from typing import Dict, List, Optional
 import os
 from dotenv import load_dotenv
 
+from diagnostics import slow_query_listener
+from memory_store import MemoryClient
+from overload import remaining_ms
+from query_budget import MeteredCursor, metered_call, metered_find_one, record_command, request_usage
+
 load_dotenv()
 
+# "mongo" (default) or "memory" for a hermetic in-process store (tests, benchmarks, local dev)
+STORAGE_BACKEND = os.getenv("STORAGE_BACKEND", "mongo").lower()
+
 class Database:
     client: Optional[AsyncIOMotorClient] = None
     
     @classmethod
     def get_client(cls) -> AsyncIOMotorClient:
-        if cls.client is None:
-            cls.client = AsyncIOMotorClient(os.getenv("MONGODB_URL"))
+        if cls.client is None and STORAGE_BACKEND == "memory":
+            cls.client = MemoryClient()
+        elif cls.client is None:
+            cls.client = AsyncIOMotorClient(
+                os.getenv("MONGODB_URL"),
+                event_listeners=[slow_query_listener],
+                serverSelectionTimeoutMS=int(os.getenv("MONGO_SERVER_SELECTION_TIMEOUT_MS", "5000")),
+                connectTimeoutMS=int(os.getenv("MONGO_CONNECT_TIMEOUT_MS", "5000")),
+                waitQueueTimeoutMS=int(os.getenv("MONGO_WAIT_QUEUE_TIMEOUT_MS", "2000")),
+            )
         return cls.client
     
     @classmethod
@@ -26,21 +44,153 @@ class Database:
             cls.client = None
 
 
+# Collection methods issuing one command each (reads with results are metered separately)
+METERED_COMMANDS = {
+    "insert_one", "insert_many", "update_one", "update_many", "replace_one", "delete_one", "delete_many",
+    "find_one_and_update", "find_one_and_replace", "find_one_and_delete", "bulk_write",
+    "distinct", "estimated_document_count",
+}
+
+
+class DeadlineCollection:
+    """
+    Collection wrapper passing the remaining request deadline to reads as
+    maxTimeMS, so slow queries are aborted server-side instead of piling up.
+    Inside a metered request it also counts commands and documents read
+    against the endpoint's query budget.
+    Outside a request (background jobs) calls are passed through unchanged.
+    """
+
+    def __init__(self, collection):
+        self._collection = collection
+
+    def __getattr__(self, name):
+        attr = getattr(self._collection, name)
+        if name in METERED_COMMANDS and request_usage.get() is not None:
+            return metered_call(attr)
+        return attr
+
+    def find(self, *args, **kwargs):
+        cursor = self._collection.find(*args, **kwargs)
+        ms = remaining_ms()
+        if ms is not None:
+            cursor = cursor.max_time_ms(ms)
+        usage = record_command()
+        return MeteredCursor(cursor, usage) if usage is not None else cursor
+
+    def find_one(self, *args, **kwargs):
+        ms = remaining_ms()
+        if ms is not None:
+            kwargs.setdefault("max_time_ms", ms)
+        usage = record_command()
+        result = self._collection.find_one(*args, **kwargs)
+        return metered_find_one(result, usage) if usage is not None else result
+
+    def aggregate(self, *args, **kwargs):
+        ms = remaining_ms()
+        if ms is not None:
+            kwargs.setdefault("maxTimeMS", ms)
+        usage = record_command()
+        cursor = self._collection.aggregate(*args, **kwargs)
+        return MeteredCursor(cursor, usage) if usage is not None else cursor
+
+    def count_documents(self, *args, **kwargs):
+        ms = remaining_ms()
+        if ms is not None:
+            kwargs.setdefault("maxTimeMS", ms)
+        record_command()
+        return self._collection.count_documents(*args, **kwargs)
+
+
 def get_collection(collection_name: str = "airdrops"):
     db = Database.get_db()
-    return db[collection_name]
+    return DeadlineCollection(db[collection_name])
 
 
 def get_coin_collection():
     db = Database.get_db()
-    return db["coins"]
+    return DeadlineCollection(db["coins"])
 
 
 def get_token_collection():
     db = Database.get_db()
-    return db["tokens"]
+    return DeadlineCollection(db["tokens"])
 
 
 def get_alpha_insight_collection():
     db = Database.get_db()
-    return db["alpha_insights"]
+    return DeadlineCollection(db["alpha_insights"])
+
+
+# Case-insensitive comparison used for airdrop project lookups
+PROJECT_COLLATION = Collation(locale="en", strength=2)
+
+# Indexes each collection needs, ensured at startup
+INDEXES: Dict[str, List[IndexModel]] = {
+    "airdrops": [
+        IndexModel([("project", ASCENDING)], name="project_ci", collation=PROJECT_COLLATION),
+        # Serves both the {"deleted": False} feed scan and calendar range queries
+        IndexModel([("deleted", ASCENDING), ("event_at", ASCENDING)], name="deleted_event_at"),
+    ],
+    "coins": [
+        IndexModel([("coin_id", ASCENDING), ("time", DESCENDING)], name="coin_id_time"),
+        IndexModel([("time", ASCENDING)], name="time"),
+    ],
+    "coins_1m": [
+        IndexModel([("coin_id", ASCENDING), ("time", ASCENDING)], name="coin_id_time", unique=True),
+        IndexModel([("time", ASCENDING)], name="time"),
+    ],
+    "coins_1h": [
+        IndexModel([("coin_id", ASCENDING), ("time", ASCENDING)], name="coin_id_time", unique=True),
+    ],
+    "transactions": [
+        IndexModel([("accountId", ASCENDING), ("date", ASCENDING)], name="accountId_date"),
+        IndexModel([("date", ASCENDING)], name="date"),
+    ],
+    "price_alerts": [
+        IndexModel([("coin_id", ASCENDING)], name="coin_id"),
+    ],
+    "airdrop_changes": [
+        IndexModel([("seq", ASCENDING)], name="seq", unique=True),
+    ],
+}
+
+
+async def ensure_indexes() -> Dict[str, List[str]]:
+    """Create every declared index (idempotent: existing indexes are left alone)"""
+    db = Database.get_db()
+    created: Dict[str, List[str]] = {}
+    for collection_name, indexes in INDEXES.items():
+        try:
+            created[collection_name] = await db[collection_name].create_indexes(indexes)
+        except Exception as e:
+            print(f"Index creation failed for {collection_name}: {str(e)}")
+    return created
+
+
+async def index_report() -> Dict[str, Dict]:
+    """Compare declared indexes with the database: missing, extra and unused (no ops since restart)"""
+    db = Database.get_db()
+    existing_collections = set(await db.list_collection_names())
+    report: Dict[str, Dict] = {}
+
+    for collection_name in sorted(existing_collections | set(INDEXES)):
+        declared = {index.document["name"] for index in INDEXES.get(collection_name, [])}
+        present: Dict[str, Dict] = {}
+        usage: Dict[str, int] = {}
+        if collection_name in existing_collections:
+            collection = db[collection_name]
+            present = {index["name"]: index for index in await collection.list_indexes().to_list(length=None)}
+            try:
+                stats = await collection.aggregate([{"$indexStats": {}}]).to_list(length=None)
+                usage = {stat["name"]: stat["accesses"]["ops"] for stat in stats}
+            except Exception:
+                usage = {}
+
+        report[collection_name] = {
+            "missing": sorted(declared - set(present)),
+            "extra": sorted(name for name in present if name != "_id_" and name not in declared),
+            "unused": sorted(name for name in present if name != "_id_" and usage.get(name) == 0),
+            "usage": usage,
+        }
+    return report
@@ -0,0 +1,224 @@
+import json
+import os
+import re
+import threading
+import time
+from datetime import datetime
+from typing import Any, Dict, List, Optional, Tuple
+
+from bson import Regex, json_util
+from pymongo import monitoring
+
+
+# Commands carrying a query we can shape and explain
+QUERY_COMMANDS = {"find", "aggregate", "count", "distinct", "delete", "update", "findAndModify"}
+RANGE_OPERATORS = {"$gt", "$gte", "$lt", "$lte", "$ne", "$nin"}
+
+
+def value_shape(value: Any) -> Any:
+    """Replace literal values by their type name, keeping operators and field names"""
+    if isinstance(value, dict):
+        return {key: value_shape(item) for key, item in value.items()}
+    if isinstance(value, (list, tuple)):
+        if value and all(isinstance(item, dict) for item in value):
+            return [value_shape(item) for item in value]
+        return "array"
+    if isinstance(value, (Regex, re.Pattern)):
+        return "regex"
+    if value is None:
+        return "null"
+    return type(value).__name__
+
+
+def command_filter(command_name: str, command: Dict) -> Tuple[Optional[Dict], Optional[Dict]]:
+    """Extract (filter, sort) from a monitored command"""
+    if command_name in ("find", "count", "distinct"):
+        return command.get("filter") or command.get("query") or {}, command.get("sort")
+    if command_name == "findAndModify":
+        return command.get("query") or {}, command.get("sort")
+    if command_name in ("delete", "update"):
+        key = "deletes" if command_name == "delete" else "updates"
+        statements = command.get(key) or [{}]
+        return statements[0].get("q") or {}, None
+    if command_name == "aggregate":
+        match, sort = {}, None
+        for stage in command.get("pipeline") or []:
+            if "$match" in stage and not match:
+                match = stage["$match"]
+            elif "$sort" in stage and sort is None:
+                sort = stage["$sort"]
+            elif "$match" not in stage:
+                break
+        return match, sort
+    return None, None
+
+
+def command_options(command_name: str, command: Dict) -> Dict[str, Any]:
+    """Collation and hint of a monitored command; they change the plan, so explain must reuse them"""
+    source = command
+    if command_name in ("delete", "update"):
+        key = "deletes" if command_name == "delete" else "updates"
+        source = (command.get(key) or [{}])[0]
+    return {option: source[option] for option in ("collation", "hint") if source.get(option)}
+
+
+def find_stages(plan: Any, stage: str) -> bool:
+    """True when an explain plan contains the given stage anywhere"""
+    if isinstance(plan, dict):
+        if plan.get("stage") == stage:
+            return True
+        return any(find_stages(value, stage) for value in plan.values())
+    if isinstance(plan, list):
+        return any(find_stages(item, stage) for item in plan)
+    return False
+
+
+def suggest_index(filter_doc: Optional[Dict], sort: Optional[Dict]) -> Optional[List[List[Any]]]:
+    """Equality fields first, then sort fields, then range fields (ESR rule)"""
+    if not filter_doc and not sort:
+        return None
+    equality, ranges = [], []
+    for field, condition in (filter_doc or {}).items():
+        if field.startswith("$"):
+            continue
+        if isinstance(condition, dict) and any(op in RANGE_OPERATORS for op in condition):
+            ranges.append(field)
+        elif isinstance(condition, (Regex, re.Pattern)):
+            ranges.append(field)
+        else:
+            equality.append(field)
+
+    keys: List[List[Any]] = [[field, 1] for field in equality]
+    for field, direction in (sort or {}).items():
+        if field not in equality:
+            keys.append([field, direction if direction in (1, -1) else 1])
+    for field in ranges:
+        if field not in [key[0] for key in keys]:
+            keys.append([field, 1])
+    return keys or None
+
+
+class SlowQueryListener(monitoring.CommandListener):
+    """
+    Records every monitored command slower than the threshold, grouped by
+    collection, command and filter shape.
+    """
+
+    def __init__(self, threshold_ms: float = 100.0, max_shapes: int = 200):
+        self.threshold_ms = threshold_ms
+        self.max_shapes = max_shapes
+        self._lock = threading.Lock()
+        self._inflight: Dict[Tuple[str, int], Dict] = {}
+        self.shapes: Dict[str, Dict] = {}
+
+    def started(self, event: monitoring.CommandStartedEvent) -> None:
+        if event.command_name not in QUERY_COMMANDS:
+            return
+        collection = event.command.get(event.command_name)
+        filter_doc, sort = command_filter(event.command_name, event.command)
+        with self._lock:
+            self._inflight[(str(event.connection_id), event.request_id)] = {
+                "database": event.database_name,
+                "collection": collection,
+                "command": event.command_name,
+                "filter": filter_doc,
+                "sort": sort,
+                "options": command_options(event.command_name, event.command),
+                "pipeline": event.command.get("pipeline"),
+            }
+
+    def succeeded(self, event: monitoring.CommandSucceededEvent) -> None:
+        with self._lock:
+            info = self._inflight.pop((str(event.connection_id), event.request_id), None)
+        if info is None:
+            return
+        duration_ms = event.duration_micros / 1000
+        if duration_ms >= self.threshold_ms:
+            self.record(info, duration_ms)
+
+    def failed(self, event: monitoring.CommandFailedEvent) -> None:
+        with self._lock:
+            self._inflight.pop((str(event.connection_id), event.request_id), None)
+
+    def record(self, info: Dict, duration_ms: float) -> None:
+        # The same filter under another collation or hint is a different plan
+        shape = {"filter": value_shape(info["filter"]), "sort": info["sort"], **info["options"]}
+        key = json.dumps([info["collection"], info["command"], shape], sort_keys=True, default=str)
+        with self._lock:
+            entry = self.shapes.get(key)
+            if entry is None:
+                if len(self.shapes) >= self.max_shapes:
+                    return
+                entry = self.shapes[key] = {
+                    "database": info["database"],
+                    "collection": info["collection"],
+                    "command": info["command"],
+                    "shape": shape,
+                    "sample": {
+                        "filter": info["filter"],
+                        "sort": info["sort"],
+                        "options": info["options"],
+                        "pipeline": info["pipeline"],
+                    },
+                    "count": 0,
+                    "total_ms": 0.0,
+                    "max_ms": 0.0,
+                    "last_seen": None,
+                    "explain": None,
+                    "collscan": None,
+                    "suggested_index": suggest_index(info["filter"], info["sort"]),
+                }
+            entry["count"] += 1
+            entry["total_ms"] += duration_ms
+            entry["max_ms"] = max(entry["max_ms"], duration_ms)
+            entry["last_seen"] = datetime.utcnow()
+
+    def reset(self) -> None:
+        with self._lock:
+            self.shapes.clear()
+
+    async def explain_pending(self, client) -> int:
+        """Capture one explain per shape that does not have one yet"""
+        with self._lock:
+            pending = [entry for entry in self.shapes.values() if entry["explain"] is None]
+
+        explained = 0
+        for entry in pending:
+            sample = entry["sample"]
+            if entry["command"] == "aggregate" and sample["pipeline"] is not None:
+                target = {"aggregate": entry["collection"], "pipeline": sample["pipeline"], "cursor": {}}
+            else:
+                target = {"find": entry["collection"], "filter": sample["filter"] or {}}
+                if sample["sort"]:
+                    target["sort"] = sample["sort"]
+            target.update(sample["options"])
+            try:
+                started = time.perf_counter()
+                plan = await client[entry["database"]].command("explain", target, verbosity="queryPlanner")
+                entry["explain"] = {
+                    # Round-trip through extended JSON so the plan is plain JSON data
+                    "queryPlanner": json.loads(json_util.dumps(plan.get("queryPlanner") or plan.get("stages"))),
+                    "explain_ms": round((time.perf_counter() - started) * 1000, 2),
+                }
+                entry["collscan"] = find_stages(plan, "COLLSCAN")
+                explained += 1
+            except Exception as e:
+                entry["explain"] = {"error": str(e)}
+        return explained
+
+    def report(self) -> List[Dict]:
+        with self._lock:
+            entries = [dict(entry) for entry in self.shapes.values()]
+        for entry in entries:
+            entry.pop("sample", None)
+            entry["avg_ms"] = round(entry["total_ms"] / entry["count"], 2) if entry["count"] else 0.0
+            entry["total_ms"] = round(entry["total_ms"], 2)
+            entry["max_ms"] = round(entry["max_ms"], 2)
+        entries.sort(key=lambda entry: entry["total_ms"], reverse=True)
+        return entries
+
+
+slow_query_listener = SlowQueryListener(
+    threshold_ms=float(os.getenv("SLOW_QUERY_MS", "100")),
+    max_shapes=int(os.getenv("SLOW_QUERY_MAX_SHAPES", "200")),
+)
@@ -0,0 +1,290 @@
+import asyncio
+import hashlib
+import io
+import ipaddress
+import json
+import os
+import socket
+import threading
+from collections import OrderedDict
+from typing import Dict, Optional, Tuple
+from urllib.parse import quote, urljoin, urlsplit
+
+import httpx
+from fastapi import HTTPException
+
+from loop_monitor import run_in_pool
+from singleflight import SingleFlight
+
+try:
+    from PIL import Image
+except ImportError:  # without Pillow originals are served unresized
+    Image = None
+
+
+MAX_IMAGE_BYTES = int(os.getenv("IMAGE_PROXY_MAX_BYTES", str(10 * 1024 * 1024)))
+MAX_REDIRECTS = 3
+MIN_WIDTH = 16
+MAX_WIDTH = 2048
+SAVE_FORMATS = {"JPEG": "image/jpeg", "PNG": "image/png", "WEBP": "image/webp", "GIF": "image/gif"}
+# Only raster types are served from our origin; SVG and other scriptable types are refused
+ALLOWED_CONTENT_TYPES = set(SAVE_FORMATS.values())
+
+
+class DiskLRUCache:
+    """
+    Size-bounded on-disk cache. Each entry is a body file plus a small JSON
+    metadata file; least recently used entries are evicted past max_bytes.
+    """
+
+    def __init__(self, directory: str, max_bytes: int):
+        self.directory = directory
+        self.max_bytes = max_bytes
+        self.total_bytes = 0
+        self._entries: "OrderedDict[str, int]" = OrderedDict()
+        self._lock = threading.Lock()
+        self._loaded = False
+
+    def _paths(self, digest: str) -> Tuple[str, str]:
+        return os.path.join(self.directory, f"{digest}.bin"), os.path.join(self.directory, f"{digest}.json")
+
+    def _load(self) -> None:
+        """Index existing files, oldest access first"""
+        if self._loaded:
+            return
+        os.makedirs(self.directory, exist_ok=True)
+        found = []
+        for name in os.listdir(self.directory):
+            if not name.endswith(".bin"):
+                continue
+            digest = name[:-4]
+            body_path, meta_path = self._paths(digest)
+            if not os.path.exists(meta_path):
+                os.remove(body_path)
+                continue
+            stat = os.stat(body_path)
+            found.append((stat.st_mtime, digest, stat.st_size + os.path.getsize(meta_path)))
+        for _, digest, size in sorted(found):
+            self._entries[digest] = size
+            self.total_bytes += size
+        self._loaded = True
+
+    @staticmethod
+    def digest(key: str) -> str:
+        return hashlib.sha256(key.encode()).hexdigest()
+
+    def get(self, key: str) -> Optional[Tuple[bytes, Dict]]:
+        digest = self.digest(key)
+        with self._lock:
+            self._load()
+            if digest not in self._entries:
+                return None
+            self._entries.move_to_end(digest)
+        body_path, meta_path = self._paths(digest)
+        try:
+            with open(meta_path) as f:
+                meta = json.load(f)
+            with open(body_path, "rb") as f:
+                body = f.read()
+            os.utime(body_path)
+        except OSError:
+            with self._lock:
+                self.total_bytes -= self._entries.pop(digest, 0)
+            return None
+        return body, meta
+
+    def put(self, key: str, body: bytes, meta: Dict) -> None:
+        digest = self.digest(key)
+        body_path, meta_path = self._paths(digest)
+        meta_bytes = json.dumps(meta).encode()
+        size = len(body) + len(meta_bytes)
+        if size > self.max_bytes:
+            return
+        with self._lock:
+            self._load()
+            # Write to temp files and rename so readers never see partial entries
+            for path, data in ((body_path, body), (meta_path, meta_bytes)):
+                with open(path + ".tmp", "wb") as f:
+                    f.write(data)
+                os.replace(path + ".tmp", path)
+            self.total_bytes += size - self._entries.pop(digest, 0)
+            self._entries[digest] = size
+            while self.total_bytes > self.max_bytes and self._entries:
+                old_digest, old_size = self._entries.popitem(last=False)
+                self.total_bytes -= old_size
+                for path in self._paths(old_digest):
+                    try:
+                        os.remove(path)
+                    except OSError:
+                        pass
+
+
+def resize_image(body: bytes, width: int) -> Tuple[bytes, str]:
+    """Downscale to `width` keeping the aspect ratio; returns (body, content_type)"""
+    with Image.open(io.BytesIO(body)) as image:
+        image_format = image.format if image.format in SAVE_FORMATS else "PNG"
+        if image.width > width:
+            image.thumbnail((width, max(1, round(image.height * width / image.width))))
+        if image_format == "JPEG" and image.mode not in ("RGB", "L"):
+            image = image.convert("RGB")
+        output = io.BytesIO()
+        image.save(output, format=image_format, optimize=True)
+    return output.getvalue(), SAVE_FORMATS[image_format]
+
+
+def _resolve_host(host: str, allow_private: bool = False) -> Optional[str]:
+    """
+    Resolve `host` once and return the address to connect to, or None when it
+    does not resolve or (unless allowed) any of its addresses is not public.
+    The connection is pinned to this address so a second lookup cannot be rebound.
+    """
+    try:
+        infos = socket.getaddrinfo(host, None, proto=socket.IPPROTO_TCP)
+    except socket.gaierror:
+        return None
+    addresses = [ipaddress.ip_address(info[4][0]) for info in infos]
+    if not addresses:
+        return None
+    if not allow_private and any(
+        address.is_private or address.is_loopback or address.is_link_local or address.is_reserved
+        for address in addresses
+    ):
+        return None
+    return str(addresses[0])
+
+
+def pinned_request(url: str, address: str) -> Tuple[str, Dict[str, str], Dict[str, str]]:
+    """(url, headers, extensions) connecting to `address` while keeping Host and TLS SNI of `url`"""
+    parts = urlsplit(url)
+    host = f"[{address}]" if ":" in address else address
+    netloc = f"{host}:{parts.port}" if parts.port else host
+    headers = {"Host": parts.netloc.rpartition("@")[2]}
+    extensions = {"sni_hostname": parts.hostname} if parts.scheme == "https" else {}
+    return parts._replace(netloc=netloc).geturl(), headers, extensions
+
+
+class ImageProxy:
+    """Fetches each remote image once and serves cached originals and resized variants"""
+
+    def __init__(self, cache: DiskLRUCache, timeout: float = 10.0, allow_private: bool = False):
+        self.cache = cache
+        self.timeout = timeout
+        self.allow_private = allow_private
+        self._client: Optional[httpx.AsyncClient] = None
+        self._flights = SingleFlight(timeout=timeout * 2)
+
+    def client(self) -> httpx.AsyncClient:
+        if self._client is None:
+            # Redirects are followed manually so every hop passes the host check
+            self._client = httpx.AsyncClient(timeout=httpx.Timeout(self.timeout), follow_redirects=False)
+        return self._client
+
+    async def close(self) -> None:
+        if self._client is not None:
+            await self._client.aclose()
+            self._client = None
+
+    async def _check_url(self, url: str) -> str:
+        """Validate a URL and return the address its host resolved to"""
+        parts = urlsplit(url)
+        if parts.scheme not in ("http", "https") or not parts.hostname:
+            raise HTTPException(status_code=400, detail="Only http(s) image URLs are supported")
+        address = await asyncio.to_thread(_resolve_host, parts.hostname, self.allow_private)
+        if address is None:
+            raise HTTPException(status_code=400, detail="Image host is not allowed")
+        return address
+
+    async def _fetch_original(self, url: str) -> Tuple[bytes, Dict]:
+        cached = await asyncio.to_thread(self.cache.get, url)
+        if cached:
+            return cached
+
+        target = url
+        try:
+            for _ in range(MAX_REDIRECTS + 1):
+                address = await self._check_url(target)
+                pinned_url, headers, extensions = pinned_request(target, address)
+                async with self.client().stream("GET", pinned_url, headers=headers, extensions=extensions) as response:
+                    if response.is_redirect and "location" in response.headers:
+                        target = urljoin(target, response.headers["location"])
+                        continue
+                    body, content_type = await self._read_image(response)
+                    break
+            else:
+                raise HTTPException(status_code=502, detail="Too many redirects")
+        except httpx.HTTPError as e:
+            raise HTTPException(status_code=502, detail=f"Image fetch failed: {str(e)}")
+
+        meta = {"content_type": content_type, "url": url}
+        await asyncio.to_thread(self.cache.put, url, body, meta)
+        return body, meta
+
+    async def _read_image(self, response: httpx.Response) -> Tuple[bytes, str]:
+        if response.status_code != 200:
+            raise HTTPException(status_code=502, detail=f"Image origin returned {response.status_code}")
+        content_type = response.headers.get("content-type", "").split(";")[0].strip()
+        if content_type not in ALLOWED_CONTENT_TYPES:
+            raise HTTPException(status_code=502, detail="Origin did not return a supported image type")
+        chunks, size = [], 0
+        async for chunk in response.aiter_bytes():
+            size += len(chunk)
+            if size > MAX_IMAGE_BYTES:
+                raise HTTPException(status_code=502, detail="Image is too large")
+            chunks.append(chunk)
+        return b"".join(chunks), content_type
+
+    async def _render(self, url: str, width: Optional[int]) -> Tuple[bytes, Dict]:
+        if width is None or Image is None:
+            return await self._flights.do(("original", url), lambda: self._fetch_original(url))
+
+        key = f"{url}#w={width}"
+        cached = await asyncio.to_thread(self.cache.get, key)
+        if cached:
+            return cached
+
+        body, _ = await self._flights.do(("original", url), lambda: self._fetch_original(url))
+        try:
+            resized, content_type = await run_in_pool(resize_image, body, width)
+        except Exception:
+            raise HTTPException(status_code=502, detail="Image could not be decoded")
+        meta = {"content_type": content_type, "url": url, "width": width}
+        await asyncio.to_thread(self.cache.put, key, resized, meta)
+        return resized, meta
+
+    @staticmethod
+    def clamp_width(width: Optional[int]) -> Optional[int]:
+        return None if width is None else min(max(width, MIN_WIDTH), MAX_WIDTH)
+
+    @classmethod
+    def etag(cls, url: str, width: Optional[int] = None) -> str:
+        """ETag of a variant; it depends only on the URL and width, so it is known before any fetch"""
+        return f'"{DiskLRUCache.digest(f"{url}#w={cls.clamp_width(width)}")[:32]}"'
+
+    async def get(self, url: str, width: Optional[int] = None) -> Tuple[bytes, Dict, str]:
+        """Return (body, meta, etag) for an image, resized to `width` when given"""
+        width = self.clamp_width(width)
+        body, meta = await self._flights.do(("variant", url, width), lambda: self._render(url, width))
+        # Entries cached before the type allowlist may still hold e.g. SVG
+        if meta.get("content_type") not in ALLOWED_CONTENT_TYPES:
+            raise HTTPException(status_code=502, detail="Origin did not return a supported image type")
+        return body, meta, self.etag(url, width)
+
+
+def proxy_image_url(url: Optional[str], width: Optional[int] = None) -> Optional[str]:
+    """Rewrite a third-party image URL to go through the image proxy"""
+    if not url:
+        return url
+    proxied = f"/api/images?url={quote(url, safe='')}"
+    if width:
+        proxied += f"&w={width}"
+    return proxied
+
+
+image_proxy = ImageProxy(
+    DiskLRUCache(
+        os.getenv("IMAGE_CACHE_DIR", ".image_cache"),
+        int(os.getenv("IMAGE_CACHE_MAX_MB", "200")) * 1024 * 1024,
+    ),
+    timeout=float(os.getenv("IMAGE_PROXY_TIMEOUT", "10")),
+    allow_private=os.getenv("IMAGE_PROXY_ALLOW_PRIVATE", "false").lower() == "true",
+)
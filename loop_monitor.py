@@ -0,0 +1,115 @@
+import asyncio
+import os
+import sys
+import threading
+import time
+import traceback
+from collections import deque
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime
+from functools import partial
+from typing import Any, Callable, Deque, Dict, Optional
+
+
+class LoopLagMonitor:
+    """
+    Detects event-loop stalls. A heartbeat task stamps the loop every
+    `interval`; a watchdog thread samples the loop thread's stack whenever the
+    heartbeat is older than `threshold`, so the blocking code shows up in the report.
+    """
+
+    def __init__(self, interval: float = 0.05, threshold: float = 0.1, max_stalls: int = 50):
+        self.interval = interval
+        self.threshold = threshold
+        self.stalls: Deque[Dict] = deque(maxlen=max_stalls)
+        self.max_lag_ms = 0.0
+        self.samples = 0
+        self.total_lag_ms = 0.0
+        self._heartbeat = time.monotonic()
+        self._loop_thread_id: Optional[int] = None
+        self._task: Optional[asyncio.Task] = None
+        self._watchdog: Optional[threading.Thread] = None
+        self._stop = threading.Event()
+        self._sampled_stall = False
+
+    async def _beat(self) -> None:
+        while True:
+            expected = time.monotonic() + self.interval
+            await asyncio.sleep(self.interval)
+            now = time.monotonic()
+            lag_ms = max(now - expected, 0.0) * 1000
+            self._heartbeat = now
+            self.samples += 1
+            self.total_lag_ms += lag_ms
+            self.max_lag_ms = max(self.max_lag_ms, lag_ms)
+            if self._sampled_stall:
+                self._sampled_stall = False
+                if self.stalls:
+                    self.stalls[-1]["lag_ms"] = round(lag_ms, 2)
+
+    def _watch(self) -> None:
+        while not self._stop.wait(self.threshold / 2):
+            stalled_for = time.monotonic() - self._heartbeat - self.interval
+            if stalled_for < self.threshold or self._sampled_stall:
+                continue
+            frame = sys._current_frames().get(self._loop_thread_id)
+            if frame is None:
+                continue
+            self._sampled_stall = True
+            self.stalls.append({
+                "at": datetime.utcnow(),
+                "lag_ms": round(stalled_for * 1000, 2),
+                "stack": [line.rstrip() for line in traceback.format_stack(frame, limit=15)],
+            })
+
+    def start(self) -> None:
+        if self._task is not None:
+            return
+        self._loop_thread_id = threading.get_ident()
+        self._heartbeat = time.monotonic()
+        self._stop.clear()
+        self._task = asyncio.create_task(self._beat())
+        self._watchdog = threading.Thread(target=self._watch, name="loop-lag-watchdog", daemon=True)
+        self._watchdog.start()
+
+    async def stop(self) -> None:
+        self._stop.set()
+        if self._task is not None:
+            self._task.cancel()
+            await asyncio.gather(self._task, return_exceptions=True)
+            self._task = None
+
+    def report(self) -> Dict[str, Any]:
+        return {
+            "threshold_ms": self.threshold * 1000,
+            "samples": self.samples,
+            "avg_lag_ms": round(self.total_lag_ms / self.samples, 2) if self.samples else 0.0,
+            "max_lag_ms": round(self.max_lag_ms, 2),
+            "stalls": list(reversed(self.stalls)),
+        }
+
+
+OFFLOAD_THRESHOLD = int(os.getenv("OFFLOAD_THRESHOLD", "200"))
+_executor = ThreadPoolExecutor(
+    max_workers=int(os.getenv("OFFLOAD_WORKERS", "2")),
+    thread_name_prefix="offload",
+)
+
+
+async def run_in_pool(fn: Callable, *args: Any, **kwargs: Any) -> Any:
+    """Run CPU-heavy work in the bounded offload pool"""
+    loop = asyncio.get_running_loop()
+    return await loop.run_in_executor(_executor, partial(fn, *args, **kwargs))
+
+
+async def offload(fn: Callable, *args: Any, size: int = 0, **kwargs: Any) -> Any:
+    """Run work in the bounded pool when its payload reaches OFFLOAD_THRESHOLD items, inline otherwise"""
+    if size < OFFLOAD_THRESHOLD:
+        return fn(*args, **kwargs)
+    return await run_in_pool(fn, *args, **kwargs)
+
+
+loop_monitor = LoopLagMonitor(
+    interval=float(os.getenv("LOOP_LAG_INTERVAL_MS", "50")) / 1000,
+    threshold=float(os.getenv("LOOP_LAG_THRESHOLD_MS", "100")) / 1000,
+)
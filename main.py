@@ -2,18 +2,81 @@ from fastapi import FastAPI, Request
 from fastapi.responses import JSONResponse
 from fastapi.middleware.cors import CORSMiddleware
 from contextlib import asynccontextmanager
-
-from database import Database
-from routes import public, admin, token, alpha_insight, accounts, transactions
+import asyncio
+import os
+
+from pymongo.errors import ExecutionTimeout, ServerSelectionTimeoutError
+
+from compression import CompressionMiddleware
+from overload import OverloadMiddleware, DEFAULT_ROUTE_DEADLINES, parse_route_deadlines
+from query_budget import QueryBudgetMiddleware, query_budgets
+from rate_limit import RateLimitMiddleware, rate_limiter
+from database import Database, ensure_indexes, get_collection, get_alpha_insight_collection
+from routes import public, admin, token, alpha_insight, accounts, transactions, export, images, batch, alerts
+from search import insight_index
+from autocomplete import airdrop_name_index
+from alert_engine import price_alerts
+from reminders import reminder_scheduler
+from poller import token_poller
+from retention import coin_compactor
+from loop_monitor import loop_monitor
+from airdrop_calendar import backfill_event_at
+from image_proxy import image_proxy
 
 
 @asynccontextmanager
 async def lifespan(app: FastAPI):
     # Startup
     print("🚀 Starting up...")
+    loop_monitor.start()
+    # Index builds run in the background so startup is not blocked
+    index_task = asyncio.create_task(ensure_indexes())
+    try:
+        count = await backfill_event_at()
+        if count:
+            print(f"📅 Backfilled event_at for {count} airdrops")
+    except Exception as e:
+        print(f"Airdrop event_at backfill failed: {str(e)}")
+    try:
+        count = await airdrop_name_index.rebuild(get_collection())
+        print(f"🔤 Indexed {count} airdrop names")
+    except Exception as e:
+        print(f"Airdrop name index not built at startup: {str(e)}")
+    try:
+        count = await insight_index.rebuild(get_alpha_insight_collection())
+        print(f"🔎 Indexed {count} alpha insights")
+    except Exception as e:
+        print(f"Alpha insight index not built at startup: {str(e)}")
+    try:
+        count = await price_alerts.rebuild()
+        print(f"🔔 Loaded {count} price alerts")
+    except Exception as e:
+        print(f"Price alerts not loaded at startup: {str(e)}")
+    price_alerts.start()
+    if os.getenv("REMINDERS_ENABLED", "true").lower() == "true":
+        try:
+            count = await reminder_scheduler.rebuild()
+            print(f"⏰ Scheduled reminders for {count} upcoming airdrops")
+        except Exception as e:
+            print(f"Airdrop reminders not loaded at startup: {str(e)}")
+        reminder_scheduler.start()
+    if os.getenv("TOKEN_POLLER_ENABLED", "true").lower() == "true":
+        try:
+            await token_poller.start()
+        except Exception as e:
+            print(f"Token poller not started: {str(e)}")
+    if os.getenv("COIN_COMPACTION_ENABLED", "true").lower() == "true":
+        coin_compactor.start()
     yield
     # Shutdown
     print("👋 Shutting down...")
+    await coin_compactor.stop()
+    await token_poller.stop()
+    await price_alerts.stop()
+    await reminder_scheduler.stop()
+    index_task.cancel()
+    await loop_monitor.stop()
+    await image_proxy.close()
     await Database.close()
 
 
@@ -23,14 +86,39 @@ app = FastAPI(
     lifespan=lifespan
 )
 
-# CORS middleware
+# Response compression (gzip/brotli), compressed bodies cached by content
+app.add_middleware(
+    CompressionMiddleware,
+    minimum_size=int(os.getenv("COMPRESSION_MIN_SIZE", "1024")),
+    cache_size=int(os.getenv("COMPRESSION_CACHE_SIZE", "256")),
+)
+
+# Per-request query metering against endpoint budgets (QUERY_BUDGET_MODE=warn|enforce)
+if query_budgets.mode != "off":
+    app.add_middleware(QueryBudgetMiddleware, monitor=query_budgets)
+
+# Concurrency limit with load shedding and per-route deadlines
+app.add_middleware(
+    OverloadMiddleware,
+    max_in_flight=int(os.getenv("MAX_IN_FLIGHT", "64")),
+    max_queue=int(os.getenv("MAX_QUEUE", "128")),
+    queue_timeout=float(os.getenv("QUEUE_TIMEOUT_MS", "1000")) / 1000,
+    default_deadline=float(os.getenv("REQUEST_DEADLINE_MS", "10000")) / 1000,
+    route_deadlines=parse_route_deadlines(os.getenv("ROUTE_DEADLINES", DEFAULT_ROUTE_DEADLINES)),
+)
+
+# Throttled clients are turned away before taking an overload slot
+app.add_middleware(RateLimitMiddleware, limiter=rate_limiter)
+
+# CORS middleware, registered last so it is outermost and also covers the
+# 429/503/504/500 responses produced by the middlewares above
 app.add_middleware(
     CORSMiddleware,
     allow_origins=["*"],
     allow_credentials=True,
     allow_methods=["GET", "POST", "PUT", "DELETE", "OPTIONS"],
     allow_headers=["*"],
-    expose_headers=["ETag", "Last-Modified", "Content-Type"],
+    expose_headers=["ETag", "Last-Modified", "Content-Type", "RateLimit-Limit", "RateLimit-Remaining", "RateLimit-Reset", "Retry-After"],
     max_age=3600,
 )
 
@@ -44,6 +132,23 @@ async def value_error_handler(request: Request, exc: ValueError):
     )
 
 
+@app.exception_handler(ExecutionTimeout)
+async def execution_timeout_handler(request: Request, exc: ExecutionTimeout):
+    return JSONResponse(
+        status_code=504,
+        content={"error": "deadline_exceeded", "detail": "Database query exceeded the request deadline"}
+    )
+
+
+@app.exception_handler(ServerSelectionTimeoutError)
+async def server_selection_timeout_handler(request: Request, exc: ServerSelectionTimeoutError):
+    return JSONResponse(
+        status_code=503,
+        content={"error": "database_unavailable", "detail": "Database is not reachable"},
+        headers={"Retry-After": "5"}
+    )
+
+
 @app.exception_handler(Exception)
 async def general_exception_handler(request: Request, exc: Exception):
     return JSONResponse(
@@ -59,6 +164,10 @@ app.include_router(token.router, tags=["Tokens"])
 app.include_router(alpha_insight.router, tags=["Alpha Insights"])
 app.include_router(accounts.router, tags=["Accounts"])
 app.include_router(transactions.router, tags=["Transactions"])
+app.include_router(export.router, tags=["Export"])
+app.include_router(images.router, tags=["Images"])
+app.include_router(alerts.router, tags=["Alerts"])
+app.include_router(batch.router, tags=["Batch"])
 
 
 @app.get("/")
@@ -0,0 +1,1004 @@
+import copy
+import re
+from datetime import datetime, timedelta
+from typing import Any, Callable, Dict, Iterable, List, Optional, Tuple
+
+import bson
+import pytz
+from bson import ObjectId, Regex
+from pymongo import ReturnDocument
+from pymongo.errors import DuplicateKeyError, OperationFailure
+from pymongo.operations import DeleteMany, DeleteOne, InsertOne, ReplaceOne, UpdateMany, UpdateOne
+from pymongo.results import BulkWriteResult, DeleteResult, InsertManyResult, InsertOneResult, UpdateResult
+
+
+MISSING = object()
+
+# BSON comparison order of value types (numbers compare with each other)
+TYPE_ORDER = {type(None): 1, int: 2, float: 2, str: 3, dict: 4, list: 5, bytes: 6, ObjectId: 7, bool: 8, datetime: 9}
+TYPE_ALIASES = {
+    "double": (float,), "string": (str,), "object": (dict,), "array": (list,), "objectId": (ObjectId,),
+    "bool": (bool,), "date": (datetime,), "null": (type(None),), "int": (int,), "long": (int,),
+    "number": (int, float),
+}
+
+
+def to_bson(doc: Dict) -> Dict:
+    """Round-trip through BSON so stored values behave exactly as MongoDB would return them"""
+    return bson.decode(bson.encode(doc))
+
+
+def type_rank(value: Any) -> int:
+    if isinstance(value, bool):
+        return TYPE_ORDER[bool]
+    return TYPE_ORDER.get(type(value), 10)
+
+
+def sort_key(value: Any) -> Tuple:
+    """Total order over BSON values, as used by $sort"""
+    if value is MISSING:
+        value = None
+    rank = type_rank(value)
+    if isinstance(value, dict):
+        return rank, tuple((key, sort_key(item)) for key, item in value.items())
+    if isinstance(value, list):
+        return rank, tuple(sort_key(item) for item in value)
+    if value is None:
+        return rank, 0
+    return rank, value
+
+
+def get_path(doc: Any, path: str) -> Any:
+    """Value at a dotted path; lists are traversed element-wise"""
+    current = doc
+    for part in path.split("."):
+        if isinstance(current, dict):
+            current = current.get(part, MISSING)
+        elif isinstance(current, list):
+            if part.isdigit():
+                index = int(part)
+                current = current[index] if index < len(current) else MISSING
+            else:
+                values = [get_path(item, part) for item in current if isinstance(item, dict)]
+                current = [value for value in values if value is not MISSING] or MISSING
+        else:
+            return MISSING
+        if current is MISSING:
+            return MISSING
+    return current
+
+
+def set_path(doc: Dict, path: str, value: Any) -> None:
+    parts = path.split(".")
+    for part in parts[:-1]:
+        doc = doc.setdefault(part, {})
+    doc[parts[-1]] = value
+
+
+def unset_path(doc: Dict, path: str) -> None:
+    parts = path.split(".")
+    for part in parts[:-1]:
+        doc = doc.get(part)
+        if not isinstance(doc, dict):
+            return
+    doc.pop(parts[-1], None)
+
+
+# ---------------------------------------------------------------------------
+# Query matching
+# ---------------------------------------------------------------------------
+
+def _fold(value: Any, collation: Optional[Dict]) -> Any:
+    if collation and isinstance(value, str) and collation.get("strength", 3) <= 2:
+        return value.casefold()
+    return value
+
+
+def _equals(value: Any, target: Any, collation: Optional[Dict]) -> bool:
+    if isinstance(target, (re.Pattern, Regex)):
+        return _regex_match(value, target)
+    if value is MISSING:
+        return target is None
+    if isinstance(value, list) and not isinstance(target, list):
+        return any(_equals(item, target, collation) for item in value)
+    if type_rank(value) != type_rank(target):
+        return False
+    return _fold(value, collation) == _fold(target, collation)
+
+
+def _compare(value: Any, target: Any, op: Callable[[Any, Any], bool], collation: Optional[Dict]) -> bool:
+    if isinstance(value, list):
+        return any(_compare(item, target, op, collation) for item in value)
+    if value is MISSING or type_rank(value) != type_rank(target):
+        return False
+    return op(sort_key(_fold(value, collation)), sort_key(_fold(target, collation)))
+
+
+def _regex_match(value: Any, pattern: Any, options: str = "") -> bool:
+    if isinstance(pattern, Regex):
+        pattern = pattern.try_compile()
+    if isinstance(pattern, str):
+        flags = (re.IGNORECASE if "i" in options else 0) | (re.MULTILINE if "m" in options else 0)
+        pattern = re.compile(pattern, flags)
+    if isinstance(value, list):
+        return any(_regex_match(item, pattern) for item in value)
+    return isinstance(value, str) and pattern.search(value) is not None
+
+
+def _matches_operators(value: Any, condition: Dict, collation: Optional[Dict]) -> bool:
+    for op, target in condition.items():
+        if op == "$eq":
+            ok = _equals(value, target, collation)
+        elif op == "$ne":
+            ok = not _equals(value, target, collation)
+        elif op == "$gt":
+            ok = _compare(value, target, lambda a, b: a > b, collation)
+        elif op == "$gte":
+            ok = _compare(value, target, lambda a, b: a >= b, collation)
+        elif op == "$lt":
+            ok = _compare(value, target, lambda a, b: a < b, collation)
+        elif op == "$lte":
+            ok = _compare(value, target, lambda a, b: a <= b, collation)
+        elif op == "$in":
+            ok = any(_equals(value, item, collation) for item in target)
+        elif op == "$nin":
+            ok = not any(_equals(value, item, collation) for item in target)
+        elif op == "$exists":
+            ok = (value is not MISSING) == bool(target)
+        elif op == "$type":
+            types = tuple(t for name in (target if isinstance(target, list) else [target]) for t in TYPE_ALIASES[name])
+            candidates = value if isinstance(value, list) and list not in types else [value]
+            ok = any(
+                isinstance(item, types) and not (isinstance(item, bool) and bool not in types)
+                for item in candidates if item is not MISSING
+            )
+        elif op == "$regex":
+            ok = _regex_match(value, target, condition.get("$options", ""))
+        elif op == "$options":
+            continue
+        elif op == "$not":
+            ok = not _matches_operators(value, target, collation)
+        elif op == "$size":
+            ok = isinstance(value, list) and len(value) == target
+        elif op == "$all":
+            ok = all(_equals(value, item, collation) for item in target)
+        elif op == "$elemMatch":
+            ok = isinstance(value, list) and any(
+                matches(item, target, collation) if isinstance(item, dict) else _matches_operators(item, target, collation)
+                for item in value
+            )
+        else:
+            raise OperationFailure(f"unknown operator: {op}")
+        if not ok:
+            return False
+    return True
+
+
+def matches(doc: Dict, query: Optional[Dict], collation: Optional[Dict] = None) -> bool:
+    """True when `doc` satisfies a MongoDB query document"""
+    for key, condition in (query or {}).items():
+        if key == "$and":
+            ok = all(matches(doc, sub, collation) for sub in condition)
+        elif key == "$or":
+            ok = any(matches(doc, sub, collation) for sub in condition)
+        elif key == "$nor":
+            ok = not any(matches(doc, sub, collation) for sub in condition)
+        elif key == "$expr":
+            ok = bool(evaluate(condition, doc))
+        else:
+            value = get_path(doc, key)
+            if isinstance(condition, dict) and condition and all(op.startswith("$") for op in condition):
+                ok = _matches_operators(value, condition, collation)
+            else:
+                ok = _equals(value, condition, collation)
+        if not ok:
+            return False
+    return True
+
+
+def sort_documents(docs: List[Dict], sort: Iterable[Tuple[str, int]]) -> List[Dict]:
+    for field, direction in reversed(list(sort)):
+        docs.sort(key=lambda doc: sort_key(get_path(doc, field)), reverse=direction == -1)
+    return docs
+
+
+def normalize_sort(key: Any, direction: Optional[int] = None) -> List[Tuple[str, int]]:
+    if isinstance(key, str):
+        return [(key, direction or 1)]
+    if isinstance(key, dict):
+        return list(key.items())
+    return [tuple(item) for item in key or []]
+
+
+def apply_projection(doc: Dict, projection: Optional[Dict]) -> Dict:
+    if not projection:
+        return doc
+    include_id = bool(projection.get("_id", 1))
+    fields = {key: value for key, value in projection.items() if key != "_id"}
+    if not fields and include_id:
+        return {"_id": doc["_id"]} if "_id" in doc else {}
+    if fields and all(value for value in fields.values()):
+        result = {}
+        if include_id and "_id" in doc:
+            result["_id"] = doc["_id"]
+        for field in fields:
+            value = get_path(doc, field)
+            if value is not MISSING:
+                set_path(result, field, value)
+        return result
+    result = copy.deepcopy(doc)
+    for field, value in projection.items():
+        if not value:
+            unset_path(result, field)
+    return result
+
+
+# ---------------------------------------------------------------------------
+# Updates
+# ---------------------------------------------------------------------------
+
+def apply_update(doc: Dict, update: Dict, inserting: bool = False) -> None:
+    if not update or not all(key.startswith("$") for key in update):
+        raise ValueError("update only works with $ operators")
+    for op, fields in update.items():
+        for path, value in fields.items():
+            current = get_path(doc, path)
+            if op == "$set":
+                set_path(doc, path, value)
+            elif op == "$setOnInsert":
+                if inserting:
+                    set_path(doc, path, value)
+            elif op == "$unset":
+                unset_path(doc, path)
+            elif op == "$inc":
+                set_path(doc, path, (0 if current is MISSING else current) + value)
+            elif op == "$mul":
+                set_path(doc, path, (0 if current is MISSING else current) * value)
+            elif op == "$max":
+                if current is MISSING or sort_key(value) > sort_key(current):
+                    set_path(doc, path, value)
+            elif op == "$min":
+                if current is MISSING or sort_key(value) < sort_key(current):
+                    set_path(doc, path, value)
+            elif op == "$push":
+                items = value["$each"] if isinstance(value, dict) and "$each" in value else [value]
+                set_path(doc, path, (list(current) if isinstance(current, list) else []) + list(items))
+            elif op == "$addToSet":
+                items = value["$each"] if isinstance(value, dict) and "$each" in value else [value]
+                existing = list(current) if isinstance(current, list) else []
+                set_path(doc, path, existing + [item for item in items if item not in existing])
+            elif op == "$pull":
+                if isinstance(current, list):
+                    set_path(doc, path, [item for item in current if not _pull_matches(item, value)])
+            else:
+                raise OperationFailure(f"Unknown modifier: {op}")
+
+
+def _pull_matches(item: Any, condition: Any) -> bool:
+    """$pull condition: a query against embedded documents, otherwise a value/operator match"""
+    if isinstance(condition, dict) and isinstance(item, dict) and not all(key.startswith("$") for key in condition):
+        return matches(item, condition)
+    if isinstance(condition, dict) and condition and all(key.startswith("$") for key in condition):
+        return _matches_operators(item, condition, None)
+    return _equals(item, condition, None)
+
+
+def upsert_seed(query: Dict) -> Dict:
+    """Document an upsert starts from: the equality fields of its filter"""
+    seed: Dict = {}
+    for key, condition in (query or {}).items():
+        if key.startswith("$"):
+            continue
+        if isinstance(condition, dict) and condition and all(op.startswith("$") for op in condition):
+            if "$eq" in condition:
+                set_path(seed, key, condition["$eq"])
+            continue
+        set_path(seed, key, condition)
+    return seed
+
+
+# ---------------------------------------------------------------------------
+# Aggregation expressions
+# ---------------------------------------------------------------------------
+
+def _tz(name: Optional[str]):
+    if not name:
+        return pytz.utc
+    try:
+        return pytz.timezone(name)
+    except pytz.UnknownTimeZoneError:
+        raise OperationFailure(f"unrecognized time zone identifier: {name}")
+
+
+def _to_local(value: datetime, tz_name: Optional[str]) -> datetime:
+    return pytz.utc.localize(value).astimezone(_tz(tz_name))
+
+
+def _from_local(value: datetime) -> datetime:
+    return value.astimezone(pytz.utc).replace(tzinfo=None)
+
+
+def date_trunc(value: datetime, unit: str, tz_name: Optional[str] = None, bin_size: int = 1) -> datetime:
+    if bin_size != 1:
+        raise OperationFailure("$dateTrunc binSize other than 1 is not supported in memory")
+    local = _to_local(value, tz_name).replace(tzinfo=None)
+    if unit == "second":
+        local = local.replace(microsecond=0)
+    elif unit == "minute":
+        local = local.replace(second=0, microsecond=0)
+    elif unit == "hour":
+        local = local.replace(minute=0, second=0, microsecond=0)
+    elif unit == "day":
+        local = local.replace(hour=0, minute=0, second=0, microsecond=0)
+    elif unit == "week":
+        local = (local - timedelta(days=(local.weekday() + 1) % 7)).replace(hour=0, minute=0, second=0, microsecond=0)
+    elif unit == "month":
+        local = local.replace(day=1, hour=0, minute=0, second=0, microsecond=0)
+    elif unit == "quarter":
+        local = local.replace(month=(local.month - 1) // 3 * 3 + 1, day=1, hour=0, minute=0, second=0, microsecond=0)
+    elif unit == "year":
+        local = local.replace(month=1, day=1, hour=0, minute=0, second=0, microsecond=0)
+    else:
+        raise OperationFailure(f"unknown $dateTrunc unit: {unit}")
+    return _from_local(_tz(tz_name).localize(local))
+
+
+def date_to_string(value: datetime, fmt: str, tz_name: Optional[str] = None) -> str:
+    local = _to_local(value, tz_name)
+    fmt = fmt.replace("%L", f"{local.microsecond // 1000:03d}")
+    return local.strftime(fmt)
+
+
+def _to_string(value: Any) -> Optional[str]:
+    if value is None:
+        return None
+    if isinstance(value, datetime):
+        return value.strftime("%Y-%m-%dT%H:%M:%S.") + f"{value.microsecond // 1000:03d}Z"
+    if isinstance(value, bool):
+        return "true" if value else "false"
+    return str(value)
+
+
+def _truthy(value: Any) -> bool:
+    return value not in (None, False, 0, MISSING) and value is not MISSING
+
+
+def _args(doc: Dict, args: Any) -> List[Any]:
+    return [evaluate(arg, doc) for arg in (args if isinstance(args, list) else [args])]
+
+
+def _numeric(values: List[Any], fn: Callable[[Any, Any], Any]) -> Any:
+    if any(value is None or value is MISSING for value in values):
+        return None
+    result = values[0]
+    for value in values[1:]:
+        result = fn(result, value)
+    return result
+
+
+def evaluate(expression: Any, doc: Dict) -> Any:
+    """Evaluate an aggregation expression against a document"""
+    if isinstance(expression, str) and expression.startswith("$$"):
+        if expression in ("$$ROOT", "$$CURRENT"):
+            return doc
+        raise OperationFailure(f"unknown variable: {expression}")
+    if isinstance(expression, str) and expression.startswith("$"):
+        return get_path(doc, expression[1:])
+    if isinstance(expression, list):
+        return [evaluate(item, doc) for item in expression]
+    if not isinstance(expression, dict):
+        return expression
+    if len(expression) != 1 or not next(iter(expression)).startswith("$"):
+        result = {}
+        for key, item in expression.items():
+            value = evaluate(item, doc)
+            if value is not MISSING:
+                result[key] = value
+        return result
+
+    op, args = next(iter(expression.items()))
+    if op == "$literal":
+        return args
+    if op == "$cond":
+        if isinstance(args, dict):
+            args = [args["if"], args["then"], args["else"]]
+        return evaluate(args[1] if _truthy(evaluate(args[0], doc)) else args[2], doc)
+    if op == "$ifNull":
+        for arg in args:
+            value = evaluate(arg, doc)
+            if value is not None and value is not MISSING:
+                return value
+        return None
+    if op == "$and":
+        return all(_truthy(evaluate(arg, doc)) for arg in args)
+    if op == "$or":
+        return any(_truthy(evaluate(arg, doc)) for arg in args)
+    if op == "$not":
+        return not _truthy(_args(doc, args)[0])
+
+    # Date operators take an options document; every other operator takes argument expressions
+    values = _args(doc, args) if op not in ("$dateTrunc", "$dateToString") else None
+    if op in ("$eq", "$ne", "$gt", "$gte", "$lt", "$lte", "$cmp"):
+        left, right = (sort_key(value) for value in values)
+        return {
+            "$eq": left == right, "$ne": left != right, "$gt": left > right, "$gte": left >= right,
+            "$lt": left < right, "$lte": left <= right, "$cmp": (left > right) - (left < right),
+        }[op]
+    if op == "$in":
+        return any(sort_key(values[0]) == sort_key(item) for item in values[1])
+    if op == "$size":
+        if not isinstance(values[0], list):
+            raise OperationFailure("The argument to $size must be an array")
+        return len(values[0])
+    if op == "$add":
+        if any(isinstance(value, datetime) for value in values):
+            base = next(value for value in values if isinstance(value, datetime))
+            millis = sum(value for value in values if not isinstance(value, datetime))
+            return base + timedelta(milliseconds=millis)
+        return _numeric(values, lambda a, b: a + b)
+    if op == "$subtract":
+        left, right = values
+        if isinstance(left, datetime) and isinstance(right, datetime):
+            return int((left - right).total_seconds() * 1000)
+        if isinstance(left, datetime):
+            return left - timedelta(milliseconds=right)
+        return _numeric(values, lambda a, b: a - b)
+    if op == "$multiply":
+        return _numeric(values, lambda a, b: a * b)
+    if op == "$divide":
+        return _numeric(values, lambda a, b: a / b)
+    if op in ("$max", "$min"):
+        present = [value for value in (values[0] if len(values) == 1 and isinstance(values[0], list) else values)
+                   if value is not None and value is not MISSING]
+        if not present:
+            return None
+        return (max if op == "$max" else min)(present, key=sort_key)
+    if op == "$concat":
+        return None if any(value is None or value is MISSING for value in values) else "".join(values)
+    if op == "$toString":
+        return _to_string(values[0])
+    if op == "$slice":
+        array, *rest = values
+        if array is None or array is MISSING:
+            return None
+        if len(rest) == 1:
+            count = rest[0]
+            return array[:count] if count >= 0 else array[count:]
+        return array[rest[0]:rest[0] + rest[1]]
+    if op == "$arrayElemAt":
+        array, index = values
+        return array[index] if -len(array) <= index < len(array) else MISSING
+    if op == "$dateTrunc":
+        date = evaluate(args["date"], doc)
+        if date is None or date is MISSING:
+            return None
+        return date_trunc(date, evaluate(args["unit"], doc), evaluate(args.get("timezone"), doc), args.get("binSize", 1))
+    if op == "$dateToString":
+        date = evaluate(args["date"], doc)
+        if date is None or date is MISSING:
+            return args.get("onNull")
+        return date_to_string(date, args.get("format", "%Y-%m-%dT%H:%M:%S.%LZ"), evaluate(args.get("timezone"), doc))
+    raise OperationFailure(f"Unrecognized expression '{op}'")
+
+
+# ---------------------------------------------------------------------------
+# Aggregation stages
+# ---------------------------------------------------------------------------
+
+def _freeze(value: Any) -> Any:
+    if isinstance(value, dict):
+        return tuple((key, _freeze(item)) for key, item in value.items())
+    if isinstance(value, list):
+        return ("__list__",) + tuple(_freeze(item) for item in value)
+    return sort_key(value)
+
+
+def _group(docs: List[Dict], spec: Dict) -> List[Dict]:
+    groups: Dict[Any, Dict] = {}
+    for doc in docs:
+        key = evaluate(spec["_id"], doc)
+        key = None if key is MISSING else key
+        group = groups.setdefault(_freeze(key), {"_id": key, "__values__": {}})
+        for field, accumulator in spec.items():
+            if field == "_id":
+                continue
+            (op, expression), = accumulator.items()
+            value = evaluate(expression, doc)
+            group["__values__"].setdefault(field, []).append((op, value))
+
+    results = []
+    for group in groups.values():
+        result = {"_id": group["_id"]}
+        for field, accumulator in spec.items():
+            if field == "_id":
+                continue
+            (op, _), = accumulator.items()
+            values = [value for _, value in group["__values__"].get(field, [])]
+            present = [value for value in values if value is not None and value is not MISSING]
+            if op == "$sum":
+                result[field] = sum(value for value in present if isinstance(value, (int, float)) and not isinstance(value, bool))
+            elif op == "$avg":
+                numbers = [value for value in present if isinstance(value, (int, float))]
+                result[field] = sum(numbers) / len(numbers) if numbers else None
+            elif op == "$first":
+                result[field] = None if not values or values[0] is MISSING else values[0]
+            elif op == "$last":
+                result[field] = None if not values or values[-1] is MISSING else values[-1]
+            elif op == "$max":
+                result[field] = max(present, key=sort_key) if present else None
+            elif op == "$min":
+                result[field] = min(present, key=sort_key) if present else None
+            elif op == "$push":
+                result[field] = [value for value in values if value is not MISSING]
+            elif op == "$addToSet":
+                unique: Dict[Any, Any] = {}
+                for value in values:
+                    if value is not MISSING:
+                        unique.setdefault(_freeze(value), value)
+                result[field] = list(unique.values())
+            elif op == "$count":
+                result[field] = len(values)
+            else:
+                raise OperationFailure(f"unknown group operator '{op}'")
+        results.append(result)
+    return results
+
+
+def _project(docs: List[Dict], spec: Dict) -> List[Dict]:
+    fields = {key: value for key, value in spec.items() if key != "_id"}
+    exclusion = fields and all(value in (0, False) for value in fields.values())
+    if exclusion or (not fields and spec.get("_id") in (0, False)):
+        return [apply_projection(doc, spec) for doc in docs]
+
+    results = []
+    for doc in docs:
+        result = {}
+        id_spec = spec.get("_id", 1)
+        if id_spec not in (0, False) and "_id" in doc:
+            result["_id"] = doc["_id"] if id_spec in (1, True) else evaluate(id_spec, doc)
+        for field, value in fields.items():
+            if value in (1, True):
+                current = get_path(doc, field)
+                if current is not MISSING:
+                    set_path(result, field, current)
+            else:
+                computed = evaluate(value, doc)
+                if computed is not MISSING:
+                    set_path(result, field, computed)
+        results.append(result)
+    return results
+
+
+def _unwind(docs: List[Dict], spec: Any) -> List[Dict]:
+    if isinstance(spec, str):
+        spec = {"path": spec}
+    path = spec["path"][1:]
+    keep_empty = spec.get("preserveNullAndEmptyArrays", False)
+    results = []
+    for doc in docs:
+        value = get_path(doc, path)
+        if isinstance(value, list) and value:
+            for item in value:
+                unwound = copy.deepcopy(doc)
+                set_path(unwound, path, item)
+                results.append(unwound)
+        elif value not in (MISSING, None) and not isinstance(value, list):
+            results.append(doc)
+        elif keep_empty:
+            results.append(doc)
+    return results
+
+
+def run_pipeline(docs: List[Dict], pipeline: List[Dict], index_stats: Callable[[], List[Dict]]) -> List[Dict]:
+    for stage in pipeline:
+        (name, spec), = stage.items()
+        if name == "$match":
+            docs = [doc for doc in docs if matches(doc, spec)]
+        elif name == "$sort":
+            docs = sort_documents(list(docs), spec.items())
+        elif name == "$group":
+            docs = _group(docs, spec)
+        elif name == "$project":
+            docs = _project(docs, spec)
+        elif name in ("$addFields", "$set"):
+            updated = []
+            for doc in docs:
+                doc = copy.deepcopy(doc)
+                for field, expression in spec.items():
+                    set_path(doc, field, evaluate(expression, doc))
+                updated.append(doc)
+            docs = updated
+        elif name == "$unset":
+            docs = [apply_projection(doc, {field: 0 for field in ([spec] if isinstance(spec, str) else spec)}) for doc in docs]
+        elif name == "$unwind":
+            docs = _unwind(docs, spec)
+        elif name == "$limit":
+            docs = docs[:spec]
+        elif name == "$skip":
+            docs = docs[spec:]
+        elif name == "$count":
+            docs = [{spec: len(docs)}] if docs else []
+        elif name == "$indexStats":
+            docs = index_stats()
+        else:
+            raise OperationFailure(f"Unrecognized pipeline stage name: '{name}'")
+    return docs
+
+
+# ---------------------------------------------------------------------------
+# Motor-compatible collection API
+# ---------------------------------------------------------------------------
+
+class MemoryCursor:
+    """Lazily evaluated cursor supporting the chaining used with Motor cursors"""
+
+    def __init__(self, producer: Callable[["MemoryCursor"], List[Dict]]):
+        self._producer = producer
+        self._sort: List[Tuple[str, int]] = []
+        self._skip = 0
+        self._limit = 0
+        self._results: Optional[List[Dict]] = None
+        self._position = 0
+
+    def sort(self, key: Any, direction: Optional[int] = None) -> "MemoryCursor":
+        self._sort = normalize_sort(key, direction)
+        return self
+
+    def skip(self, count: int) -> "MemoryCursor":
+        self._skip = count
+        return self
+
+    def limit(self, count: int) -> "MemoryCursor":
+        self._limit = count
+        return self
+
+    def batch_size(self, size: int) -> "MemoryCursor":
+        return self
+
+    def max_time_ms(self, ms: Optional[int]) -> "MemoryCursor":
+        return self
+
+    def _materialize(self) -> List[Dict]:
+        if self._results is None:
+            self._results = self._producer(self)
+        return self._results
+
+    async def to_list(self, length: Optional[int] = None) -> List[Dict]:
+        results = self._materialize()
+        end = len(results) if length is None else min(len(results), self._position + length)
+        taken = results[self._position:end]
+        self._position = end
+        return taken
+
+    def __aiter__(self):
+        return self
+
+    async def __anext__(self) -> Dict:
+        results = self._materialize()
+        if self._position >= len(results):
+            raise StopAsyncIteration
+        self._position += 1
+        return results[self._position - 1]
+
+
+class MemoryCollection:
+    """
+    In-memory stand-in for an AsyncIOMotorCollection implementing the query
+    operators, update operators, aggregation stages and indexes the app uses.
+    """
+
+    def __init__(self, database: "MemoryDatabase", name: str):
+        self.database = database
+        self.name = name
+        self._docs: Dict[Any, Dict] = {}
+        self._indexes: Dict[str, Dict] = {"_id_": {"v": 2, "key": {"_id": 1}, "name": "_id_"}}
+        self._index_ops: Dict[str, int] = {"_id_": 0}
+
+    # -- helpers ------------------------------------------------------------
+
+    def _candidates(self, query: Dict) -> List[Dict]:
+        _id = query.get("_id")
+        if _id is not None and not isinstance(_id, dict):
+            doc = self._docs.get(_id)
+            return [doc] if doc is not None else []
+        return list(self._docs.values())
+
+    def _record_index_use(self, query: Dict, sort: Iterable[Tuple[str, int]] = ()) -> None:
+        fields = set(query) | {field for field, _ in sort}
+        for name, index in self._indexes.items():
+            if next(iter(index["key"])) in fields:
+                self._index_ops[name] = self._index_ops.get(name, 0) + 1
+
+    def _select(self, query: Optional[Dict], collation=None, sort: Iterable[Tuple[str, int]] = ()) -> List[Dict]:
+        query = query or {}
+        self._record_index_use(query, sort)
+        collation = collation.document if hasattr(collation, "document") else collation
+        return [doc for doc in self._candidates(query) if matches(doc, query, collation)]
+
+    def _duplicate(self, name: str) -> DuplicateKeyError:
+        return DuplicateKeyError(f"E11000 duplicate key error collection: {self.name} index: {name}", 11000)
+
+    def _store(self, doc: Dict, replacing: bool = False) -> None:
+        if not replacing and doc["_id"] in self._docs:
+            raise self._duplicate("_id_")
+        for name, index in self._indexes.items():
+            if not index.get("unique"):
+                continue
+            key = tuple(sort_key(get_path(doc, field)) for field in index["key"])
+            for other in self._docs.values():
+                if other["_id"] != doc["_id"] and tuple(sort_key(get_path(other, field)) for field in index["key"]) == key:
+                    raise self._duplicate(name)
+        self._docs[doc["_id"]] = doc
+
+    @staticmethod
+    def _normalize_filter(query: Any) -> Dict:
+        if query is None:
+            return {}
+        if not isinstance(query, dict):
+            return {"_id": query}
+        return query
+
+    # -- reads --------------------------------------------------------------
+
+    def find(self, filter: Any = None, projection: Optional[Dict] = None, *args, sort=None, skip: int = 0,
+             limit: int = 0, collation=None, **kwargs) -> MemoryCursor:
+        query = self._normalize_filter(filter)
+
+        def produce(cursor: MemoryCursor) -> List[Dict]:
+            docs = sort_documents(self._select(query, collation, cursor._sort), cursor._sort)
+            docs = docs[cursor._skip:]
+            if cursor._limit:
+                docs = docs[:cursor._limit]
+            return [apply_projection(copy.deepcopy(doc), projection) for doc in docs]
+
+        cursor = MemoryCursor(produce)
+        if sort:
+            cursor.sort(sort)
+        return cursor.skip(skip).limit(limit)
+
+    async def find_one(self, filter: Any = None, projection: Optional[Dict] = None, *args, **kwargs) -> Optional[Dict]:
+        results = await self.find(filter, projection, *args, **kwargs).limit(1).to_list(length=1)
+        return results[0] if results else None
+
+    async def count_documents(self, filter: Dict, **kwargs) -> int:
+        docs = self._select(filter, kwargs.get("collation"))
+        skip, limit = kwargs.get("skip", 0), kwargs.get("limit", 0)
+        docs = docs[skip:]
+        return len(docs[:limit] if limit else docs)
+
+    async def estimated_document_count(self, **kwargs) -> int:
+        return len(self._docs)
+
+    async def distinct(self, key: str, filter: Optional[Dict] = None, **kwargs) -> List[Any]:
+        values: Dict[Any, Any] = {}
+        for doc in self._select(filter):
+            value = get_path(doc, key)
+            for item in (value if isinstance(value, list) else [value]):
+                if item is not MISSING:
+                    values.setdefault(_freeze(item), item)
+        return list(values.values())
+
+    def aggregate(self, pipeline: List[Dict], *args, **kwargs) -> MemoryCursor:
+        def produce(cursor: MemoryCursor) -> List[Dict]:
+            first = pipeline[0] if pipeline else {}
+            if "$match" in first:
+                self._record_index_use(first["$match"])
+            docs = [copy.deepcopy(doc) for doc in self._docs.values()]
+            return run_pipeline(docs, pipeline, self._index_stats)
+
+        return MemoryCursor(produce)
+
+    # -- writes -------------------------------------------------------------
+
+    async def insert_one(self, document: Dict, *args, **kwargs) -> InsertOneResult:
+        document.setdefault("_id", ObjectId())
+        self._store(to_bson(document))
+        return InsertOneResult(document["_id"], True)
+
+    async def insert_many(self, documents: Iterable[Dict], ordered: bool = True, *args, **kwargs) -> InsertManyResult:
+        ids = []
+        for document in documents:
+            ids.append((await self.insert_one(document)).inserted_id)
+        return InsertManyResult(ids, True)
+
+    def _update(self, query: Dict, update: Dict, upsert: bool, multi: bool, collation=None) -> Dict[str, Any]:
+        query = self._normalize_filter(query)
+        targets = self._select(query, collation)
+        if not multi:
+            targets = targets[:1]
+        modified = 0
+        for doc in targets:
+            updated = copy.deepcopy(doc)
+            apply_update(updated, update)
+            updated = to_bson(updated)
+            if updated != doc:
+                self._store(updated, replacing=True)
+                modified += 1
+        result: Dict[str, Any] = {"n": len(targets), "nModified": modified}
+        if not targets and upsert:
+            doc = upsert_seed(query)
+            apply_update(doc, update, inserting=True)
+            doc.setdefault("_id", ObjectId())
+            self._store(to_bson(doc))
+            result.update({"n": 1, "upserted": doc["_id"]})
+        return result
+
+    async def update_one(self, filter: Dict, update: Dict, upsert: bool = False, **kwargs) -> UpdateResult:
+        return UpdateResult(self._update(filter, update, upsert, False, kwargs.get("collation")), True)
+
+    async def update_many(self, filter: Dict, update: Dict, upsert: bool = False, **kwargs) -> UpdateResult:
+        return UpdateResult(self._update(filter, update, upsert, True, kwargs.get("collation")), True)
+
+    async def replace_one(self, filter: Dict, replacement: Dict, upsert: bool = False, **kwargs) -> UpdateResult:
+        targets = self._select(self._normalize_filter(filter), kwargs.get("collation"))[:1]
+        if targets:
+            doc = to_bson({**replacement, "_id": targets[0]["_id"]})
+            modified = int(doc != targets[0])
+            self._store(doc, replacing=True)
+            return UpdateResult({"n": 1, "nModified": modified}, True)
+        if upsert:
+            doc = dict(replacement)
+            doc.setdefault("_id", ObjectId())
+            self._store(to_bson(doc))
+            return UpdateResult({"n": 1, "nModified": 0, "upserted": doc["_id"]}, True)
+        return UpdateResult({"n": 0, "nModified": 0}, True)
+
+    def _delete(self, query: Dict, multi: bool, collation=None) -> int:
+        targets = self._select(self._normalize_filter(query), collation)
+        if not multi:
+            targets = targets[:1]
+        for doc in targets:
+            del self._docs[doc["_id"]]
+        return len(targets)
+
+    async def delete_one(self, filter: Dict, **kwargs) -> DeleteResult:
+        return DeleteResult({"n": self._delete(filter, False, kwargs.get("collation"))}, True)
+
+    async def delete_many(self, filter: Dict, **kwargs) -> DeleteResult:
+        return DeleteResult({"n": self._delete(filter, True, kwargs.get("collation"))}, True)
+
+    async def find_one_and_update(self, filter: Dict, update: Dict, projection: Optional[Dict] = None,
+                                  sort=None, upsert: bool = False,
+                                  return_document: bool = ReturnDocument.BEFORE, **kwargs) -> Optional[Dict]:
+        query = self._normalize_filter(filter)
+        targets = sort_documents(self._select(query, kwargs.get("collation")), normalize_sort(sort))[:1]
+        before = copy.deepcopy(targets[0]) if targets else None
+        if targets:
+            query = {"_id": targets[0]["_id"]}
+        result = self._update(query, update, upsert, False)
+        if return_document == ReturnDocument.AFTER:
+            _id = targets[0]["_id"] if targets else result.get("upserted")
+            after = self._docs.get(_id) if _id is not None else None
+            return apply_projection(copy.deepcopy(after), projection) if after else None
+        return apply_projection(before, projection) if before else None
+
+    async def find_one_and_delete(self, filter: Dict, projection: Optional[Dict] = None, sort=None, **kwargs) -> Optional[Dict]:
+        targets = sort_documents(self._select(self._normalize_filter(filter)), normalize_sort(sort))[:1]
+        if not targets:
+            return None
+        del self._docs[targets[0]["_id"]]
+        return apply_projection(targets[0], projection)
+
+    async def bulk_write(self, requests: List[Any], ordered: bool = True, **kwargs) -> BulkWriteResult:
+        totals = {"nInserted": 0, "nUpserted": 0, "nMatched": 0, "nModified": 0, "nRemoved": 0, "upserted": []}
+        for position, request in enumerate(requests):
+            if isinstance(request, InsertOne):
+                await self.insert_one(request._doc)
+                totals["nInserted"] += 1
+                continue
+            if isinstance(request, (DeleteOne, DeleteMany)):
+                totals["nRemoved"] += self._delete(request._filter, isinstance(request, DeleteMany), request._collation)
+                continue
+            if isinstance(request, ReplaceOne):
+                result = (await self.replace_one(request._filter, request._doc, request._upsert)).raw_result
+            elif isinstance(request, (UpdateOne, UpdateMany)):
+                result = self._update(request._filter, request._doc, request._upsert,
+                                      isinstance(request, UpdateMany), request._collation)
+            else:
+                raise TypeError(f"{request!r} is not a valid request")
+            if "upserted" in result:
+                totals["nUpserted"] += 1
+                totals["upserted"].append({"index": position, "_id": result["upserted"]})
+            else:
+                totals["nMatched"] += result["n"]
+                totals["nModified"] += result["nModified"]
+        return BulkWriteResult(totals, True)
+
+    # -- indexes ------------------------------------------------------------
+
+    async def create_indexes(self, indexes: List[Any], **kwargs) -> List[str]:
+        names = []
+        for index in indexes:
+            document = dict(index.document)
+            spec = {"v": 2, "key": dict(document.pop("key")), "name": document.pop("name")}
+            if "collation" in document:
+                spec["collation"] = dict(document.pop("collation"))
+            spec.update(document)
+            if spec.get("unique"):
+                seen = set()
+                for doc in self._docs.values():
+                    key = tuple(sort_key(get_path(doc, field)) for field in spec["key"])
+                    if key in seen:
+                        raise self._duplicate(spec["name"])
+                    seen.add(key)
+            self._indexes.setdefault(spec["name"], spec)
+            self._index_ops.setdefault(spec["name"], 0)
+            names.append(spec["name"])
+        return names
+
+    async def create_index(self, keys: Any, **kwargs) -> str:
+        from pymongo import IndexModel
+        return (await self.create_indexes([IndexModel(keys, **kwargs)]))[0]
+
+    async def drop_index(self, name: str, **kwargs) -> None:
+        if name == "_id_" or name not in self._indexes:
+            raise OperationFailure(f"index not found with name [{name}]")
+        self._indexes.pop(name)
+        self._index_ops.pop(name, None)
+
+    def list_indexes(self, **kwargs) -> MemoryCursor:
+        return MemoryCursor(lambda cursor: [copy.deepcopy(index) for index in self._indexes.values()])
+
+    async def index_information(self, **kwargs) -> Dict[str, Dict]:
+        return {
+            name: {"key": list(index["key"].items()), **{k: v for k, v in index.items() if k not in ("key", "name")}}
+            for name, index in self._indexes.items()
+        }
+
+    def _index_stats(self) -> List[Dict]:
+        return [
+            {"name": name, "key": dict(index["key"]), "accesses": {"ops": self._index_ops.get(name, 0)}}
+            for name, index in self._indexes.items()
+        ]
+
+    async def drop(self) -> None:
+        await self.database.drop_collection(self.name)
+
+
+class MemoryDatabase:
+    def __init__(self, client: "MemoryClient", name: str):
+        self.client = client
+        self.name = name
+        self._collections: Dict[str, MemoryCollection] = {}
+
+    def get_collection(self, name: str, **kwargs) -> MemoryCollection:
+        if name not in self._collections:
+            self._collections[name] = MemoryCollection(self, name)
+        return self._collections[name]
+
+    __getitem__ = get_collection
+
+    async def list_collection_names(self, **kwargs) -> List[str]:
+        return [name for name, collection in self._collections.items() if collection._docs or len(collection._indexes) > 1]
+
+    async def drop_collection(self, name: str, **kwargs) -> None:
+        self._collections.pop(name, None)
+
+    async def command(self, command: Any, *args, **kwargs) -> Dict:
+        if command in ("ping", {"ping": 1}):
+            return {"ok": 1.0}
+        raise OperationFailure(f"command {command!r} is not supported by the in-memory storage backend")
+
+
+class MemoryClient:
+    """Process-local MongoDB stand-in exposing the subset of the Motor client API the app uses"""
+
+    def __init__(self):
+        self._databases: Dict[str, MemoryDatabase] = {}
+
+    def get_database(self, name: Optional[str] = None, **kwargs) -> MemoryDatabase:
+        name = name or "test"
+        if name not in self._databases:
+            self._databases[name] = MemoryDatabase(self, name)
+        return self._databases[name]
+
+    __getitem__ = get_database
+
+    async def list_database_names(self) -> List[str]:
+        return list(self._databases)
+
+    async def drop_database(self, name: str) -> None:
+        self._databases.pop(name, None)
+
+    def close(self) -> None:
+        self._databases.clear()
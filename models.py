@@ -1,5 +1,5 @@
 from pydantic import BaseModel, Field, HttpUrl, validator
-from typing import Optional, List
+from typing import Any, Literal, Optional, List, Dict
 from datetime import datetime, date, time as dt_time
 from bson import ObjectId
 
@@ -143,6 +143,36 @@ class AirdropResponse(BaseModel):
         json_encoders = {datetime: lambda v: v.isoformat()}
 
 
+class AirdropSuggestion(BaseModel):
+    id: str
+    project: str
+    alias: Optional[str] = None
+
+
+class CalendarItem(BaseModel):
+    id: str
+    project: str
+    alias: Optional[str] = None
+    local_time: str
+    event_at: datetime
+    phase: Optional[str] = None
+    image_url: Optional[str] = None
+
+
+class CalendarDay(BaseModel):
+    date: str
+    count: int
+    items: List[CalendarItem]
+
+
+class AirdropCalendar(BaseModel):
+    tz: str
+    start: date
+    end: date
+    total: int
+    days: List[CalendarDay]
+
+
 class CoinData(BaseModel):
     coin_id: str
     time: datetime
@@ -151,6 +181,11 @@ class CoinData(BaseModel):
 
 class CoinDataResponse(CoinData):
     id: str
+    # Set on rolled-up bars (price is the bar close)
+    open: Optional[float] = None
+    high: Optional[float] = None
+    low: Optional[float] = None
+    resolution: Optional[str] = None
 
 
 class TokenBase(BaseModel):
@@ -207,6 +242,78 @@ class AlphaInsightResponse(AlphaInsightBase):
     id: str
 
 
+class AlphaInsightSearchResponse(BaseModel):
+    items: List[AlphaInsightResponse]
+    total: int
+    page: int
+    limit: int
+    facets: Dict[str, Dict[str, int]]
+
+
+class PriceAlertCreate(BaseModel):
+    coin_id: str = Field(..., min_length=1)
+    threshold: float
+    direction: Literal["above", "below", "any"] = Field("any", description="Crossing direction that triggers the alert")
+    cooldown_seconds: Optional[float] = Field(None, ge=0, description="Minimum time between two notifications")
+    note: Optional[str] = Field(None, max_length=200)
+
+
+class PriceAlertResponse(PriceAlertCreate):
+    id: str
+    active: bool = True
+    created_at: datetime
+    last_triggered_at: Optional[datetime] = None
+
+
+class PriceAlertEvent(BaseModel):
+    rule_id: str
+    coin_id: str
+    threshold: float
+    direction: str
+    price: float
+    previous_price: float
+    time: datetime
+    note: Optional[str] = None
+
+
+class AirdropReminder(BaseModel):
+    airdrop_id: str
+    project: Optional[str] = None
+    alias: Optional[str] = None
+    time_iso: str
+    event_at: datetime
+    lead_minutes: int
+    due_at: datetime
+
+
+class AirdropReminders(BaseModel):
+    upcoming: List[AirdropReminder]
+    sent: List[AirdropReminder]
+
+
+class BatchItem(BaseModel):
+    id: Optional[str] = Field(None, description="Client reference echoed in the result")
+    path: str = Field(..., description="GET path, optionally with a query string")
+    query: Optional[Dict[str, Any]] = None
+    if_none_match: Optional[str] = Field(None, description="ETag from a previous result for this item")
+
+
+class BatchRequest(BaseModel):
+    requests: List[BatchItem] = Field(..., min_length=1)
+
+
+class BatchResult(BaseModel):
+    id: Optional[str] = None
+    path: str
+    status: int
+    etag: Optional[str] = None
+    body: Any = None
+
+
+class BatchResponse(BaseModel):
+    results: List[BatchResult]
+
+
 class AccountBase(BaseModel):
     name: str
     balance: float
@@ -227,6 +334,31 @@ class AccountResponse(AccountBase):
     id: str
 
 
+class HoldingValuation(BaseModel):
+    token: str
+    amount: float
+    entry_value: float
+    latest_price: Optional[float] = None
+    price_time: Optional[datetime] = None
+    market_value: Optional[float] = None
+    pnl: Optional[float] = None
+
+
+class AccountValuation(BaseModel):
+    accountId: str
+    name: Optional[str] = None
+    holdings: List[HoldingValuation]
+    total_entry_value: float
+    total_market_value: float
+    unpriced_tokens: List[str]
+
+
+class PortfolioValuation(BaseModel):
+    accounts: List[AccountValuation]
+    total_entry_value: float
+    total_market_value: float
+
+
 class AirdropItem(BaseModel):
     token: str
     amount: float
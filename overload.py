@@ -0,0 +1,154 @@
+import asyncio
+import json
+from contextvars import ContextVar
+from typing import Dict, List, Optional, Tuple
+
+
+# Absolute loop time by which the current request must have started its response
+request_deadline: ContextVar[Optional[float]] = ContextVar("request_deadline", default=None)
+
+# Never below this, so a nearly expired request still gets a valid maxTimeMS
+MIN_MAX_TIME_MS = 50
+
+
+def remaining_ms() -> Optional[int]:
+    """Milliseconds left before the current request's deadline (None outside requests)"""
+    deadline = request_deadline.get()
+    if deadline is None:
+        return None
+    remaining = (deadline - asyncio.get_running_loop().time()) * 1000
+    return max(int(remaining), MIN_MAX_TIME_MS)
+
+
+def parse_route_deadlines(value: Optional[str]) -> List[Tuple[str, Optional[float]]]:
+    """Parse "prefix=seconds,prefix=none" into (prefix, seconds) pairs, longest prefix first"""
+    routes: List[Tuple[str, Optional[float]]] = []
+    for part in (value or "").split(","):
+        prefix, _, seconds = part.strip().partition("=")
+        if not prefix:
+            continue
+        routes.append((prefix, None if seconds.strip().lower() in ("", "none", "0") else float(seconds)))
+    return sorted(routes, key=lambda route: len(route[0]), reverse=True)
+
+
+DEFAULT_ROUTE_DEADLINES = "/api/export=none,/api/images=30,/api/admin/diagnostics=30"
+
+
+class OverloadMiddleware:
+    """
+    ASGI middleware bounding in-flight work. Requests beyond `max_in_flight`
+    wait in a bounded queue for at most `queue_timeout` seconds and are shed
+    with 503 + Retry-After otherwise. Each admitted request gets a deadline
+    (per route prefix) that is exposed to Mongo calls as maxTimeMS and turns
+    into a 504 if no response has started when it expires.
+    """
+
+    def __init__(
+        self,
+        app,
+        max_in_flight: int = 64,
+        max_queue: int = 128,
+        queue_timeout: float = 1.0,
+        default_deadline: Optional[float] = 10.0,
+        route_deadlines: Optional[List[Tuple[str, Optional[float]]]] = None,
+        exempt: Tuple[str, ...] = ("/health",),
+        retry_after: int = 1,
+    ):
+        self.app = app
+        self.max_in_flight = max_in_flight
+        self.max_queue = max_queue
+        self.queue_timeout = queue_timeout
+        self.default_deadline = default_deadline
+        self.route_deadlines = route_deadlines or []
+        self.exempt = exempt
+        self.retry_after = retry_after
+        self.in_flight = 0
+        self.queued = 0
+        self.shed = 0
+        self.timed_out = 0
+        self._slots: Optional[asyncio.Semaphore] = None
+
+    def deadline_for(self, path: str) -> Optional[float]:
+        for prefix, seconds in self.route_deadlines:
+            if path.startswith(prefix):
+                return seconds
+        return self.default_deadline
+
+    async def _reject(self, send, status: int, error: str, detail: str, headers: Optional[Dict[str, str]] = None) -> None:
+        body = json.dumps({"error": error, "detail": detail}).encode()
+        response_headers = [
+            (b"content-type", b"application/json"),
+            (b"content-length", str(len(body)).encode()),
+        ]
+        for key, value in (headers or {}).items():
+            response_headers.append((key.lower().encode(), value.encode()))
+        await send({"type": "http.response.start", "status": status, "headers": response_headers})
+        await send({"type": "http.response.body", "body": body})
+
+    async def _acquire(self) -> bool:
+        if self._slots is None:
+            self._slots = asyncio.Semaphore(self.max_in_flight)
+        if self._slots.locked() and self.queued >= self.max_queue:
+            return False
+        self.queued += 1
+        try:
+            await asyncio.wait_for(self._slots.acquire(), self.queue_timeout)
+            return True
+        except asyncio.TimeoutError:
+            return False
+        finally:
+            self.queued -= 1
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http" or scope.get("path") in self.exempt:
+            await self.app(scope, receive, send)
+            return
+
+        if not await self._acquire():
+            self.shed += 1
+            await self._reject(
+                send, 503, "overloaded", "Server is busy, retry later",
+                {"Retry-After": str(self.retry_after)}
+            )
+            return
+
+        self.in_flight += 1
+        try:
+            await self._run(scope, receive, send)
+        finally:
+            self.in_flight -= 1
+            self._slots.release()
+
+    async def _run(self, scope, receive, send) -> None:
+        seconds = self.deadline_for(scope.get("path", ""))
+        if seconds is None:
+            await self.app(scope, receive, send)
+            return
+
+        loop = asyncio.get_running_loop()
+        token = request_deadline.set(loop.time() + seconds)
+        started = asyncio.Event()
+
+        async def send_wrapper(message):
+            if message["type"] == "http.response.start":
+                started.set()
+            await send(message)
+
+        task = asyncio.ensure_future(self.app(scope, receive, send_wrapper))
+        try:
+            start_wait = asyncio.ensure_future(started.wait())
+            done, _ = await asyncio.wait({task, start_wait}, timeout=seconds, return_when=asyncio.FIRST_COMPLETED)
+            start_wait.cancel()
+            if not done:
+                # Deadline passed before a response started: abandon the work
+                task.cancel()
+                await asyncio.gather(task, return_exceptions=True)
+                self.timed_out += 1
+                await self._reject(send, 504, "deadline_exceeded", f"Request exceeded its {seconds:g}s deadline")
+                return
+            # Once the response has started (e.g. a stream) it runs to completion
+            await task
+        finally:
+            if not task.done():
+                task.cancel()
+            request_deadline.reset(token)
@@ -0,0 +1,253 @@
+import asyncio
+import os
+from datetime import datetime
+from typing import Any, Dict, List, Optional
+from urllib.parse import urlsplit
+
+import httpx
+from pymongo.errors import BulkWriteError
+
+from database import get_coin_collection, get_token_collection
+from alert_engine import price_alerts
+
+
+PRICE_KEYS = ("price", "lastPrice", "last", "close", "usd", "value")
+NESTED_KEYS = ("data", "result", "ticker")
+RETRYABLE_STATUS = {429, 500, 502, 503, 504}
+DUPLICATE_KEY = 11000
+
+
+def extract_price(payload: Any, depth: int = 0) -> Optional[float]:
+    """Find a price in a JSON payload (number, {"price": ...}, {"data": {...}}, [{...}])"""
+    if depth > 4 or isinstance(payload, bool):
+        return None
+    if isinstance(payload, (int, float)):
+        return float(payload)
+    if isinstance(payload, str):
+        try:
+            return float(payload)
+        except ValueError:
+            return None
+    if isinstance(payload, list):
+        return extract_price(payload[0], depth + 1) if payload else None
+    if isinstance(payload, dict):
+        for key in PRICE_KEYS:
+            if key in payload:
+                price = extract_price(payload[key], depth + 1)
+                if price is not None:
+                    return price
+        for key in NESTED_KEYS:
+            if key in payload:
+                price = extract_price(payload[key], depth + 1)
+                if price is not None:
+                    return price
+    return None
+
+
+class TokenPoller:
+    """
+    Polls the apiUrl of every registered token on its staggered schedule and
+    stores multiplier-adjusted prices in the coins collection in batches.
+    """
+
+    def __init__(
+        self,
+        interval: float = 30.0,
+        timeout: float = 10.0,
+        retries: int = 2,
+        backoff: float = 0.5,
+        per_host_limit: int = 4,
+        max_connections: int = 50,
+        batch_size: int = 100,
+        flush_interval: float = 2.0,
+        max_pending: int = 10000,
+        http_client: Optional[httpx.AsyncClient] = None,
+    ):
+        self.interval = interval
+        self.timeout = timeout
+        self.retries = retries
+        self.backoff = backoff
+        self.per_host_limit = per_host_limit
+        self.max_connections = max_connections
+        self.batch_size = batch_size
+        self.flush_interval = flush_interval
+        self.max_pending = max_pending
+
+        self._client = http_client
+        self._owns_client = http_client is None
+        self._host_limits: Dict[str, asyncio.Semaphore] = {}
+        self._tasks: Dict[str, asyncio.Task] = {}
+        self._flush_task: Optional[asyncio.Task] = None
+        self._pending: List[Dict] = []
+        self._flush_lock = asyncio.Lock()
+        self._reload_lock = asyncio.Lock()
+        self.dropped = 0
+        self.running = False
+
+    @classmethod
+    def from_env(cls) -> "TokenPoller":
+        return cls(
+            interval=float(os.getenv("TOKEN_POLL_INTERVAL", "30")),
+            timeout=float(os.getenv("TOKEN_POLL_TIMEOUT", "10")),
+            retries=int(os.getenv("TOKEN_POLL_RETRIES", "2")),
+            per_host_limit=int(os.getenv("TOKEN_POLL_PER_HOST", "4")),
+            batch_size=int(os.getenv("TOKEN_POLL_BATCH_SIZE", "100")),
+            flush_interval=float(os.getenv("TOKEN_POLL_FLUSH_INTERVAL", "2")),
+            max_pending=int(os.getenv("TOKEN_POLL_MAX_PENDING", "10000")),
+        )
+
+    async def start(self) -> None:
+        if self.running:
+            return
+        if self._client is None:
+            self._client = httpx.AsyncClient(
+                timeout=httpx.Timeout(self.timeout),
+                limits=httpx.Limits(
+                    max_connections=self.max_connections,
+                    max_keepalive_connections=self.max_connections,
+                ),
+                follow_redirects=True,
+            )
+        self.running = True
+        self._flush_task = asyncio.create_task(self._flush_loop())
+        await self.reload()
+
+    async def stop(self) -> None:
+        if not self.running:
+            return
+        self.running = False
+        tasks = list(self._tasks.values())
+        if self._flush_task:
+            tasks.append(self._flush_task)
+        for task in tasks:
+            task.cancel()
+        await asyncio.gather(*tasks, return_exceptions=True)
+        self._tasks.clear()
+        self._flush_task = None
+        await self.flush()
+        if self._owns_client and self._client is not None:
+            await self._client.aclose()
+            self._client = None
+
+    async def reload(self) -> int:
+        """Re-read the tokens collection and restart the per-token polling tasks"""
+        # Serialized: overlapping reloads would each start a set of tasks and orphan one
+        async with self._reload_lock:
+            if not self.running:
+                return 0
+            tokens = await get_token_collection().find({}).to_list(length=1000)
+
+            old_tasks = list(self._tasks.values())
+            for task in old_tasks:
+                task.cancel()
+            await asyncio.gather(*old_tasks, return_exceptions=True)
+            self._tasks = {}
+
+            for token in tokens:
+                if not token.get("apiUrl"):
+                    continue
+                token_id = str(token["_id"])
+                self._tasks[token_id] = asyncio.create_task(self._poll_loop(token))
+            print(f"📈 Token poller tracking {len(self._tasks)} tokens")
+            return len(self._tasks)
+
+    def _host_limit(self, url: str) -> asyncio.Semaphore:
+        host = urlsplit(url).netloc
+        limit = self._host_limits.get(host)
+        if limit is None:
+            limit = self._host_limits[host] = asyncio.Semaphore(self.per_host_limit)
+        return limit
+
+    async def fetch_price(self, url: str) -> Optional[float]:
+        """GET a price URL with per-host concurrency limits and retry/backoff"""
+        attempt = 0
+        while True:
+            try:
+                async with self._host_limit(url):
+                    response = await self._client.get(url)
+                if response.status_code in RETRYABLE_STATUS and attempt < self.retries:
+                    raise httpx.HTTPStatusError("retryable status", request=response.request, response=response)
+                response.raise_for_status()
+                return extract_price(response.json())
+            except (httpx.TransportError, httpx.HTTPStatusError) as e:
+                retryable = isinstance(e, httpx.TransportError) or e.response.status_code in RETRYABLE_STATUS
+                if not retryable or attempt >= self.retries:
+                    raise
+                await asyncio.sleep(self.backoff * (2 ** attempt))
+                attempt += 1
+
+    async def poll_once(self, token: Dict) -> Optional[Dict]:
+        """Fetch one price for a token and queue the resulting coin tick"""
+        price = await self.fetch_price(token["apiUrl"])
+        if price is None:
+            print(f"Token poller: no price in response for {token.get('name')}")
+            return None
+        multiplier = token.get("multiplier")
+        doc = {
+            "coin_id": token["name"],
+            "time": datetime.utcnow(),
+            "price": price * (1.0 if multiplier is None else float(multiplier)),
+        }
+        self._pending.append(doc)
+        price_alerts.on_tick(doc["coin_id"], doc["price"], doc["time"])
+        if len(self._pending) >= self.batch_size:
+            await self.flush()
+        return doc
+
+    async def _poll_loop(self, token: Dict) -> None:
+        await asyncio.sleep(max(token.get("staggerDelay") or 0, 0) / 1000)
+        while True:
+            try:
+                await self.poll_once(token)
+            except asyncio.CancelledError:
+                raise
+            except Exception as e:
+                print(f"Token poller error for {token.get('name')}: {str(e)}")
+            await asyncio.sleep(self.interval)
+
+    async def _flush_loop(self) -> None:
+        while True:
+            await asyncio.sleep(self.flush_interval)
+            try:
+                await self.flush()
+            except asyncio.CancelledError:
+                raise
+            except Exception as e:
+                print(f"Token poller flush error: {str(e)}")
+
+    async def flush(self) -> int:
+        """
+        Write queued coin ticks with a single insert_many. A failed batch is
+        put back in front of the queue for the next flush; ticks beyond
+        max_pending are dropped oldest first and counted.
+        """
+        async with self._flush_lock:
+            if not self._pending:
+                return 0
+            batch, self._pending = self._pending, []
+            try:
+                await get_coin_collection().insert_many(batch, ordered=False)
+            except BulkWriteError as e:
+                # Per-document errors are not retryable; the rest of the batch was written.
+                # Ticks already written by an earlier attempt fail here as duplicate _ids.
+                errors = [error for error in e.details.get("writeErrors", []) if error.get("code") != DUPLICATE_KEY]
+                if errors:
+                    self.dropped += len(errors)
+                    print(f"Token poller dropped {len(errors)} coin ticks: {errors[0].get('errmsg')}")
+                return len(batch) - len(errors)
+            except Exception as e:
+                # insert_many set each _id, so a retry cannot duplicate ticks that did get written
+                self._pending = batch + self._pending
+                overflow = len(self._pending) - self.max_pending
+                if overflow > 0:
+                    del self._pending[:overflow]
+                    self.dropped += overflow
+                print(
+                    f"Token poller flush failed, {len(self._pending)} coin ticks queued for retry"
+                    f"{f', {overflow} dropped' if overflow > 0 else ''}: {str(e)}"
+                )
+                return 0
+            return len(batch)
+
+
+token_poller = TokenPoller.from_env()
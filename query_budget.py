@@ -0,0 +1,300 @@
+import json
+import os
+from collections import deque
+from contextvars import ContextVar
+from typing import Deque, Dict, List, NamedTuple, Optional
+
+from bson import encode
+
+
+class QueryUsage:
+    """Mongo work done on behalf of one request"""
+
+    __slots__ = ("commands", "documents", "bytes", "count_bytes")
+
+    def __init__(self, count_bytes: bool = False):
+        self.commands = 0
+        self.documents = 0
+        self.bytes = 0
+        self.count_bytes = count_bytes
+
+    def add_documents(self, docs) -> None:
+        if not self.count_bytes:
+            self.documents += len(docs)
+            return
+        # Motor hands back decoded documents, so sizes require re-encoding (opt-in)
+        for doc in docs:
+            self.documents += 1
+            self.bytes += len(encode(doc))
+
+    def as_dict(self) -> Dict[str, int]:
+        return {"commands": self.commands, "documents": self.documents, "bytes": self.bytes}
+
+
+# Usage of the current request (None outside metered requests, e.g. background jobs)
+request_usage: ContextVar[Optional[QueryUsage]] = ContextVar("request_usage", default=None)
+
+
+def record_command() -> Optional[QueryUsage]:
+    usage = request_usage.get()
+    if usage is not None:
+        usage.commands += 1
+    return usage
+
+
+def metered_call(fn):
+    """Wrap a collection method so each call counts as one command"""
+    def call(*args, **kwargs):
+        record_command()
+        return fn(*args, **kwargs)
+    return call
+
+
+async def metered_find_one(awaitable, usage: QueryUsage):
+    doc = await awaitable
+    if doc is not None:
+        usage.add_documents((doc,))
+    return doc
+
+
+class MeteredCursor:
+    """Cursor proxy counting the documents (and their BSON size) a request reads"""
+
+    def __init__(self, cursor, usage: QueryUsage):
+        self._cursor = cursor
+        self._usage = usage
+
+    def __getattr__(self, name):
+        attr = getattr(self._cursor, name)
+        if not callable(attr):
+            return attr
+
+        def chained(*args, **kwargs):
+            result = attr(*args, **kwargs)
+            # Builder methods (sort, limit, ...) return the cursor itself
+            return self if result is self._cursor else result
+        return chained
+
+    async def to_list(self, length=None):
+        docs = await self._cursor.to_list(length=length)
+        self._usage.add_documents(docs)
+        return docs
+
+    def __aiter__(self):
+        return self
+
+    async def __anext__(self):
+        doc = await self._cursor.__anext__()
+        self._usage.add_documents((doc,))
+        return doc
+
+
+class Budget(NamedTuple):
+    """Ceilings for one request to an endpoint; None means unbounded"""
+    commands: Optional[int] = None
+    documents: Optional[int] = None
+    bytes: Optional[int] = None
+
+
+# Declared per endpoint ("<router module>.<handler>"); document ceilings follow each route's page size
+DEFAULT_BUDGETS: Dict[str, Budget] = {
+    # Public feed: one find, matched documents only
+    "public.get_airdrops": Budget(commands=1, documents=1000),
+    "public.autocomplete_airdrops": Budget(commands=1),
+    "public.get_airdrops_calendar": Budget(commands=1, documents=100 * 92),
+    "public.get_airdrop_changes_since": Budget(commands=2, documents=1001),
+    "public.save_coin_data": Budget(commands=1, documents=0),
+    "public.get_coin_data": Budget(commands=3, documents=3000),
+    # Writes: lookup, write, read-back, then the change log (counter read + claim, entry, release)
+    "admin.create_airdrop": Budget(commands=7, documents=3),
+    "admin.update_airdrop": Budget(commands=7, documents=3),
+    "admin.delete_airdrop": Budget(commands=6, documents=2),
+    "admin.get_all_airdrops": Budget(commands=1, documents=1000),
+    "admin.get_deleted_airdrops": Budget(commands=1, documents=1000),
+    "admin.get_reminders": Budget(commands=0),
+    "admin.get_loop_lag": Budget(commands=0),
+    "admin.get_query_budgets": Budget(commands=0),
+    "admin.get_rate_limits": Budget(commands=0),
+    "alerts.create_alert": Budget(commands=2, documents=1),
+    "alerts.get_alerts": Budget(commands=1, documents=1000),
+    "alerts.get_alert_events": Budget(commands=0),
+    "alerts.delete_alert": Budget(commands=1, documents=0),
+    # Token writes also reload the poller's token list
+    "token.create_token": Budget(commands=3, documents=1001),
+    "token.get_all_tokens": Budget(commands=1, documents=1000),
+    "token.update_token": Budget(commands=4, documents=1002),
+    "token.delete_token": Budget(commands=2, documents=1000),
+    "alpha_insight.create_alpha_insight": Budget(commands=2, documents=1),
+    "alpha_insight.get_all_alpha_insights": Budget(commands=1, documents=1000),
+    "alpha_insight.search_alpha_insights": Budget(commands=1),
+    "alpha_insight.update_alpha_insight": Budget(commands=3, documents=2),
+    "alpha_insight.delete_alpha_insight": Budget(commands=1, documents=0),
+    "accounts.get_accounts": Budget(commands=1, documents=1000),
+    # Prices fall back from raw ticks to minute and hourly bars
+    "accounts.get_portfolio_valuation": Budget(commands=5),
+    "accounts.get_account_valuation": Budget(commands=5),
+    "accounts.create_account": Budget(commands=2, documents=1),
+    "accounts.update_account": Budget(commands=2, documents=1),
+    "accounts.delete_account": Budget(commands=1, documents=0),
+    "transactions.get_transactions": Budget(commands=1, documents=1000),
+    "transactions.create_transaction": Budget(commands=3, documents=1),
+    "transactions.update_transaction": Budget(commands=4, documents=2),
+    "transactions.delete_transaction": Budget(commands=1, documents=0),
+    # Exports stream whole collections; one query each (coin history reads its three tiers)
+    "export.export_transactions": Budget(commands=1),
+    "export.export_coin_history": Budget(commands=3),
+    "images.get_image": Budget(commands=0),
+    # A batch costs the sum of its items
+    "batch.batch": Budget(),
+}
+
+
+def endpoint_name(scope) -> Optional[str]:
+    """"<router module>.<handler>" of the route that served the request"""
+    endpoint = scope.get("endpoint")
+    if endpoint is None:
+        return None
+    return f"{endpoint.__module__.rpartition('.')[2]}.{endpoint.__name__}"
+
+
+def exceeded(usage: QueryUsage, budget: Budget) -> List[str]:
+    """Budget fields the usage went over"""
+    return [
+        field for field, limit in zip(Budget._fields, budget)
+        if limit is not None and getattr(usage, field) > limit
+    ]
+
+
+class QueryBudgetMonitor:
+    """
+    Checks the usage of each request against its endpoint's budget and keeps
+    per-endpoint peaks plus recent breaches. In "warn" mode a breach is
+    logged; in "enforce" mode the response of a read (GET/HEAD) that has not
+    started yet is replaced by a 500, so a regression fails whatever
+    exercises the route. Writes have already committed by then, so their
+    breaches are only recorded and flagged with X-Query-Budget: exceeded.
+    """
+
+    def __init__(
+        self,
+        budgets: Optional[Dict[str, Budget]] = None,
+        mode: str = "off",
+        count_bytes: bool = False,
+        max_violations: int = 200,
+    ):
+        if mode not in ("off", "warn", "enforce"):
+            raise ValueError("Query budget mode must be off, warn or enforce")
+        self.budgets = DEFAULT_BUDGETS if budgets is None else budgets
+        self.mode = mode
+        self.count_bytes = count_bytes
+        self.stats: Dict[str, Dict] = {}
+        self.violations: Deque[Dict] = deque(maxlen=max_violations)
+
+    @classmethod
+    def from_env(cls) -> "QueryBudgetMonitor":
+        return cls(
+            mode=os.getenv("QUERY_BUDGET_MODE", "off").lower(),
+            count_bytes=os.getenv("QUERY_BUDGET_COUNT_BYTES", "false").lower() == "true",
+        )
+
+    def check(self, scope, usage: QueryUsage) -> List[str]:
+        budget = self.budgets.get(endpoint_name(scope))
+        return exceeded(usage, budget) if budget else []
+
+    def record(self, scope, usage: QueryUsage) -> None:
+        name = endpoint_name(scope)
+        if name is None:
+            return
+        stats = self.stats.setdefault(name, {"requests": 0, "violations": 0, "max": QueryUsage().as_dict()})
+        stats["requests"] += 1
+        for field, value in usage.as_dict().items():
+            stats["max"][field] = max(stats["max"][field], value)
+        over = self.check(scope, usage)
+        if over:
+            stats["violations"] += 1
+            self.violations.append({
+                "endpoint": name,
+                "method": scope.get("method"),
+                "path": scope.get("path"),
+                "exceeded": over,
+                "usage": usage.as_dict(),
+                "budget": self.budgets[name]._asdict(),
+            })
+            print(f"⚠️ Query budget exceeded by {name} ({', '.join(over)}): {usage.as_dict()}")
+
+    def report(self) -> Dict:
+        """Per-endpoint peak usage against the declared budgets, plus recent breaches"""
+        endpoints = []
+        for name, stats in sorted(self.stats.items()):
+            budget = self.budgets.get(name)
+            endpoints.append({
+                "endpoint": name,
+                "budget": budget._asdict() if budget else None,
+                **stats,
+            })
+        return {
+            "mode": self.mode,
+            "endpoints": endpoints,
+            "unbudgeted": [item["endpoint"] for item in endpoints if item["budget"] is None],
+            "violations": list(self.violations),
+        }
+
+
+query_budgets = QueryBudgetMonitor.from_env()
+
+
+class QueryBudgetMiddleware:
+    """
+    ASGI middleware metering the Mongo commands, documents and bytes read by
+    each /api request. Usage is reported in X-Query-* response headers and
+    checked against the endpoint's budget by the monitor.
+    """
+
+    def __init__(self, app, monitor: QueryBudgetMonitor = query_budgets):
+        self.app = app
+        self.monitor = monitor
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http" or not scope.get("path", "").startswith("/api/"):
+            await self.app(scope, receive, send)
+            return
+
+        usage = QueryUsage(self.monitor.count_bytes)
+        token = request_usage.set(usage)
+        replaced = False
+        read = scope.get("method") in ("GET", "HEAD")
+
+        async def send_wrapper(message):
+            nonlocal replaced
+            if replaced:
+                return
+            if message["type"] == "http.response.start":
+                over = self.monitor.check(scope, usage)
+                if over and read and self.monitor.mode == "enforce":
+                    replaced = True
+                    await self._reject(send, scope, usage)
+                    return
+                headers = list(message.get("headers", []))
+                for field, value in usage.as_dict().items():
+                    if field != "bytes" or usage.count_bytes:
+                        headers.append((f"x-query-{field}".encode(), str(value).encode()))
+                if over:
+                    headers.append((b"x-query-budget", b"exceeded"))
+                message = {**message, "headers": headers}
+            await send(message)
+
+        try:
+            await self.app(scope, receive, send_wrapper)
+        finally:
+            request_usage.reset(token)
+            self.monitor.record(scope, usage)
+
+    async def _reject(self, send, scope, usage: QueryUsage) -> None:
+        detail = f"{endpoint_name(scope)} exceeded its query budget: {usage.as_dict()}"
+        body = json.dumps({"error": "query_budget_exceeded", "detail": detail}).encode()
+        await send({
+            "type": "http.response.start",
+            "status": 500,
+            "headers": [(b"content-type", b"application/json"), (b"content-length", str(len(body)).encode())],
+        })
+        await send({"type": "http.response.body", "body": body})
@@ -0,0 +1,215 @@
+import json
+import math
+import os
+import time
+from collections import OrderedDict
+from typing import Dict, List, NamedTuple, Optional, Tuple
+
+
+class Quota(NamedTuple):
+    """Token bucket settings: `rate` requests per second sustained, bursts of up to `burst`"""
+    rate: float
+    burst: int
+
+
+class RouteQuota(NamedTuple):
+    method: Optional[str]
+    prefix: str
+    quota: Optional[Quota]
+
+
+def parse_quota(value: str) -> Optional[Quota]:
+    """Parse "rate/burst" (e.g. "5/20"); "none" disables limiting"""
+    value = value.strip().lower()
+    if value in ("", "none", "0"):
+        return None
+    rate, _, burst = value.partition("/")
+    rate = float(rate)
+    if rate <= 0:
+        raise ValueError("Rate limit rate must be positive")
+    return Quota(rate, int(burst) if burst else max(int(math.ceil(rate)), 1))
+
+
+def parse_route_quotas(value: Optional[str]) -> List[RouteQuota]:
+    """Parse "POST /api/coins=20/40,/api/airdrops=5/20" into quotas, most specific first"""
+    routes: List[RouteQuota] = []
+    for part in (value or "").split(","):
+        route, _, quota = part.strip().partition("=")
+        if not route:
+            continue
+        method, _, prefix = route.strip().rpartition(" ")
+        routes.append(RouteQuota(method.upper() or None, prefix, parse_quota(quota)))
+    return sorted(routes, key=lambda route: (len(route.prefix), route.method is not None), reverse=True)
+
+
+DEFAULT_ROUTE_QUOTAS = "POST /api/coins=20/40,/api/airdrops=5/20,/api/batch=1/5,/api/export=0.2/2,/api/images=10/50"
+
+
+class Bucket:
+    __slots__ = ("tokens", "updated")
+
+    def __init__(self, tokens: float, updated: float):
+        self.tokens = tokens
+        self.updated = updated
+
+
+class RateLimiter:
+    """
+    Per-client token buckets, one per (route quota, client). Clients are keyed
+    by a known API key or else their IP. Buckets live in an OrderedDict kept
+    in last-use order, so idle ones are evicted from the front in O(1): a
+    bucket idle for longer than its refill time is full again and
+    indistinguishable from a fresh one.
+    """
+
+    def __init__(
+        self,
+        default_quota: Optional[Quota] = Quota(10, 20),
+        route_quotas: Optional[List[RouteQuota]] = None,
+        api_keys: Tuple[str, ...] = (),
+        forwarded_hops: int = 0,
+        max_buckets: int = 100_000,
+    ):
+        self.default_quota = default_quota
+        self.route_quotas = route_quotas or []
+        self.api_keys = frozenset(api_keys)
+        self.forwarded_hops = forwarded_hops
+        self.max_buckets = max_buckets
+        self.buckets: "OrderedDict[Tuple[int, str], Bucket]" = OrderedDict()
+        quotas = [route.quota for route in self.route_quotas if route.quota] + [default_quota] * bool(default_quota)
+        self.idle_ttl = max((quota.burst / quota.rate for quota in quotas), default=0.0)
+        self.allowed = 0
+        self.limited: Dict[str, int] = {}
+
+    @classmethod
+    def from_env(cls) -> "RateLimiter":
+        return cls(
+            default_quota=parse_quota(os.getenv("RATE_LIMIT_DEFAULT", "10/20")),
+            route_quotas=parse_route_quotas(os.getenv("RATE_LIMIT_ROUTES", DEFAULT_ROUTE_QUOTAS)),
+            api_keys=tuple(key.strip() for key in os.getenv("RATE_LIMIT_API_KEYS", "").split(",") if key.strip()),
+            forwarded_hops=int(os.getenv("RATE_LIMIT_FORWARDED_HOPS", "0")),
+            max_buckets=int(os.getenv("RATE_LIMIT_MAX_CLIENTS", "100000")),
+        )
+
+    def quota_for(self, method: str, path: str) -> Tuple[int, str, Optional[Quota]]:
+        """(slot, route label, quota) of the most specific matching route"""
+        for slot, route in enumerate(self.route_quotas):
+            if path.startswith(route.prefix) and route.method in (None, method):
+                label = f"{route.method} {route.prefix}" if route.method else route.prefix
+                return slot, label, route.quota
+        return -1, "default", self.default_quota
+
+    def client_key(self, scope) -> str:
+        headers = scope.get("headers") or []
+        api_key = dict(headers).get(b"x-api-key", b"").decode("latin-1")
+        if api_key in self.api_keys:
+            return "key:" + api_key
+        if self.forwarded_hops:
+            # Each trusted proxy appends the address it saw, so the client is
+            # `forwarded_hops` entries from the right; anything further left is
+            # whatever the client chose to send
+            forwarded = [
+                address.strip()
+                for name, value in headers if name == b"x-forwarded-for"
+                for address in value.decode("latin-1").split(",")
+            ]
+            if len(forwarded) >= self.forwarded_hops:
+                return forwarded[-self.forwarded_hops]
+        client = scope.get("client")
+        return client[0] if client else "unknown"
+
+    def _evict(self, now: float) -> None:
+        buckets = self.buckets
+        while buckets:
+            bucket = next(iter(buckets.values()))
+            if now - bucket.updated < self.idle_ttl and len(buckets) <= self.max_buckets:
+                break
+            buckets.popitem(last=False)
+
+    def take(self, slot: int, client: str, quota: Quota, now: Optional[float] = None) -> Tuple[bool, float, float]:
+        """Spend one token; returns (allowed, tokens left, seconds until the next token)"""
+        now = time.monotonic() if now is None else now
+        key = (slot, client)
+        bucket = self.buckets.get(key)
+        if bucket is None:
+            bucket = self.buckets[key] = Bucket(float(quota.burst), now)
+        else:
+            bucket.tokens = min(quota.burst, bucket.tokens + (now - bucket.updated) * quota.rate)
+            bucket.updated = now
+            self.buckets.move_to_end(key)
+        self._evict(now)
+
+        if bucket.tokens >= 1:
+            bucket.tokens -= 1
+            return True, bucket.tokens, 0.0
+        return False, bucket.tokens, (1 - bucket.tokens) / quota.rate
+
+    def report(self) -> Dict:
+        return {
+            "buckets": len(self.buckets),
+            "allowed": self.allowed,
+            "limited": dict(self.limited),
+            "default": self.default_quota._asdict() if self.default_quota else None,
+            "routes": [
+                {"method": route.method, "prefix": route.prefix, "quota": route.quota._asdict() if route.quota else None}
+                for route in self.route_quotas
+            ],
+        }
+
+
+rate_limiter = RateLimiter.from_env()
+
+
+class RateLimitMiddleware:
+    """
+    ASGI middleware throttling /api requests per client before any other
+    work is done. Limited responses carry RateLimit-Limit/-Remaining/-Reset
+    headers; requests over quota get 429 with Retry-After.
+    """
+
+    def __init__(self, app, limiter: RateLimiter = rate_limiter, exempt: Tuple[str, ...] = ("/health",)):
+        self.app = app
+        self.limiter = limiter
+        self.exempt = exempt
+
+    async def __call__(self, scope, receive, send):
+        path = scope.get("path", "")
+        # CORS preflights are answered without touching the handlers
+        if scope["type"] != "http" or not path.startswith("/api/") or path in self.exempt or scope["method"] == "OPTIONS":
+            await self.app(scope, receive, send)
+            return
+
+        limiter = self.limiter
+        slot, label, quota = limiter.quota_for(scope["method"], path)
+        if quota is None:
+            await self.app(scope, receive, send)
+            return
+
+        allowed, remaining, wait = limiter.take(slot, limiter.client_key(scope), quota)
+        headers = [
+            (b"ratelimit-limit", str(quota.burst).encode()),
+            (b"ratelimit-remaining", str(int(remaining)).encode()),
+            # Seconds until the bucket is full again
+            (b"ratelimit-reset", str(math.ceil((quota.burst - remaining) / quota.rate)).encode()),
+        ]
+        if not allowed:
+            limiter.limited[label] = limiter.limited.get(label, 0) + 1
+            await self._reject(send, headers + [(b"retry-after", str(max(math.ceil(wait), 1)).encode())])
+            return
+        limiter.allowed += 1
+
+        async def send_wrapper(message):
+            if message["type"] == "http.response.start":
+                message = {**message, "headers": list(message.get("headers", [])) + headers}
+            await send(message)
+
+        await self.app(scope, receive, send_wrapper)
+
+    async def _reject(self, send, headers: List[Tuple[bytes, bytes]]) -> None:
+        body = json.dumps({"error": "rate_limited", "detail": "Too many requests, retry later"}).encode()
+        await send({
+            "type": "http.response.start",
+            "status": 429,
+            "headers": [(b"content-type", b"application/json"), (b"content-length", str(len(body)).encode())] + headers,
+        })
+        await send({"type": "http.response.body", "body": body})
@@ -0,0 +1,231 @@
+import asyncio
+import heapq
+import itertools
+import os
+from collections import deque
+from datetime import datetime, timedelta
+from typing import Deque, Dict, List, Optional, Set, Tuple
+
+import httpx
+
+from database import get_collection
+from utils import utc_instant
+
+
+def parse_lead_minutes(value: Optional[str]) -> List[int]:
+    """Parse "60,10" into distinct lead times in minutes, longest first"""
+    minutes = {int(part) for part in (value or "").split(",") if part.strip()}
+    if any(minute < 0 for minute in minutes):
+        raise ValueError("Reminder lead times must not be negative")
+    return sorted(minutes, reverse=True)
+
+
+class LogSink:
+    """Local sink: reminders are only printed (and kept in the scheduler's log)"""
+
+    async def send(self, reminder: Dict) -> None:
+        print(f"⏰ {reminder['project']} starts in {reminder['lead_minutes']} min ({reminder['time_iso']})")
+
+    async def close(self) -> None:
+        pass
+
+
+class WebhookSink(LogSink):
+    """POSTs every reminder as JSON to a webhook URL"""
+
+    def __init__(self, url: str, timeout: float = 5.0):
+        self.url = url
+        self.timeout = timeout
+        self._client: Optional[httpx.AsyncClient] = None
+
+    async def send(self, reminder: Dict) -> None:
+        await super().send(reminder)
+        if self._client is None:
+            self._client = httpx.AsyncClient(timeout=httpx.Timeout(self.timeout))
+        payload = {
+            **reminder,
+            "event_at": reminder["event_at"].isoformat(),
+            "due_at": reminder["due_at"].isoformat(),
+        }
+        response = await self._client.post(self.url, json=payload)
+        response.raise_for_status()
+
+    async def close(self) -> None:
+        if self._client is not None:
+            await self._client.aclose()
+            self._client = None
+
+
+class ReminderScheduler:
+    """
+    Fires lead-time reminders before airdrop events. Pending reminders sit in
+    a min-heap keyed by their UTC due time; the loop sleeps until the earliest
+    one (or until the schedule changes). Updates push new entries and bump the
+    airdrop's version, so superseded entries are skipped lazily when popped.
+    """
+
+    def __init__(self, lead_minutes: List[int], sink: Optional[LogSink] = None, max_sent: int = 200):
+        self.lead_minutes = lead_minutes
+        self.sink = sink or LogSink()
+        self.sent: Deque[Dict] = deque(maxlen=max_sent)
+        self._heap: List[Tuple[datetime, int, str, int, int]] = []
+        self._events: Dict[str, Dict] = {}
+        self._versions: Dict[str, int] = {}
+        self._pending: Dict[str, int] = {}
+        # Live heap entries, i.e. sum(self._pending.values()), kept as a running count
+        self._live = 0
+        self._counter = itertools.count()
+        self._changed: Optional[asyncio.Event] = None
+        self._task: Optional[asyncio.Task] = None
+        # In-flight deliveries; referenced so they are not garbage collected mid-send
+        self._deliveries: Set[asyncio.Task] = set()
+
+    @classmethod
+    def from_env(cls) -> "ReminderScheduler":
+        webhook_url = os.getenv("REMINDER_WEBHOOK_URL")
+        return cls(
+            lead_minutes=parse_lead_minutes(os.getenv("REMINDER_LEAD_MINUTES", "60,10")),
+            sink=WebhookSink(webhook_url) if webhook_url else LogSink(),
+        )
+
+    def _wake(self) -> None:
+        if self._changed is not None:
+            self._changed.set()
+
+    def schedule(self, airdrop: Dict, now: Optional[datetime] = None) -> int:
+        """(Re)schedule the reminders of a serialized airdrop; returns how many are pending"""
+        airdrop_id = airdrop["id"]
+        self.cancel(airdrop_id, wake=False)
+        time_iso = airdrop.get("time_iso")
+        if not time_iso or airdrop.get("deleted"):
+            return 0
+        event_at = utc_instant(time_iso)
+        now = now or datetime.utcnow()
+        if event_at <= now:
+            return 0
+
+        version = self._versions.get(airdrop_id, 0) + 1
+        self._versions[airdrop_id] = version
+        self._events[airdrop_id] = {
+            "airdrop_id": airdrop_id,
+            "project": airdrop.get("project"),
+            "alias": airdrop.get("alias"),
+            "time_iso": time_iso,
+            "event_at": event_at,
+        }
+        pending = 0
+        for lead in self.lead_minutes:
+            due_at = event_at - timedelta(minutes=lead)
+            if due_at > now:
+                heapq.heappush(self._heap, (due_at, next(self._counter), airdrop_id, lead, version))
+                pending += 1
+        if not pending:
+            self._events.pop(airdrop_id)
+            return 0
+        self._pending[airdrop_id] = pending
+        self._live += pending
+        self._wake()
+        return pending
+
+    def cancel(self, airdrop_id: str, wake: bool = True) -> None:
+        """Drop an airdrop's pending reminders (their heap entries go stale)"""
+        if self._events.pop(airdrop_id, None) is None:
+            return
+        self._live -= self._pending.pop(airdrop_id, 0)
+        self._versions[airdrop_id] = self._versions.get(airdrop_id, 0) + 1
+        self._compact()
+        if wake:
+            self._wake()
+
+    def _is_live(self, entry: Tuple[datetime, int, str, int, int]) -> bool:
+        airdrop_id, version = entry[2], entry[4]
+        return airdrop_id in self._events and self._versions.get(airdrop_id) == version
+
+    def _compact(self) -> None:
+        """Rebuild the heap once stale entries dominate it"""
+        if len(self._heap) > 64 and len(self._heap) > 2 * self._live:
+            self._heap = [entry for entry in self._heap if self._is_live(entry)]
+            heapq.heapify(self._heap)
+
+    def upcoming(self, limit: int = 20) -> List[Dict]:
+        """Next pending reminders, soonest first"""
+        entries = heapq.nsmallest(limit, (entry for entry in self._heap if self._is_live(entry)))
+        return [self._reminder(entry) for entry in entries]
+
+    def _reminder(self, entry: Tuple[datetime, int, str, int, int]) -> Dict:
+        due_at, _, airdrop_id, lead, _ = entry
+        return {**self._events[airdrop_id], "lead_minutes": lead, "due_at": due_at}
+
+    def pop_due(self, now: datetime) -> List[Dict]:
+        """Remove and return every live reminder due at or before `now`"""
+        due = []
+        while self._heap and self._heap[0][0] <= now:
+            entry = heapq.heappop(self._heap)
+            if not self._is_live(entry):
+                continue
+            due.append(self._reminder(entry))
+            airdrop_id = entry[2]
+            self._live -= 1
+            self._pending[airdrop_id] -= 1
+            if not self._pending[airdrop_id]:
+                # Last reminder fired; forget the event
+                del self._pending[airdrop_id]
+                del self._events[airdrop_id]
+        return due
+
+    async def rebuild(self) -> int:
+        """Schedule every airdrop that has not started yet"""
+        self._heap.clear()
+        self._events.clear()
+        self._pending.clear()
+        self._live = 0
+        now = datetime.utcnow()
+        cursor = get_collection().find(
+            {"deleted": False, "event_at": {"$gt": now}},
+            {"project": 1, "alias": 1, "time_iso": 1}
+        )
+        async for doc in cursor:
+            doc["id"] = str(doc.pop("_id"))
+            self.schedule(doc, now)
+        return len(self._events)
+
+    async def _deliver(self, reminder: Dict) -> None:
+        try:
+            await self.sink.send(reminder)
+            self.sent.append(reminder)
+        except Exception as e:
+            print(f"Reminder delivery failed for {reminder['project']}: {str(e)}")
+
+    async def _run(self) -> None:
+        while True:
+            self._changed.clear()
+            timeout = None
+            if self._heap:
+                timeout = max((self._heap[0][0] - datetime.utcnow()).total_seconds(), 0)
+            try:
+                await asyncio.wait_for(self._changed.wait(), timeout)
+                continue
+            except asyncio.TimeoutError:
+                pass
+            for reminder in self.pop_due(datetime.utcnow()):
+                task = asyncio.create_task(self._deliver(reminder))
+                self._deliveries.add(task)
+                task.add_done_callback(self._deliveries.discard)
+
+    def start(self) -> None:
+        if self._task is None:
+            self._changed = asyncio.Event()
+            self._task = asyncio.create_task(self._run())
+
+    async def stop(self) -> None:
+        if self._task is not None:
+            self._task.cancel()
+            await asyncio.gather(self._task, return_exceptions=True)
+            self._task = None
+            self._changed = None
+        # Let in-flight deliveries finish before their sink is closed
+        await asyncio.gather(*self._deliveries, return_exceptions=True)
+        await self.sink.close()
+
+
+reminder_scheduler = ReminderScheduler.from_env()
@@ -0,0 +1,201 @@
+import asyncio
+import os
+from datetime import datetime, timedelta
+from typing import Dict, List, Optional, Tuple
+
+from pymongo import UpdateOne
+
+from database import get_collection, get_coin_collection
+
+
+MINUTE_COLLECTION = "coins_1m"
+HOUR_COLLECTION = "coins_1h"
+
+
+def get_minute_collection():
+    return get_collection(MINUTE_COLLECTION)
+
+
+def get_hour_collection():
+    return get_collection(HOUR_COLLECTION)
+
+
+def source_bar(doc: Dict, from_bars: bool) -> Dict:
+    """A tick (or finer bar) as a one-row bar with the times of its open and close"""
+    if from_bars:
+        return {
+            "open": doc["open"], "open_time": doc.get("open_time", doc["time"]),
+            "close": doc["close"], "close_time": doc.get("close_time", doc["time"]),
+            "high": doc["high"], "low": doc["low"], "count": doc.get("count", 1),
+        }
+    price = doc["price"]
+    return {
+        "open": price, "open_time": doc["time"], "close": price, "close_time": doc["time"],
+        "high": price, "low": price, "count": 1,
+    }
+
+
+def merge_bar(bar: Optional[Dict], row: Dict) -> Dict:
+    """
+    Fold a row into a bar. Open and close follow their times, so a late tick
+    lands in the right place; high/low/count are plain aggregates.
+    """
+    if bar is None:
+        return dict(row)
+    merged = dict(bar)
+    if row["open_time"] < bar["open_time"]:
+        merged["open"], merged["open_time"] = row["open"], row["open_time"]
+    if row["close_time"] >= bar["close_time"]:
+        merged["close"], merged["close_time"] = row["close"], row["close_time"]
+    merged["high"] = max(bar["high"], row["high"])
+    merged["low"] = min(bar["low"], row["low"])
+    merged["count"] = bar["count"] + row["count"]
+    return merged
+
+
+def floor_time(value: datetime, unit: str) -> datetime:
+    if unit == "hour":
+        return value.replace(minute=0, second=0, microsecond=0)
+    return value.replace(second=0, microsecond=0)
+
+
+class CoinCompactor:
+    """
+    Background job rolling raw coin ticks into 1-minute bars and 1-minute bars
+    into hourly bars once they are older than the configured retention,
+    deleting the finer tier afterwards.
+
+    Source rows are rolled in _id order, `batch_size` at a time, so memory and
+    every write stay bounded however large the backlog is. Each bar records
+    the highest source _id folded into it (`last_id`); rows at or below it
+    are skipped, so re-running a chunk after a crash between the bar writes
+    and the delete does not count its rows twice.
+    """
+
+    def __init__(
+        self,
+        raw_retention: timedelta = timedelta(hours=24),
+        minute_retention: timedelta = timedelta(days=30),
+        interval: float = 300.0,
+        batch_size: int = 1000,
+    ):
+        self.raw_retention = raw_retention
+        self.minute_retention = minute_retention
+        self.interval = interval
+        self.batch_size = batch_size
+        self._task: Optional[asyncio.Task] = None
+
+    @classmethod
+    def from_env(cls) -> "CoinCompactor":
+        return cls(
+            raw_retention=timedelta(hours=float(os.getenv("COIN_RAW_RETENTION_HOURS", "24"))),
+            minute_retention=timedelta(days=float(os.getenv("COIN_MINUTE_RETENTION_DAYS", "30"))),
+            interval=float(os.getenv("COIN_COMPACTION_INTERVAL", "300")),
+            batch_size=int(os.getenv("COIN_COMPACTION_BATCH_SIZE", "1000")),
+        )
+
+    async def _roll(self, source, target, cutoff: datetime, unit: str, from_bars: bool) -> Dict[str, int]:
+        # Bound the pass by _id so documents written while it runs are left for the next one
+        newest = await source.find_one({"time": {"$lt": cutoff}}, {"_id": 1}, sort=[("_id", -1)])
+        if not newest:
+            return {"bars": 0, "deleted": 0}
+
+        stats = {"bars": 0, "deleted": 0}
+        after = None
+        while True:
+            id_range = {"$lte": newest["_id"]}
+            if after is not None:
+                id_range["$gt"] = after
+            rows = await source.find({"time": {"$lt": cutoff}, "_id": id_range}).sort("_id", 1).limit(self.batch_size).to_list(length=self.batch_size)
+            if not rows:
+                return stats
+            after = rows[-1]["_id"]
+            stats["bars"] += await self._merge_chunk(target, rows, unit, from_bars)
+            result = await source.delete_many({"_id": {"$in": [row["_id"] for row in rows]}})
+            stats["deleted"] += result.deleted_count
+
+    async def _merge_chunk(self, target, rows: List[Dict], unit: str, from_bars: bool) -> int:
+        """Fold one chunk of source rows into the target bars; returns the number of bars written"""
+        keys = {(row["coin_id"], floor_time(row["time"], unit)) for row in rows}
+        existing = await target.find(
+            {"$or": [{"coin_id": coin_id, "time": time} for coin_id, time in keys]}
+        ).to_list(length=len(keys))
+        bars: Dict[Tuple[str, datetime], Dict] = {}
+        for bar in existing:
+            # Bars written before open/close times were tracked
+            bar.setdefault("open_time", bar["time"])
+            bar.setdefault("close_time", bar["time"])
+            bars[(bar["coin_id"], bar["time"])] = bar
+
+        changed = set()
+        for row in rows:
+            key = (row["coin_id"], floor_time(row["time"], unit))
+            bar = bars.get(key)
+            # Already folded in by an earlier, interrupted run of this chunk
+            if bar is not None and bar.get("last_id") is not None and row["_id"] <= bar["last_id"]:
+                continue
+            bar = merge_bar(bar, source_bar(row, from_bars))
+            bar["last_id"] = row["_id"]
+            bars[key] = bar
+            changed.add(key)
+
+        if changed:
+            fields = ("open", "open_time", "close", "close_time", "high", "low", "count", "last_id")
+            await target.bulk_write([
+                UpdateOne(
+                    {"coin_id": coin_id, "time": time},
+                    {"$set": {field: bars[(coin_id, time)][field] for field in fields}},
+                    upsert=True,
+                )
+                for coin_id, time in changed
+            ], ordered=False)
+        return len(changed)
+
+    async def compact(self, now: Optional[datetime] = None) -> Dict[str, Dict[str, int]]:
+        """Run one compaction pass over both tiers"""
+        now = now or datetime.utcnow()
+        minute_cutoff = floor_time(now - self.raw_retention, "minute")
+        hour_cutoff = floor_time(now - self.minute_retention, "hour")
+
+        minutes = await self._roll(get_coin_collection(), get_minute_collection(), minute_cutoff, "minute", False)
+        hours = await self._roll(get_minute_collection(), get_hour_collection(), hour_cutoff, "hour", True)
+        return {"minute": minutes, "hour": hours}
+
+    async def _run(self) -> None:
+        while True:
+            try:
+                stats = await self.compact()
+                if stats["minute"]["deleted"] or stats["hour"]["deleted"]:
+                    print(f"🗜️ Coin compaction: {stats}")
+            except asyncio.CancelledError:
+                raise
+            except Exception as e:
+                print(f"Coin compaction error: {str(e)}")
+            await asyncio.sleep(self.interval)
+
+    def start(self) -> None:
+        if self._task is None:
+            self._task = asyncio.create_task(self._run())
+
+    async def stop(self) -> None:
+        if self._task is not None:
+            self._task.cancel()
+            await asyncio.gather(self._task, return_exceptions=True)
+            self._task = None
+
+
+def serialize_bar(doc: Dict, resolution: str) -> Dict:
+    """Convert an OHLC bar to the coin tick response format (price is the close)"""
+    return {
+        "id": str(doc["_id"]),
+        "coin_id": doc["coin_id"],
+        "time": doc["time"],
+        "price": doc["close"],
+        "open": doc.get("open"),
+        "high": doc.get("high"),
+        "low": doc.get("low"),
+        "resolution": resolution,
+    }
+
+
+coin_compactor = CoinCompactor.from_env()
@@ -1,4 +1,4 @@
 # Routes package
-from . import public, admin, token, alpha_insight, accounts, transactions
+from . import public, admin, token, alpha_insight, accounts, transactions, export, images
 
-__all__ = ["public", "admin", "token", "alpha_insight", "accounts", "transactions"]
+__all__ = ["public", "admin", "token", "alpha_insight", "accounts", "transactions", "export", "images"]
@@ -1,29 +1,70 @@
-from fastapi import APIRouter, HTTPException, Response
-from typing import List
+from fastapi import APIRouter, HTTPException, Query, Request, Response
+from fastapi.encoders import jsonable_encoder
+from fastapi.responses import JSONResponse
+from typing import List, Optional
 from bson import ObjectId
 
 from database import get_collection
-from models import AccountCreate, AccountResponse, AccountUpdate
+from utils import parse_fields, build_projection, select_fields
+from versions import collection_versions, not_modified
+from models import AccountCreate, AccountResponse, AccountUpdate, AccountValuation, PortfolioValuation
+from valuation import value_accounts
 
 router = APIRouter()
 
+LIST_CACHE_CONTROL = "private, no-cache"
+
 def serialize_account(account) -> dict:
     if account and "_id" in account:
         account["id"] = str(account.pop("_id"))
     return account
 
 @router.get("/api/accounts", response_model=List[AccountResponse])
-async def get_accounts():
+async def get_accounts(
+    request: Request,
+    response: Response,
+    fields: Optional[str] = Query(None, description="Comma separated fields to return")
+):
     collection = get_collection("accounts")
-    cursor = collection.find({})
+    selected = parse_fields(fields, AccountResponse)
+    etag = collection_versions.etag(["accounts"], request)
+    cached = not_modified(request, etag, LIST_CACHE_CONTROL)
+    if cached:
+        return cached
+    cursor = collection.find({}, build_projection(selected))
     items = await cursor.to_list(length=1000)
-    return [serialize_account(item) for item in items]
+    items = [select_fields(serialize_account(item), selected) for item in items]
+    if selected:
+        return JSONResponse(content=jsonable_encoder(items), headers={"ETag": etag, "Cache-Control": LIST_CACHE_CONTROL})
+    response.headers["ETag"] = etag
+    response.headers["Cache-Control"] = LIST_CACHE_CONTROL
+    return items
+
+@router.get("/api/accounts/valuation", response_model=PortfolioValuation)
+async def get_portfolio_valuation():
+    accounts = await value_accounts()
+    return {
+        "accounts": accounts,
+        "total_entry_value": sum(account["total_entry_value"] for account in accounts),
+        "total_market_value": sum(account["total_market_value"] for account in accounts),
+    }
+
+@router.get("/api/accounts/{id}/valuation", response_model=AccountValuation)
+async def get_account_valuation(id: str):
+    if not ObjectId.is_valid(id):
+        raise HTTPException(status_code=400, detail="Invalid ID format")
+
+    accounts = await value_accounts([id])
+    if not accounts:
+        raise HTTPException(status_code=404, detail="Account not found")
+    return accounts[0]
 
 @router.post("/api/accounts", status_code=201, response_model=AccountResponse)
 async def create_account(account: AccountCreate):
     collection = get_collection("accounts")
     doc = account.dict()
     result = await collection.insert_one(doc)
+    collection_versions.bump("accounts")
     created = await collection.find_one({"_id": result.inserted_id})
     return serialize_account(created)
 
@@ -44,6 +85,7 @@ async def update_account(id: str, account: AccountUpdate):
         {"_id": object_id},
         {"$set": update_data}
     )
+    collection_versions.bump("accounts")
 
     updated = await collection.find_one({"_id": object_id})
     if not updated:
@@ -64,4 +106,5 @@ async def delete_account(id: str):
     if result.deleted_count == 0:
         raise HTTPException(status_code=404, detail="Account not found")
     
+    collection_versions.bump("accounts")
     return Response(status_code=204)
@@ -1,18 +1,28 @@
-from fastapi import APIRouter, HTTPException, Depends, status
-from fastapi.responses import Response
+from fastapi import APIRouter, HTTPException, Depends, Query, Request, status
+from fastapi.encoders import jsonable_encoder
+from fastapi.responses import JSONResponse, Response
 from datetime import datetime
 from bson import ObjectId
 from typing import List, Optional, Dict, Any
 import os
 import secrets
-import re
 
-from database import get_collection
-from models import AirdropCreate, AirdropUpdate, AirdropResponse
-from utils import serialize_airdrop, compute_time_fields
+from database import Database, PROJECT_COLLATION, get_collection, index_report
+from diagnostics import slow_query_listener
+from loop_monitor import loop_monitor
+from models import AirdropCreate, AirdropUpdate, AirdropResponse, AirdropReminders
+from utils import serialize_airdrop, compute_time_fields, utc_instant, parse_fields, build_projection, select_fields
+from versions import collection_versions, not_modified
+from changelog import record_airdrop_change
+from autocomplete import airdrop_name_index
+from query_budget import query_budgets
+from rate_limit import rate_limiter
+from reminders import reminder_scheduler
 
 router = APIRouter()
 
+LIST_CACHE_CONTROL = "private, no-cache"
+
 
 def verify_admin():
     """Simple password protection for admin routes - DISABLED FOR TESTING"""
@@ -58,6 +68,7 @@ def apply_schedule_fields(data: Dict[str, Any], existing: Optional[Dict[str, Any
     merged["event_date"] = normalized_date
     merged["event_time"] = normalized_time
     merged["time_iso"] = time_iso
+    merged["event_at"] = utc_instant(time_iso)
     if "timezone" not in merged and (timezone_value is not None or existing):
         merged["timezone"] = timezone_value
 
@@ -80,9 +91,8 @@ async def create_airdrop(
     if not project_name:
         raise HTTPException(status_code=400, detail="Project name is required")
 
-    # Case-insensitive search for existing project
-    project_name_regex = re.compile(f"^{re.escape(project_name.strip())}$", re.IGNORECASE)
-    existing = await collection.find_one({"project": project_name_regex})
+    # Case-insensitive search for existing project (served by the project_ci index)
+    existing = await collection.find_one({"project": project_name.strip()}, collation=PROJECT_COLLATION)
 
     if existing:
         # Update existing document
@@ -92,8 +102,13 @@ async def create_airdrop(
             {"_id": existing["_id"]},
             {"$set": update_data}
         )
-        updated_doc = await collection.find_one({"_id": existing["_id"]})
-        return serialize_airdrop(updated_doc)
+        updated_doc = serialize_airdrop(await collection.find_one({"_id": existing["_id"]}))
+        await record_airdrop_change("upsert", updated_doc["id"], updated_doc)
+        # Bump only once the change is in the log, so a new ETag never pairs with the old log
+        collection_versions.bump("airdrops")
+        airdrop_name_index.add(updated_doc)
+        reminder_scheduler.schedule(updated_doc)
+        return updated_doc
     else:
         # Create new document
         doc.update({
@@ -102,8 +117,12 @@ async def create_airdrop(
             "deleted": False
         })
         result = await collection.insert_one(doc)
-        created_doc = await collection.find_one({"_id": result.inserted_id})
-        return serialize_airdrop(created_doc)
+        created_doc = serialize_airdrop(await collection.find_one({"_id": result.inserted_id}))
+        await record_airdrop_change("upsert", created_doc["id"], created_doc)
+        collection_versions.bump("airdrops")
+        airdrop_name_index.add(created_doc)
+        reminder_scheduler.schedule(created_doc)
+        return created_doc
 
 
 @router.put("/api/airdrops/{id}", response_model=AirdropResponse)
@@ -136,8 +155,12 @@ async def update_airdrop(
         {"$set": update_data}
     )
     
-    updated = await collection.find_one({"_id": object_id})
-    return serialize_airdrop(updated)
+    updated = serialize_airdrop(await collection.find_one({"_id": object_id}))
+    await record_airdrop_change("upsert", updated["id"], updated)
+    collection_versions.bump("airdrops")
+    airdrop_name_index.add(updated)
+    reminder_scheduler.schedule(updated)
+    return updated
 
 
 @router.delete("/api/airdrops/{id}", status_code=204)
@@ -163,26 +186,123 @@ async def delete_airdrop(
     if result.deleted_count == 0:
         raise HTTPException(status_code=404, detail="Airdrop not found")
     
+    # The canonical (lowercase) id, as stored by upserts; ObjectId also accepts uppercase hex
+    airdrop_id = str(object_id)
+    await record_airdrop_change("delete", airdrop_id)
+    collection_versions.bump("airdrops")
+    airdrop_name_index.remove(airdrop_id)
+    reminder_scheduler.cancel(airdrop_id)
     return Response(status_code=204)
 
 
 @router.get("/api/admin/airdrops", response_model=List[AirdropResponse])
-async def get_all_airdrops(_: str = Depends(verify_admin)):
+async def get_all_airdrops(
+    request: Request,
+    response: Response,
+    fields: Optional[str] = Query(None, description="Comma separated fields to return"),
+    _: str = Depends(verify_admin)
+):
     """Get all airdrops"""
     collection = get_collection()
+    selected = parse_fields(fields, AirdropResponse)
+    
+    etag = collection_versions.etag(["airdrops"], request)
+    cached = not_modified(request, etag, LIST_CACHE_CONTROL)
+    if cached:
+        return cached
     
-    cursor = collection.find({})
+    cursor = collection.find({}, build_projection(selected))
     items = await cursor.to_list(length=1000)
     
-    return [serialize_airdrop(item) for item in items]
+    items = [select_fields(serialize_airdrop(item), selected) for item in items]
+    if selected:
+        return JSONResponse(content=jsonable_encoder(items), headers={"ETag": etag, "Cache-Control": LIST_CACHE_CONTROL})
+    response.headers["ETag"] = etag
+    response.headers["Cache-Control"] = LIST_CACHE_CONTROL
+    return items
 
 
 @router.get("/api/admin/airdrops/deleted", response_model=List[AirdropResponse])
-async def get_deleted_airdrops(_: str = Depends(verify_admin)):
+async def get_deleted_airdrops(
+    request: Request,
+    response: Response,
+    fields: Optional[str] = Query(None, description="Comma separated fields to return"),
+    _: str = Depends(verify_admin)
+):
     """Legacy endpoint for soft-deleted airdrops (always empty with hard deletes)"""
     collection = get_collection()
+    selected = parse_fields(fields, AirdropResponse)
+    
+    etag = collection_versions.etag(["airdrops"], request)
+    cached = not_modified(request, etag, LIST_CACHE_CONTROL)
+    if cached:
+        return cached
     
-    cursor = collection.find({"deleted": True})
+    cursor = collection.find({"deleted": True}, build_projection(selected))
     items = await cursor.to_list(length=1000)
     
-    return [serialize_airdrop(item) for item in items]
+    items = [select_fields(serialize_airdrop(item), selected) for item in items]
+    if selected:
+        return JSONResponse(content=jsonable_encoder(items), headers={"ETag": etag, "Cache-Control": LIST_CACHE_CONTROL})
+    response.headers["ETag"] = etag
+    response.headers["Cache-Control"] = LIST_CACHE_CONTROL
+    return items
+
+
+
+@router.get("/api/admin/diagnostics/slow-queries")
+async def get_slow_queries(
+    explain: bool = Query(True, description="Capture explain plans for shapes without one"),
+    _: str = Depends(verify_admin)
+):
+    """Slow commands grouped by filter shape, with explain plans, COLLSCAN flags and index suggestions"""
+    if explain:
+        await slow_query_listener.explain_pending(Database.get_client())
+    
+    return {
+        "threshold_ms": slow_query_listener.threshold_ms,
+        "shapes": slow_query_listener.report()
+    }
+
+
+@router.delete("/api/admin/diagnostics/slow-queries", status_code=204)
+async def reset_slow_queries(_: str = Depends(verify_admin)):
+    """Clear the slow query log"""
+    slow_query_listener.reset()
+    return Response(status_code=204)
+
+
+@router.get("/api/admin/diagnostics/indexes")
+async def get_index_report(_: str = Depends(verify_admin)):
+    """Declared vs. actual indexes per collection, with usage counts from $indexStats"""
+    return await index_report()
+
+
+@router.get("/api/admin/diagnostics/query-budgets")
+async def get_query_budgets(_: str = Depends(verify_admin)):
+    """Peak Mongo commands, documents and bytes per endpoint against their budgets"""
+    return query_budgets.report()
+
+
+@router.get("/api/admin/diagnostics/rate-limits")
+async def get_rate_limits(_: str = Depends(verify_admin)):
+    """Rate limit quotas, tracked client buckets and throttled requests per route"""
+    return rate_limiter.report()
+
+
+@router.get("/api/admin/diagnostics/loop-lag")
+async def get_loop_lag(_: str = Depends(verify_admin)):
+    """Event-loop lag statistics and recent stalls with stack samples"""
+    return loop_monitor.report()
+
+
+@router.get("/api/admin/reminders", response_model=AirdropReminders)
+async def get_reminders(
+    limit: int = Query(20, ge=1, le=200),
+    _: str = Depends(verify_admin)
+):
+    """Next pending airdrop reminders and the most recently sent ones"""
+    return {
+        "upcoming": reminder_scheduler.upcoming(limit),
+        "sent": list(reversed(reminder_scheduler.sent))[:limit],
+    }
@@ -0,0 +1,55 @@
+from fastapi import APIRouter, HTTPException, Query, Response
+from bson import ObjectId
+from datetime import datetime
+from typing import List, Optional
+
+from alert_engine import price_alerts, get_alert_collection, serialize_alert
+from models import PriceAlertCreate, PriceAlertResponse, PriceAlertEvent
+
+router = APIRouter()
+
+
+@router.post("/api/alerts", status_code=201, response_model=PriceAlertResponse)
+async def create_alert(alert: PriceAlertCreate):
+    """Register a rule that fires when a coin's price crosses a threshold"""
+    collection = get_alert_collection()
+
+    doc = alert.dict()
+    doc.update({"active": True, "created_at": datetime.utcnow(), "last_triggered_at": None})
+
+    result = await collection.insert_one(doc)
+    created = serialize_alert(await collection.find_one({"_id": result.inserted_id}))
+    price_alerts.add(dict(created))
+    return created
+
+
+@router.get("/api/alerts", response_model=List[PriceAlertResponse])
+async def get_alerts(coin_id: Optional[str] = Query(None)):
+    """List alert rules, optionally for one coin"""
+    query = {"coin_id": coin_id} if coin_id else {}
+    cursor = get_alert_collection().find(query).sort("created_at", -1)
+    items = await cursor.to_list(length=1000)
+    return [serialize_alert(item) for item in items]
+
+
+@router.get("/api/alerts/events", response_model=List[PriceAlertEvent])
+async def get_alert_events(limit: int = Query(100, ge=1, le=500)):
+    """Most recently triggered alerts, newest first"""
+    return list(reversed(price_alerts.events))[:limit]
+
+
+@router.delete("/api/alerts/{id}", status_code=204)
+async def delete_alert(id: str):
+    """Delete an alert rule"""
+    try:
+        object_id = ObjectId(id)
+    except Exception:
+        raise HTTPException(status_code=400, detail="Invalid ID format")
+
+    result = await get_alert_collection().delete_one({"_id": object_id})
+    if result.deleted_count == 0:
+        raise HTTPException(status_code=404, detail="Alert not found")
+
+    # The engine keys rules by the canonical (lowercase) id
+    price_alerts.remove(str(object_id))
+    return Response(status_code=204)
@@ -1,14 +1,21 @@
-from fastapi import APIRouter, HTTPException, Depends, status
-from fastapi.responses import Response
+from fastapi import APIRouter, HTTPException, Depends, Query, Request, status
+from fastapi.encoders import jsonable_encoder
+from fastapi.responses import JSONResponse, Response
 from bson import ObjectId
-from typing import List
+from typing import List, Optional
 
 from database import get_alpha_insight_collection
-from models import AlphaInsightCreate, AlphaInsightUpdate, AlphaInsightResponse
-from utils import serialize_alpha_insight
+from models import AlphaInsightCreate, AlphaInsightUpdate, AlphaInsightResponse, AlphaInsightSearchResponse
+from search import insight_index
+from utils import serialize_alpha_insight, parse_fields, build_projection, select_fields, rewrite_image_urls
+from image_proxy import proxy_image_url
+from versions import collection_versions, not_modified
+from singleflight import read_flights
 
 router = APIRouter()
 
+LIST_CACHE_CONTROL = "private, no-cache"
+
 
 @router.post("/api/alpha-insights", status_code=201, response_model=AlphaInsightResponse)
 async def create_alpha_insight(insight: AlphaInsightCreate):
@@ -18,20 +25,73 @@ async def create_alpha_insight(insight: AlphaInsightCreate):
     doc = insight.dict()
     
     result = await collection.insert_one(doc)
+    collection_versions.bump("alpha_insights")
     
-    created = await collection.find_one({"_id": result.inserted_id})
-    return serialize_alpha_insight(created)
+    created = serialize_alpha_insight(await collection.find_one({"_id": result.inserted_id}))
+    insight_index.add(created)
+    return created
 
 
 @router.get("/api/alpha-insights", response_model=List[AlphaInsightResponse])
-async def get_all_alpha_insights():
+async def get_all_alpha_insights(
+    request: Request,
+    response: Response,
+    fields: Optional[str] = Query(None, description="Comma separated fields to return"),
+    proxy_images: bool = Query(False, description="Rewrite imageUrl to the caching image proxy"),
+    image_width: Optional[int] = Query(None, ge=1, description="Thumbnail width for proxied images")
+):
     """Get all alpha insights"""
     collection = get_alpha_insight_collection()
+    selected = parse_fields(fields, AlphaInsightResponse)
+    
+    etag = collection_versions.etag(["alpha_insights"], request)
+    cached = not_modified(request, etag, LIST_CACHE_CONTROL)
+    if cached:
+        return cached
+    
+    async def load():
+        cursor = collection.find({}, build_projection(selected))
+        items = await cursor.to_list(length=1000)
+        return [select_fields(serialize_alpha_insight(item), selected) for item in items]
     
-    cursor = collection.find({})
-    items = await cursor.to_list(length=1000)
+    items = await read_flights.do(etag, load)
+    if proxy_images:
+        items = rewrite_image_urls(items, "imageUrl", lambda url: proxy_image_url(url, image_width))
+    if selected:
+        return JSONResponse(content=jsonable_encoder(items), headers={"ETag": etag, "Cache-Control": LIST_CACHE_CONTROL})
+    response.headers["ETag"] = etag
+    response.headers["Cache-Control"] = LIST_CACHE_CONTROL
+    return items
+
+
+@router.get("/api/alpha-insights/search", response_model=AlphaInsightSearchResponse)
+async def search_alpha_insights(
+    q: Optional[str] = Query(None, description="Full-text query over title, description, token, platform and category"),
+    category: Optional[str] = Query(None),
+    platform: Optional[str] = Query(None),
+    token: Optional[str] = Query(None),
+    page: int = Query(1, ge=1),
+    limit: int = Query(20, ge=1, le=100),
+    proxy_images: bool = Query(False, description="Rewrite imageUrl to the caching image proxy"),
+    image_width: Optional[int] = Query(None, ge=1, description="Thumbnail width for proxied images")
+):
+    """Search alpha insights with relevance ranking, facet filters and facet counts"""
+    if not insight_index.ready:
+        # Concurrent first requests share one rebuild instead of clearing each other's work
+        collection = get_alpha_insight_collection()
+        await read_flights.do("alpha_insights:index", lambda: insight_index.rebuild(collection))
     
-    return [serialize_alpha_insight(item) for item in items]
+    result = insight_index.search(
+        q,
+        filters={"category": category, "platform": platform, "token": token},
+        page=page,
+        limit=limit
+    )
+    if proxy_images:
+        result["items"] = rewrite_image_urls(
+            result["items"], "imageUrl", lambda url: proxy_image_url(url, image_width)
+        )
+    return result
 
 
 @router.put("/api/alpha-insights/{id}", response_model=AlphaInsightResponse)
@@ -57,9 +117,11 @@ async def update_alpha_insight(id: str, insight: AlphaInsightUpdate):
         {"_id": object_id},
         {"$set": update_data}
     )
+    collection_versions.bump("alpha_insights")
     
-    updated = await collection.find_one({"_id": object_id})
-    return serialize_alpha_insight(updated)
+    updated = serialize_alpha_insight(await collection.find_one({"_id": object_id}))
+    insight_index.add(updated)
+    return updated
 
 
 @router.delete("/api/alpha-insights/{id}", status_code=204)
@@ -77,4 +139,7 @@ async def delete_alpha_insight(id: str):
     if result.deleted_count == 0:
         raise HTTPException(status_code=404, detail="Alpha insight not found")
     
+    collection_versions.bump("alpha_insights")
+    # The index is keyed by the canonical (lowercase) id
+    insight_index.remove(str(object_id))
     return Response(status_code=204)
@@ -0,0 +1,112 @@
+import asyncio
+import json
+import os
+from typing import Any, Dict, List, Optional, Tuple
+from urllib.parse import urlencode, urlsplit
+
+from fastapi import APIRouter, Request
+from starlette.middleware.exceptions import ExceptionMiddleware
+
+from models import BatchItem, BatchRequest, BatchResponse
+
+router = APIRouter()
+
+BATCH_MAX_REQUESTS = int(os.getenv("BATCH_MAX_REQUESTS", "20"))
+
+# Streaming, binary and recursive endpoints cannot be embedded in a JSON batch
+EXCLUDED_PREFIXES = ("/api/batch", "/api/export", "/api/images")
+
+# Outer request headers that must not leak into sub-requests
+DROPPED_HEADERS = {b"content-length", b"content-type", b"accept-encoding", b"if-none-match", b"transfer-encoding"}
+
+
+def query_string(path_query: str, query: Optional[Dict[str, Any]]) -> str:
+    """Merge a path's own query string with the item's query parameters"""
+    pairs = []
+    for key, value in (query or {}).items():
+        for item in (value if isinstance(value, list) else [value]):
+            if isinstance(item, bool):
+                item = "true" if item else "false"
+            pairs.append((key, item))
+    extra = urlencode(pairs)
+    return "&".join(part for part in (path_query, extra) if part)
+
+
+def sub_scope(request: Request, item: BatchItem) -> Dict:
+    parts = urlsplit(item.path)
+    headers = [(key, value) for key, value in request.scope["headers"] if key not in DROPPED_HEADERS]
+    if item.if_none_match:
+        headers.append((b"if-none-match", item.if_none_match.encode()))
+    scope = {
+        key: value for key, value in request.scope.items()
+        if key not in ("endpoint", "route", "path_params", "router")
+    }
+    scope.update({
+        "method": "GET",
+        "path": parts.path,
+        "raw_path": parts.path.encode(),
+        "query_string": query_string(parts.query, item.query).encode(),
+        "headers": headers,
+    })
+    return scope
+
+
+async def dispatch(app, scope: Dict) -> Tuple[int, Dict[str, str], bytes]:
+    """Run one GET through the routers in-process and capture the response"""
+    status = 500
+    headers: Dict[str, str] = {}
+    chunks: List[bytes] = []
+    sent_request = False
+
+    async def receive():
+        nonlocal sent_request
+        if not sent_request:
+            sent_request = True
+            return {"type": "http.request", "body": b"", "more_body": False}
+        # GET handlers never read a body; wait until the sub-request finishes
+        await asyncio.Event().wait()
+
+    async def send(message):
+        nonlocal status
+        if message["type"] == "http.response.start":
+            status = message["status"]
+            for key, value in message.get("headers", []):
+                headers[key.decode().lower()] = value.decode()
+        elif message["type"] == "http.response.body":
+            chunks.append(message.get("body", b""))
+
+    await app(scope, receive, send)
+    return status, headers, b"".join(chunks)
+
+
+async def run_item(app, request: Request, item: BatchItem) -> Dict:
+    result = {"id": item.id, "path": item.path, "status": 500, "etag": None, "body": None}
+    path = urlsplit(item.path).path
+    if not path.startswith("/api/") or path.startswith(EXCLUDED_PREFIXES):
+        result.update(status=400, body={"error": "invalid_payload", "detail": f"{path} cannot be batched"})
+        return result
+
+    status, headers, body = await dispatch(app, sub_scope(request, item))
+    result.update(status=status, etag=headers.get("etag"))
+    if status == 304 or not body:
+        return result
+    if headers.get("content-type", "").startswith("application/json"):
+        result["body"] = json.loads(body)
+    else:
+        result.update(status=406, body={"error": "not_acceptable", "detail": f"{path} did not return JSON"})
+    return result
+
+
+@router.post("/api/batch", response_model=BatchResponse)
+async def batch(payload: BatchRequest, request: Request):
+    """
+    Run several GET requests in one round trip
+    Items execute concurrently against the regular route handlers and keep their own status and ETag
+    """
+    if len(payload.requests) > BATCH_MAX_REQUESTS:
+        raise ValueError(f"At most {BATCH_MAX_REQUESTS} requests per batch")
+
+    # Sub-requests skip the outer middlewares (already applied to the batch) but keep the error handlers
+    app = ExceptionMiddleware(request.app.router, handlers=request.app.exception_handlers)
+    results = await asyncio.gather(*(run_item(app, request, item) for item in payload.requests))
+    return {"results": results}
@@ -0,0 +1,248 @@
+from fastapi import APIRouter, HTTPException, Query
+from fastapi.responses import StreamingResponse
+from typing import Any, AsyncIterator, Callable, Dict, List, Literal, Optional, Tuple
+from datetime import date, datetime
+import csv
+import io
+import json
+import os
+
+from database import get_collection, get_coin_collection
+from retention import get_hour_collection, get_minute_collection
+
+try:
+    import pyarrow as pa
+    import pyarrow.parquet as pq
+except ImportError:  # Parquet export is optional
+    pa = None
+    pq = None
+
+router = APIRouter()
+
+CURSOR_BATCH_SIZE = int(os.getenv("EXPORT_BATCH_SIZE", "1000"))
+PARQUET_ROW_GROUP_SIZE = int(os.getenv("EXPORT_ROW_GROUP_SIZE", "10000"))
+
+# (column, parquet type name) in export order
+TRANSACTION_COLUMNS: List[Tuple[str, str]] = [
+    ("id", "string"),
+    ("accountId", "string"),
+    ("date", "string"),
+    ("alphaPoints", "float64"),
+    ("initialBalance", "float64"),
+    ("finalBalance", "float64"),
+    ("tradeFee", "float64"),
+    ("pnl", "float64"),
+    ("alphaReward", "float64"),
+    ("airdropValue", "float64"),
+    ("totalClaim", "float64"),
+    ("note", "string"),
+    ("airdrops", "string"),
+    ("airdropToken", "string"),
+    ("airdropAmount", "float64"),
+    ("airdropTokenPrice", "float64"),
+]
+
+COIN_COLUMNS: List[Tuple[str, str]] = [
+    ("id", "string"),
+    ("coin_id", "string"),
+    ("time", "timestamp"),
+    ("price", "float64"),
+    ("open", "float64"),
+    ("high", "float64"),
+    ("low", "float64"),
+    ("resolution", "string"),
+]
+
+
+def transaction_row(doc: Dict) -> Dict[str, Any]:
+    value = doc.get("date")
+    if isinstance(value, datetime):
+        value = value.strftime("%Y-%m-%d")
+    row = {name: doc.get(name) for name, _ in TRANSACTION_COLUMNS}
+    row["id"] = str(doc["_id"])
+    row["date"] = value
+    row["airdrops"] = json.dumps(doc.get("airdrops") or [], default=str)
+    return row
+
+
+def coin_row(doc: Dict) -> Dict[str, Any]:
+    """Raw ticks and OHLC bars in one row shape; a bar's price is its close"""
+    return {
+        "id": str(doc["_id"]),
+        "coin_id": doc.get("coin_id"),
+        "time": doc.get("time"),
+        "price": doc["close"] if "close" in doc else doc.get("price"),
+        "open": doc.get("open"),
+        "high": doc.get("high"),
+        "low": doc.get("low"),
+        "resolution": doc.get("resolution", "raw"),
+    }
+
+
+async def stitch_tiers(tiers: List[Tuple[str, Any]]) -> AsyncIterator[Dict]:
+    """Chain (resolution, cursor) pairs oldest tier first, tagging each document with its resolution"""
+    for resolution, cursor in tiers:
+        async for doc in cursor:
+            if resolution != "raw":
+                doc["resolution"] = resolution
+            yield doc
+
+
+async def stream_csv(cursor, columns: List[Tuple[str, str]], to_row: Callable[[Dict], Dict]) -> AsyncIterator[bytes]:
+    """Encode cursor documents as CSV, one chunk per cursor batch"""
+    names = [name for name, _ in columns]
+    buffer = io.StringIO()
+    writer = csv.writer(buffer)
+    writer.writerow(names)
+
+    rows = 0
+    async for doc in cursor:
+        row = to_row(doc)
+        writer.writerow([
+            value.isoformat() if isinstance(value, datetime) else ("" if value is None else value)
+            for value in (row[name] for name in names)
+        ])
+        rows += 1
+        if rows % CURSOR_BATCH_SIZE == 0:
+            yield buffer.getvalue().encode()
+            buffer.seek(0)
+            buffer.truncate()
+
+    yield buffer.getvalue().encode()
+
+
+class _ChunkSink:
+    """Write-only file object whose contents are drained after every row group"""
+
+    def __init__(self):
+        self.closed = False
+        self._chunks: List[bytes] = []
+        self._position = 0
+
+    def write(self, data) -> int:
+        chunk = bytes(data)
+        self._chunks.append(chunk)
+        self._position += len(chunk)
+        return len(chunk)
+
+    def tell(self) -> int:
+        return self._position
+
+    def flush(self) -> None:
+        pass
+
+    def close(self) -> None:
+        self.closed = True
+
+    def drain(self) -> bytes:
+        data = b"".join(self._chunks)
+        self._chunks = []
+        return data
+
+
+def _parquet_schema(columns: List[Tuple[str, str]]):
+    types = {"string": pa.string(), "float64": pa.float64(), "timestamp": pa.timestamp("ms")}
+    return pa.schema([(name, types[kind]) for name, kind in columns])
+
+
+async def stream_parquet(cursor, columns: List[Tuple[str, str]], to_row: Callable[[Dict], Dict]) -> AsyncIterator[bytes]:
+    """Encode cursor documents as Parquet, flushing one bounded row group at a time"""
+    schema = _parquet_schema(columns)
+    names = [name for name, _ in columns]
+    sink = _ChunkSink()
+    writer = pq.ParquetWriter(pa.PythonFile(sink, mode="w"), schema)
+
+    def new_group() -> Dict[str, List]:
+        return {name: [] for name in names}
+
+    group = new_group()
+    size = 0
+    async for doc in cursor:
+        row = to_row(doc)
+        for name in names:
+            group[name].append(row[name])
+        size += 1
+        if size >= PARQUET_ROW_GROUP_SIZE:
+            writer.write_table(pa.Table.from_pydict(group, schema=schema))
+            group, size = new_group(), 0
+            yield sink.drain()
+
+    if size:
+        writer.write_table(pa.Table.from_pydict(group, schema=schema))
+    writer.close()
+    yield sink.drain()
+
+
+def export_response(
+    cursor,
+    format: str,
+    columns: List[Tuple[str, str]],
+    to_row: Callable[[Dict], Dict],
+    filename: str
+) -> StreamingResponse:
+    if format == "parquet":
+        if pq is None:
+            raise HTTPException(status_code=501, detail="Parquet export requires pyarrow")
+        body = stream_parquet(cursor, columns, to_row)
+        media_type = "application/vnd.apache.parquet"
+    else:
+        body = stream_csv(cursor, columns, to_row)
+        media_type = "text/csv"
+
+    return StreamingResponse(
+        body,
+        media_type=media_type,
+        headers={"Content-Disposition": f'attachment; filename="{filename}.{format}"'}
+    )
+
+
+@router.get("/api/export/transactions")
+async def export_transactions(
+    format: Literal["csv", "parquet"] = Query("csv"),
+    accountId: Optional[str] = Query(None),
+    date_from: Optional[date] = Query(None, alias="from"),
+    date_to: Optional[date] = Query(None, alias="to")
+):
+    """Stream transactions as CSV or Parquet, optionally for one account and date range"""
+    query: Dict[str, Any] = {}
+    if accountId:
+        query["accountId"] = accountId
+    if date_from or date_to:
+        query["date"] = {}
+        if date_from:
+            query["date"]["$gte"] = date_from.isoformat()
+        if date_to:
+            query["date"]["$lte"] = date_to.isoformat()
+
+    cursor = get_collection("transactions").find(query).sort("date", 1).batch_size(CURSOR_BATCH_SIZE)
+    return export_response(cursor, format, TRANSACTION_COLUMNS, transaction_row, "transactions")
+
+
+@router.get("/api/export/coins/{coin_id}")
+async def export_coin_history(
+    coin_id: str,
+    format: Literal["csv", "parquet"] = Query("csv"),
+    time_from: Optional[datetime] = Query(None, alias="from"),
+    time_to: Optional[datetime] = Query(None, alias="to")
+):
+    """
+    Stream the price history of a coin as CSV or Parquet, oldest first
+    Hourly and 1-minute bars left by compaction come before the raw ticks
+    """
+    query: Dict[str, Any] = {"coin_id": coin_id}
+    if time_from or time_to:
+        query["time"] = {}
+        if time_from:
+            query["time"]["$gte"] = time_from
+        if time_to:
+            query["time"]["$lte"] = time_to
+
+    tiers = [
+        (resolution, collection.find(query).sort("time", 1).batch_size(CURSOR_BATCH_SIZE))
+        for resolution, collection in (
+            ("1h", get_hour_collection()),
+            ("1m", get_minute_collection()),
+            ("raw", get_coin_collection()),
+        )
+    ]
+    return export_response(stitch_tiers(tiers), format, COIN_COLUMNS, coin_row, f"{coin_id}-history")
@@ -0,0 +1,29 @@
+from fastapi import APIRouter, Query, Request
+from fastapi.responses import Response
+from typing import Optional
+
+from image_proxy import image_proxy
+
+router = APIRouter()
+
+IMAGE_CACHE_CONTROL = "public, max-age=31536000, immutable"
+
+# Served from the API origin: never sniff, and never let the body run script
+IMAGE_SECURITY_HEADERS = {"X-Content-Type-Options": "nosniff", "Content-Security-Policy": "sandbox"}
+
+
+@router.get("/api/images")
+async def get_image(
+    request: Request,
+    url: str = Query(..., description="Original image URL"),
+    w: Optional[int] = Query(None, ge=1, description="Resize to this width (aspect ratio kept)")
+):
+    """Caching image proxy: fetches each image once and serves resized variants"""
+    etag = image_proxy.etag(url, w)
+    headers = {"ETag": etag, "Cache-Control": IMAGE_CACHE_CONTROL}
+    # Variants are immutable per (url, w), so revalidation never needs the body
+    if request.headers.get("if-none-match") == etag:
+        return Response(status_code=304, headers=headers)
+    
+    body, meta, _ = await image_proxy.get(url, w)
+    return Response(content=body, media_type=meta["content_type"], headers={**headers, **IMAGE_SECURITY_HEADERS})
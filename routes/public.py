@@ -1,34 +1,52 @@
 from fastapi import APIRouter, Query, Request, Response, HTTPException
-from typing import Literal, List
-from datetime import datetime
+from fastapi.encoders import jsonable_encoder
+from fastapi.responses import JSONResponse
+from typing import Literal, List, Optional
+from datetime import datetime, date
 from database import get_collection, get_coin_collection
-from models import CoinData, CoinDataResponse
-from utils import filter_by_range, serialize_airdrop, generate_etag, serialize_coin
+from models import AirdropResponse, AirdropCalendar, AirdropSuggestion, CoinData, CoinDataResponse
+from utils import (
+    filter_by_range, serialize_airdrop, serialize_coin,
+    parse_fields, build_projection, select_fields, rewrite_image_urls
+)
+from versions import collection_versions, not_modified
+from singleflight import read_flights
+from changelog import get_airdrop_changes, get_change_state
+from retention import get_minute_collection, get_hour_collection, serialize_bar
+from loop_monitor import offload
+from image_proxy import proxy_image_url
+from airdrop_calendar import get_airdrop_calendar
+from autocomplete import airdrop_name_index
+from columnar import SeriesBuffer, BINARY_MEDIA_TYPE
+from alert_engine import price_alerts
 
 router = APIRouter()
 
+# Most recent documents returned per coin history tier (raw, 1m, 1h)
+COIN_TIER_LIMIT = 1000
 
-@router.get("/api/airdrops")
-async def get_airdrops(
-    request: Request,
-    response: Response,
-    range: Literal["today", "upcoming", "all"] = Query("all")
-):
-    """
-    Public endpoint to get airdrops
-    Supports ETag caching and 304 responses
-    """
-    collection = get_collection()
-    
-    # Fetch non-deleted airdrops
-    cursor = collection.find({"deleted": False})
-    items = await cursor.to_list(length=1000)
-    
+# Fields the public feed needs for range filtering, sorting and Last-Modified
+AIRDROP_FEED_FIELDS = ("event_date", "event_time", "timezone", "time_iso", "updated_at")
+
+AIRDROP_CACHE_CONTROL = "public, max-age=5, must-revalidate, stale-while-revalidate=30"
+
+
+def range_bucket(range_type: str) -> str:
+    """Time component of the feed ETag: today/upcoming change as the clock moves"""
+    if range_type == "all":
+        return ""
+    # Every UTC offset is a multiple of 15 minutes, so local dates only roll over on these boundaries
+    now = datetime.utcnow()
+    return now.strftime("%Y%m%d%H") + str(now.minute // 15)
+
+
+def process_airdrop_feed(items: List[dict], range_type: str, selected: Optional[List[str]]):
+    """Serialize, filter and sort raw feed documents; returns (items, last_modified)"""
     # Serialize items
     items = [serialize_airdrop(item) for item in items]
     
     # Filter by range
-    filtered_items = filter_by_range(items, range)
+    filtered_items = filter_by_range(items, range_type)
     
     # Sort by time_iso (newest first)
     try:
@@ -39,27 +57,60 @@ async def get_airdrops(
     except Exception:
         pass
     
-    # Generate ETag
-    etag = generate_etag(filtered_items)
-    
     # Get Last-Modified from latest updated_at
     last_modified = None
     if filtered_items:
         latest = max(filtered_items, key=lambda x: x.get("updated_at", datetime.min))
         last_modified = latest.get("updated_at")
     
-    # Check If-None-Match header
-    if_none_match = request.headers.get("if-none-match")
-    if if_none_match == etag:
-        response.status_code = 304
-        return Response(status_code=304, headers={
-            "ETag": etag,
-            "Cache-Control": "public, max-age=5, must-revalidate, stale-while-revalidate=30"
-        })
+    return [select_fields(item, selected) for item in filtered_items], last_modified
+
+
+async def load_airdrop_feed(range_type: str, selected: Optional[List[str]]):
+    """Fetch and process the public feed; large feeds are processed off the event loop"""
+    collection = get_collection()
+    
+    # Fetch non-deleted airdrops
+    cursor = collection.find({"deleted": False}, build_projection(selected, AIRDROP_FEED_FIELDS))
+    items = await cursor.to_list(length=1000)
+    
+    return await offload(process_airdrop_feed, items, range_type, selected, size=len(items))
+
+
+@router.get("/api/airdrops")
+async def get_airdrops(
+    request: Request,
+    response: Response,
+    range: Literal["today", "upcoming", "all"] = Query("all"),
+    fields: Optional[str] = Query(None, description="Comma separated fields to return"),
+    proxy_images: bool = Query(False, description="Rewrite image_url to the caching image proxy"),
+    image_width: Optional[int] = Query(None, ge=1, description="Thumbnail width for proxied images")
+):
+    """
+    Public endpoint to get airdrops
+    Supports ETag caching and 304 responses
+    """
+    selected = parse_fields(fields, AirdropResponse, extra=("time_iso",))
+    
+    # ETag derives from the collection version, so a matching revalidation skips the query
+    etag = collection_versions.etag(["airdrops"], request, range_bucket(range))
+    cached = not_modified(request, etag, AIRDROP_CACHE_CONTROL)
+    if cached:
+        return cached
+    
+    # Concurrent revalidations of the same feed version share one computation
+    filtered_items, last_modified = await read_flights.do(
+        etag, lambda: load_airdrop_feed(range, selected)
+    )
+    
+    if proxy_images:
+        filtered_items = rewrite_image_urls(
+            filtered_items, "image_url", lambda url: proxy_image_url(url, image_width)
+        )
     
     # Set cache headers
     response.headers["ETag"] = etag
-    response.headers["Cache-Control"] = "public, max-age=5, must-revalidate, stale-while-revalidate=30"
+    response.headers["Cache-Control"] = AIRDROP_CACHE_CONTROL
     
     if last_modified:
         response.headers["Last-Modified"] = last_modified.strftime("%a, %d %b %Y %H:%M:%S GMT")
@@ -70,6 +121,69 @@ async def get_airdrops(
     }
 
 
+@router.get("/api/airdrops/autocomplete", response_model=List[AirdropSuggestion])
+async def autocomplete_airdrops(
+    q: str = Query(..., min_length=1, max_length=100, description="Typed prefix of a project or alias"),
+    limit: int = Query(10, ge=1, le=50)
+):
+    """Ranked project/alias completions from the in-memory name index"""
+    if not airdrop_name_index.ready:
+        await airdrop_name_index.rebuild(get_collection())
+    
+    return airdrop_name_index.suggest(q, limit)
+
+
+@router.get("/api/airdrops/calendar", response_model=AirdropCalendar)
+async def get_airdrops_calendar(
+    request: Request,
+    response: Response,
+    tz: str = Query("UTC", description="Viewer timezone, e.g. Asia/Ho_Chi_Minh"),
+    date_from: Optional[date] = Query(None, alias="from", description="First local day (defaults to the start of this month)"),
+    date_to: Optional[date] = Query(None, alias="to", description="Last local day (defaults to the end of the month)"),
+    per_day: int = Query(20, ge=1, le=100, description="Item summaries returned per day")
+):
+    """Airdrops bucketed per local day in the viewer's timezone"""
+    # Without an explicit range the result follows the viewer's current month
+    etag = collection_versions.etag(["airdrops"], request, "" if date_from and date_to else range_bucket("today"))
+    cached = not_modified(request, etag, AIRDROP_CACHE_CONTROL)
+    if cached:
+        return cached
+    
+    result = await read_flights.do(
+        etag, lambda: get_airdrop_calendar(tz, date_from, date_to, per_day)
+    )
+    
+    response.headers["ETag"] = etag
+    response.headers["Cache-Control"] = AIRDROP_CACHE_CONTROL
+    return result
+
+
+@router.get("/api/airdrops/changes")
+async def get_airdrop_changes_since(
+    request: Request,
+    response: Response,
+    since: int = Query(0, ge=0, description="Last sequence number the client has applied"),
+    limit: int = Query(500, ge=1, le=1000)
+):
+    """
+    Delta sync: upserts and tombstones after `since`
+    `resync_required` means `since` predates the retained log and the client must refetch /api/airdrops
+    """
+    # The stable seq is part of the ETag: when an abandoned pending seq expires it
+    # advances without any write, and blocked clients must not keep getting 304
+    state = await get_change_state()
+    etag = collection_versions.etag(["airdrops"], request, state["stable"])
+    cached = not_modified(request, etag, AIRDROP_CACHE_CONTROL)
+    if cached:
+        return cached
+    
+    result = await get_airdrop_changes(since, limit, state)
+    
+    response.headers["ETag"] = etag
+    response.headers["Cache-Control"] = AIRDROP_CACHE_CONTROL
+    return result
+
+
 @router.post("/api/coins", status_code=201)
 async def save_coin_data(coin_data: CoinData):
     """Save coin data"""
@@ -79,15 +193,61 @@ async def save_coin_data(coin_data: CoinData):
     
     await collection.insert_one(doc)
     
-    return {"status": "success", "data": doc}
+    # Evaluate price alerts on the tick as it arrives
+    price_alerts.on_tick(doc["coin_id"], doc["price"], doc["time"])
+    
+    return {"status": "success", "data": serialize_coin(doc)}
+
 
+async def load_coin_series(coin_id: str) -> SeriesBuffer:
+    """Coin history (hourly bars, minute bars, raw ticks) straight into column buffers"""
+    series = SeriesBuffer()
+    for tier in (get_hour_collection(), get_minute_collection()):
+        cursor = tier.find({"coin_id": coin_id}, {"_id": 0, "time": 1, "close": 1}).sort("time", -1).limit(COIN_TIER_LIMIT)
+        bars = await cursor.to_list(length=COIN_TIER_LIMIT)
+        series.extend(reversed(bars), "close")
+    
+    cursor = get_coin_collection().find({"coin_id": coin_id}, {"_id": 0, "time": 1, "price": 1}).sort("time", -1).limit(COIN_TIER_LIMIT)
+    ticks = await cursor.to_list(length=COIN_TIER_LIMIT)
+    series.extend(reversed(ticks))
+    return series
 
-@router.get("/api/coins/{coin_id}", response_model=List[CoinDataResponse])
-async def get_coin_data(coin_id: str):
-    """Get all data for a specific coin"""
+
+@router.get("/api/coins/{coin_id}", response_model=List[CoinDataResponse], response_model_exclude_none=True)
+async def get_coin_data(
+    coin_id: str,
+    fields: Optional[str] = Query(None, description="Comma separated fields to return"),
+    format: Literal["json", "columnar", "binary"] = Query("json", description="Row objects, column arrays or packed binary columns"),
+    delta: bool = Query(False, description="Delta-encode times in the columnar and binary formats")
+):
+    """
+    Get price history for a specific coin, oldest first
+    Hourly and 1-minute bars produced by compaction are stitched in front of the raw ticks
+    """
+    if format != "json":
+        if fields:
+            raise ValueError("fields is only supported with format=json")
+        series = await read_flights.do(("coin-series", coin_id), lambda: load_coin_series(coin_id))
+        if format == "binary":
+            return Response(content=series.to_binary(coin_id, delta), media_type=BINARY_MEDIA_TYPE)
+        return JSONResponse(content=series.to_json(coin_id, delta))
+    
     collection = get_coin_collection()
+    selected = parse_fields(fields, CoinDataResponse)
     
-    cursor = collection.find({"coin_id": coin_id})
-    items = await cursor.to_list(length=1000)
+    async def load():
+        items = []
+        for tier, resolution in ((get_hour_collection(), "1h"), (get_minute_collection(), "1m")):
+            cursor = tier.find({"coin_id": coin_id}).sort("time", -1).limit(COIN_TIER_LIMIT)
+            bars = await cursor.to_list(length=COIN_TIER_LIMIT)
+            items.extend(select_fields(serialize_bar(bar, resolution), selected) for bar in reversed(bars))
+        
+        cursor = collection.find({"coin_id": coin_id}, build_projection(selected)).sort("time", -1).limit(COIN_TIER_LIMIT)
+        ticks = await cursor.to_list(length=COIN_TIER_LIMIT)
+        items.extend(serialize_coin(tick) for tick in reversed(ticks))
+        return items
     
-    return [serialize_coin(item) for item in items]
+    items = await read_flights.do(("coins", coin_id, tuple(selected or ())), load)
+    if selected:
+        return JSONResponse(content=jsonable_encoder(items))
+    return items
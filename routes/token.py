@@ -1,14 +1,20 @@
-from fastapi import APIRouter, HTTPException, Depends, status
-from fastapi.responses import Response
+from fastapi import APIRouter, HTTPException, Depends, Query, Request, status
+from fastapi.encoders import jsonable_encoder
+from fastapi.responses import JSONResponse, Response
 from bson import ObjectId
-from typing import List
+from typing import List, Optional
 
 from database import get_token_collection
 from models import TokenCreate, TokenUpdate, TokenResponse
-from utils import serialize_token
+from poller import token_poller
+from utils import serialize_token, parse_fields, build_projection, select_fields
+from versions import collection_versions, not_modified
+from singleflight import read_flights
 
 router = APIRouter()
 
+LIST_CACHE_CONTROL = "private, no-cache"
+
 
 @router.post("/api/tokens", status_code=201, response_model=TokenResponse)
 async def create_token(token: TokenCreate):
@@ -18,20 +24,39 @@ async def create_token(token: TokenCreate):
     doc = token.dict()
     
     result = await collection.insert_one(doc)
+    collection_versions.bump("tokens")
     
     created = await collection.find_one({"_id": result.inserted_id})
+    await token_poller.reload()
     return serialize_token(created)
 
 
 @router.get("/api/tokens", response_model=List[TokenResponse])
-async def get_all_tokens():
+async def get_all_tokens(
+    request: Request,
+    response: Response,
+    fields: Optional[str] = Query(None, description="Comma separated fields to return")
+):
     """Get all tokens"""
     collection = get_token_collection()
+    selected = parse_fields(fields, TokenResponse)
+    
+    etag = collection_versions.etag(["tokens"], request)
+    cached = not_modified(request, etag, LIST_CACHE_CONTROL)
+    if cached:
+        return cached
     
-    cursor = collection.find({})
-    items = await cursor.to_list(length=1000)
+    async def load():
+        cursor = collection.find({}, build_projection(selected))
+        items = await cursor.to_list(length=1000)
+        return [select_fields(serialize_token(item), selected) for item in items]
     
-    return [serialize_token(item) for item in items]
+    items = await read_flights.do(etag, load)
+    if selected:
+        return JSONResponse(content=jsonable_encoder(items), headers={"ETag": etag, "Cache-Control": LIST_CACHE_CONTROL})
+    response.headers["ETag"] = etag
+    response.headers["Cache-Control"] = LIST_CACHE_CONTROL
+    return items
 
 
 @router.put("/api/tokens/{id}", response_model=TokenResponse)
@@ -57,8 +82,10 @@ async def update_token(id: str, token: TokenUpdate):
         {"_id": object_id},
         {"$set": update_data}
     )
+    collection_versions.bump("tokens")
     
     updated = await collection.find_one({"_id": object_id})
+    await token_poller.reload()
     return serialize_token(updated)
 
 
@@ -77,4 +104,6 @@ async def delete_token(id: str):
     if result.deleted_count == 0:
         raise HTTPException(status_code=404, detail="Token not found")
     
+    collection_versions.bump("tokens")
+    await token_poller.reload()
     return Response(status_code=204)
@@ -1,12 +1,18 @@
-from fastapi import APIRouter, HTTPException, Response
-from typing import List
+from fastapi import APIRouter, HTTPException, Query, Request, Response
+from fastapi.encoders import jsonable_encoder
+from fastapi.responses import JSONResponse
+from typing import List, Optional
 from bson import ObjectId
 
 from database import get_collection
+from utils import parse_fields, build_projection, select_fields
+from versions import collection_versions, not_modified
 from models import TransactionCreate, TransactionUpdate, TransactionResponse
 
 router = APIRouter()
 
+LIST_CACHE_CONTROL = "private, no-cache"
+
 def serialize_transaction(transaction) -> dict:
     if transaction and "_id" in transaction:
         transaction["id"] = str(transaction.pop("_id"))
@@ -20,11 +26,25 @@ def serialize_transaction(transaction) -> dict:
     return transaction
 
 @router.get("/api/transactions", response_model=List[TransactionResponse])
-async def get_transactions():
+async def get_transactions(
+    request: Request,
+    response: Response,
+    fields: Optional[str] = Query(None, description="Comma separated fields to return")
+):
     collection = get_collection("transactions")
-    cursor = collection.find({})
+    selected = parse_fields(fields, TransactionResponse)
+    etag = collection_versions.etag(["transactions"], request)
+    cached = not_modified(request, etag, LIST_CACHE_CONTROL)
+    if cached:
+        return cached
+    cursor = collection.find({}, build_projection(selected))
     items = await cursor.to_list(length=1000)
-    return [serialize_transaction(item) for item in items]
+    items = [select_fields(serialize_transaction(item), selected) for item in items]
+    if selected:
+        return JSONResponse(content=jsonable_encoder(items), headers={"ETag": etag, "Cache-Control": LIST_CACHE_CONTROL})
+    response.headers["ETag"] = etag
+    response.headers["Cache-Control"] = LIST_CACHE_CONTROL
+    return items
 
 @router.post("/api/transactions", status_code=201, response_model=TransactionResponse)
 async def create_transaction(transaction: TransactionCreate):
@@ -32,6 +52,7 @@ async def create_transaction(transaction: TransactionCreate):
     transactions_collection = get_collection("transactions")
     doc = transaction.dict()
     result = await transactions_collection.insert_one(doc)
+    collection_versions.bump("transactions")
     created = await transactions_collection.find_one({"_id": result.inserted_id})
 
     # Update the account
@@ -45,6 +66,7 @@ async def create_transaction(transaction: TransactionCreate):
         {"_id": object_id},
         {"$set": {"balance": transaction.finalBalance, "alphaPoints": transaction.alphaPoints}}
     )
+    collection_versions.bump("accounts")
 
     return serialize_transaction(created)
 
@@ -73,6 +95,7 @@ async def update_transaction(id: str, transaction: TransactionUpdate):
         {"_id": object_id},
         {"$set": update_data}
     )
+    collection_versions.bump("transactions")
     
     # Get updated transaction
     updated = await transactions_collection.find_one({"_id": object_id})
@@ -91,6 +114,7 @@ async def update_transaction(id: str, transaction: TransactionUpdate):
                 {"_id": account_id},
                 {"$set": account_updates}
             )
+            collection_versions.bump("accounts")
     
     return serialize_transaction(updated)
 
@@ -107,4 +131,5 @@ async def delete_transaction(id: str):
     if result.deleted_count == 0:
         raise HTTPException(status_code=404, detail="Transaction not found")
     
+    collection_versions.bump("transactions")
     return Response(status_code=204)
@@ -0,0 +1,206 @@
+import heapq
+import math
+import re
+from collections import Counter
+from typing import Dict, List, Optional, Set, Tuple
+
+from utils import serialize_alpha_insight
+
+
+TOKEN_RE = re.compile(r"\w+", re.UNICODE)
+
+# Text fields indexed for relevance, with their term weights
+TEXT_FIELDS = {"title": 3, "token": 2, "platform": 1, "category": 1, "description": 1}
+FACET_FIELDS = ("category", "platform", "token")
+
+BM25_K1 = 1.2
+BM25_B = 0.75
+
+
+def tokenize(text: Optional[str]) -> List[str]:
+    """Lowercase word tokens of a text"""
+    if not text:
+        return []
+    return TOKEN_RE.findall(str(text).lower())
+
+
+class InsightSearchIndex:
+    """
+    In-process inverted index over alpha insights.
+    Kept in sync by the alpha insight routes and rebuilt from MongoDB at startup.
+    """
+
+    def __init__(self):
+        self.ready = False
+        self.docs: Dict[str, Dict] = {}
+        self.postings: Dict[str, Dict[str, int]] = {}
+        self.doc_terms: Dict[str, Counter] = {}
+        self.doc_lengths: Dict[str, int] = {}
+        self.total_length = 0
+        self.facets: Dict[str, Dict[str, Set[str]]] = {field: {} for field in FACET_FIELDS}
+        # Unfiltered facet counts, kept current by add/remove for the browse (no q/filters) case
+        self.facet_counts: Dict[str, Dict[str, int]] = {field: {} for field in FACET_FIELDS}
+
+    async def rebuild(self, collection) -> int:
+        """Reload the whole index from the alpha insight collection"""
+        self.clear()
+        cursor = collection.find({})
+        async for doc in cursor:
+            self.add(serialize_alpha_insight(doc))
+        self.ready = True
+        return len(self.docs)
+
+    def clear(self) -> None:
+        self.ready = False
+        self.docs.clear()
+        self.postings.clear()
+        self.doc_terms.clear()
+        self.doc_lengths.clear()
+        self.total_length = 0
+        self.facets = {field: {} for field in FACET_FIELDS}
+        self.facet_counts = {field: {} for field in FACET_FIELDS}
+
+    def add(self, doc: Dict) -> None:
+        """Insert or replace a serialized insight"""
+        doc_id = doc["id"]
+        if doc_id in self.docs:
+            self.remove(doc_id)
+
+        terms: Counter = Counter()
+        for field, weight in TEXT_FIELDS.items():
+            for term in tokenize(doc.get(field)):
+                terms[term] += weight
+
+        self.docs[doc_id] = dict(doc)
+        self.doc_terms[doc_id] = terms
+        length = sum(terms.values())
+        self.doc_lengths[doc_id] = length
+        self.total_length += length
+        for term, tf in terms.items():
+            self.postings.setdefault(term, {})[doc_id] = tf
+
+        for field in FACET_FIELDS:
+            value = doc.get(field)
+            if value is not None:
+                self.facets[field].setdefault(value, set()).add(doc_id)
+                counts = self.facet_counts[field]
+                counts[value] = counts.get(value, 0) + 1
+
+    def remove(self, doc_id: str) -> None:
+        """Drop an insight from the index (no-op when absent)"""
+        doc = self.docs.pop(doc_id, None)
+        if doc is None:
+            return
+
+        for term in self.doc_terms.pop(doc_id, {}):
+            postings = self.postings.get(term)
+            if postings is not None:
+                postings.pop(doc_id, None)
+                if not postings:
+                    del self.postings[term]
+        self.total_length -= self.doc_lengths.pop(doc_id, 0)
+
+        for field in FACET_FIELDS:
+            value = doc.get(field)
+            ids = self.facets[field].get(value)
+            if ids is not None and doc_id in ids:
+                ids.discard(doc_id)
+                if not ids:
+                    del self.facets[field][value]
+                counts = self.facet_counts[field]
+                counts[value] -= 1
+                if not counts[value]:
+                    del counts[value]
+
+    def _match_terms(self, terms: List[str]) -> Optional[Set[str]]:
+        """Ids containing every query term (None means no text constraint)"""
+        if not terms:
+            return None
+        posting_lists = [self.postings.get(term) for term in terms]
+        if any(not postings for postings in posting_lists):
+            return set()
+        posting_lists.sort(key=len)
+        matched = set(posting_lists[0])
+        for postings in posting_lists[1:]:
+            matched.intersection_update(postings)
+            if not matched:
+                break
+        return matched
+
+    def _score(self, doc_id: str, terms: List[str]) -> float:
+        n_docs = len(self.docs)
+        avg_length = (self.total_length / n_docs) if n_docs else 1.0
+        length_norm = BM25_K1 * (1 - BM25_B + BM25_B * self.doc_lengths[doc_id] / (avg_length or 1.0))
+        score = 0.0
+        for term in terms:
+            postings = self.postings[term]
+            tf = postings[doc_id]
+            idf = math.log(1 + (n_docs - len(postings) + 0.5) / (len(postings) + 0.5))
+            score += idf * tf * (BM25_K1 + 1) / (tf + length_norm)
+        return score
+
+    def search(
+        self,
+        q: Optional[str] = None,
+        filters: Optional[Dict[str, Optional[str]]] = None,
+        page: int = 1,
+        limit: int = 20,
+    ) -> Dict:
+        """Ranked, filtered and paginated search with facet counts"""
+        terms = list(dict.fromkeys(tokenize(q)))
+        text_matches = self._match_terms(terms)
+        active = {field: value for field, value in (filters or {}).items() if value is not None}
+
+        filter_sets: Dict[str, Set[str]] = {
+            field: self.facets[field].get(value, set()) for field, value in active.items()
+        }
+
+        def restrict(exclude: Optional[str] = None) -> Set[str]:
+            sets = [ids for field, ids in filter_sets.items() if field != exclude]
+            if text_matches is not None:
+                sets.append(text_matches)
+            if not sets:
+                return set(self.docs)
+            sets.sort(key=len)
+            result = set(sets[0])
+            for ids in sets[1:]:
+                result.intersection_update(ids)
+            return result
+
+        facets: Dict[str, Dict[str, int]] = {}
+        if text_matches is None and not active:
+            # Browsing everything: no set work, the maintained counts are the answer
+            matched = self.docs.keys()
+            facets = {field: dict(counts) for field, counts in self.facet_counts.items()}
+        else:
+            matched = restrict()
+            # Facet counts ignore the facet's own filter so alternatives stay visible.
+            # Counted over the matching docs, so the cost follows the result set, not the archive.
+            for field in FACET_FIELDS:
+                base = restrict(exclude=field) if field in active else matched
+                counts = Counter(self.docs[doc_id].get(field) for doc_id in base)
+                counts.pop(None, None)
+                facets[field] = dict(counts)
+
+        top_n = page * limit
+        if terms:
+            ranked: List[Tuple[float, str]] = heapq.nlargest(
+                top_n, ((self._score(doc_id, terms), doc_id) for doc_id in matched)
+            )
+            page_ids = [doc_id for _, doc_id in ranked[top_n - limit:]]
+        else:
+            ranked_ids = heapq.nlargest(
+                top_n, matched, key=lambda doc_id: (self.docs[doc_id].get("date") or "", doc_id)
+            )
+            page_ids = ranked_ids[top_n - limit:]
+
+        return {
+            "items": [dict(self.docs[doc_id]) for doc_id in page_ids],
+            "total": len(matched),
+            "page": page,
+            "limit": limit,
+            "facets": facets,
+        }
+
+
+insight_index = InsightSearchIndex()
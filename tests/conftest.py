@@ -0,0 +1,39 @@
+import os
+import sys
+
+# Hermetic settings; must be in place before the app modules are imported
+os.environ.update({
+    "STORAGE_BACKEND": "memory",
+    "DB_NAME": "test",
+    "TOKEN_POLLER_ENABLED": "false",
+    "COIN_COMPACTION_ENABLED": "false",
+    "REMINDERS_ENABLED": "false",
+    "QUERY_BUDGET_MODE": "enforce",
+    "RATE_LIMIT_DEFAULT": "none",
+    "RATE_LIMIT_ROUTES": "",
+    "ALERT_WEBHOOK_URL": "",
+    "REMINDER_WEBHOOK_URL": "",
+})
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import pytest
+from fastapi.testclient import TestClient
+
+
+@pytest.fixture
+def client():
+    """App client on a fresh in-memory store (the store is dropped on shutdown)"""
+    from main import app
+    with TestClient(app) as test_client:
+        yield test_client
+
+
+def airdrop_payload(project: str, event_date: str = "2030-01-15", event_time: str = "10:00", **extra):
+    return {
+        "project": project,
+        "alias": project.lower(),
+        "event_date": event_date,
+        "event_time": event_time,
+        "timezone": "UTC",
+        **extra,
+    }
@@ -0,0 +1,13 @@
+def test_valuation_by_uppercase_id_includes_holdings(client):
+    account = client.post("/api/accounts", json={"name": "Main", "balance": 0, "alphaPoints": 0}).json()
+    client.post("/api/transactions", json={
+        "accountId": account["id"], "date": "2030-01-01", "alphaPoints": 0, "initialBalance": 0,
+        "finalBalance": 0, "tradeFee": 0, "pnl": 0, "alphaReward": 0, "totalClaim": 0,
+        "airdrops": [{"token": "ABC", "amount": 3, "price": 1, "value": 3}],
+    })
+    client.post("/api/coins", json={"coin_id": "ABC", "time": "2030-01-01T00:00:00", "price": 2.0})
+
+    valuation = client.get(f"/api/accounts/{account['id'].upper()}/valuation").json()
+    assert valuation["accountId"] == account["id"]
+    assert [(holding["token"], holding["amount"]) for holding in valuation["holdings"]] == [("ABC", 3.0)]
+    assert valuation["total_market_value"] == 6.0
@@ -0,0 +1,15 @@
+from alert_engine import price_alerts
+
+
+def test_delete_by_uppercase_id_removes_rule_from_engine(client):
+    alert = client.post("/api/alerts", json={"coin_id": "BTC", "threshold": 150}).json()
+    assert alert["id"] in price_alerts.rules
+
+    assert client.delete(f"/api/alerts/{alert['id'].upper()}").status_code == 204
+    assert alert["id"] not in price_alerts.rules
+    assert price_alerts.up["BTC"].rule_ids == []
+
+    # A crossing tick no longer fires the deleted rule
+    price_alerts.on_tick("BTC", 100.0)
+    assert price_alerts.on_tick("BTC", 200.0) == []
+    price_alerts.last_prices.pop("BTC", None)
@@ -0,0 +1,65 @@
+"""Airdrop change log: ordering under concurrent writers and canonical ids"""
+from datetime import datetime, timedelta
+
+from changelog import CHANGES_COLLECTION, COUNTERS_COLLECTION, COUNTER_ID, PENDING_TIMEOUT, next_change_seq
+from conftest import airdrop_payload
+from database import get_collection
+
+
+def test_reader_waits_for_pending_sequence_numbers(client):
+    client.post("/api/airdrops", json=airdrop_payload("First"))
+    since = client.get("/api/airdrops/changes").json()["latest_seq"]
+
+    # A slow writer holds the next seq while a faster one commits the one after it
+    slow_seq = client.portal.call(next_change_seq)
+    client.post("/api/airdrops", json=airdrop_payload("Second"))
+
+    blocked = client.get("/api/airdrops/changes", params={"since": since}).json()
+    assert blocked["changes"] == []
+    assert blocked["latest_seq"] == since
+
+    # The slow writer finishes: its entry lands and the seq leaves the pending list
+    async def release():
+        await get_collection(CHANGES_COLLECTION).insert_one({"seq": slow_seq, "op": "delete", "airdrop_id": "slow", "item": None})
+        await get_collection(COUNTERS_COLLECTION).update_one({"_id": COUNTER_ID}, {"$pull": {"pending": {"seq": slow_seq}}})
+    client.portal.call(release)
+
+    changes = client.get("/api/airdrops/changes", params={"since": since}).json()["changes"]
+    assert [change["seq"] for change in changes] == [slow_seq, slow_seq + 1]
+    assert changes[0]["id"] == "slow"
+
+
+def test_expired_pending_seq_invalidates_the_etag(client):
+    client.post("/api/airdrops", json=airdrop_payload("First"))
+    since = client.get("/api/airdrops/changes").json()["latest_seq"]
+
+    # A writer allocates a seq and dies; the next write is held back behind it
+    client.portal.call(next_change_seq)
+    client.post("/api/airdrops", json=airdrop_payload("Second"))
+    blocked = client.get("/api/airdrops/changes", params={"since": since})
+    assert blocked.json()["changes"] == []
+    etag = blocked.headers["etag"]
+    assert client.get("/api/airdrops/changes", params={"since": since}, headers={"If-None-Match": etag}).status_code == 304
+
+    # The abandoned seq times out with no further write (and so no version bump)
+    async def expire():
+        expired = datetime.utcnow() - timedelta(seconds=PENDING_TIMEOUT + 1)
+        counter = await get_collection(COUNTERS_COLLECTION).find_one({"_id": COUNTER_ID})
+        pending = [{**entry, "at": expired} for entry in counter["pending"]]
+        await get_collection(COUNTERS_COLLECTION).update_one({"_id": COUNTER_ID}, {"$set": {"pending": pending}})
+    client.portal.call(expire)
+
+    released = client.get("/api/airdrops/changes", params={"since": since}, headers={"If-None-Match": etag})
+    assert released.status_code == 200
+    assert [change["item"]["project"] for change in released.json()["changes"]] == ["Second"]
+
+
+def test_delete_by_uppercase_id_uses_canonical_id(client):
+    created = client.post("/api/airdrops", json=airdrop_payload("Casing")).json()
+    assert client.get("/api/airdrops/autocomplete", params={"q": "cas"}).json()
+
+    assert client.delete(f"/api/airdrops/{created['id'].upper()}").status_code == 204
+
+    tombstone = client.get("/api/airdrops/changes").json()["changes"][-1]
+    assert (tombstone["op"], tombstone["id"]) == ("delete", created["id"])
+    assert client.get("/api/airdrops/autocomplete", params={"q": "cas"}).json() == []
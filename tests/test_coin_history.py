@@ -0,0 +1,68 @@
+"""Readers stitch the compacted coins_1h/coins_1m tiers in front of the raw ticks"""
+import csv
+import io
+from datetime import datetime
+
+from retention import get_hour_collection, get_minute_collection
+
+
+def seed_bars(client, coin_id: str):
+    async def insert():
+        await get_hour_collection().insert_one({
+            "coin_id": coin_id, "time": datetime(2029, 12, 1), "open": 90.0, "high": 95.0, "low": 85.0, "close": 92.0, "count": 60,
+        })
+        await get_minute_collection().insert_one({
+            "coin_id": coin_id, "time": datetime(2029, 12, 31, 23, 59), "open": 97.0, "high": 99.0, "low": 96.0, "close": 98.0, "count": 3,
+        })
+    client.portal.call(insert)
+
+
+def test_export_includes_compacted_tiers(client):
+    seed_bars(client, "BTC")
+    client.post("/api/coins", json={"coin_id": "BTC", "time": "2030-01-01T00:00:00", "price": 100.0})
+
+    response = client.get("/api/export/coins/BTC", params={"format": "csv"})
+    assert response.status_code == 200
+    rows = list(csv.DictReader(io.StringIO(response.text)))
+    assert [(row["resolution"], row["price"]) for row in rows] == [("1h", "92.0"), ("1m", "98.0"), ("raw", "100.0")]
+    assert rows[0]["high"] == "95.0" and rows[2]["high"] == ""
+
+    ranged = client.get("/api/export/coins/BTC", params={"from": "2029-12-31T00:00:00"})
+    assert [row["resolution"] for row in csv.DictReader(io.StringIO(ranged.text))] == ["1m", "raw"]
+
+
+def test_valuation_falls_back_to_bar_close(client):
+    seed_bars(client, "OLD")
+    account = client.post("/api/accounts", json={"name": "Main", "balance": 0, "alphaPoints": 0}).json()
+    client.post("/api/transactions", json={
+        "accountId": account["id"], "date": "2030-01-01", "alphaPoints": 0, "initialBalance": 0,
+        "finalBalance": 0, "tradeFee": 0, "pnl": 0, "alphaReward": 0, "totalClaim": 0,
+        "airdrops": [{"token": "OLD", "amount": 2, "price": 1, "value": 2}],
+    })
+
+    valuation = client.get(f"/api/accounts/{account['id']}/valuation").json()
+    holding = valuation["holdings"][0]
+    assert holding["latest_price"] == 98.0
+    assert holding["market_value"] == 196.0
+    assert valuation["unpriced_tokens"] == []
+
+
+def test_parquet_export_round_trips_stitched_tiers(client):
+    import pyarrow as pa
+    import pyarrow.parquet as pq
+
+    seed_bars(client, "BTC")
+    for minute, price in enumerate((100.0, 101.0)):
+        client.post("/api/coins", json={"coin_id": "BTC", "time": f"2030-01-01T00:0{minute}:00", "price": price})
+
+    response = client.get("/api/export/coins/BTC", params={"format": "parquet"})
+    assert response.status_code == 200
+    assert response.headers["content-type"] == "application/vnd.apache.parquet"
+    table = pq.read_table(io.BytesIO(response.content))
+    assert table.num_rows == 4
+    assert table.schema.names == ["id", "coin_id", "time", "price", "open", "high", "low", "resolution"]
+    assert table.schema.field("time").type == pa.timestamp("ms")
+    assert table.schema.field("price").type == pa.float64()
+    assert table.column("resolution").to_pylist() == ["1h", "1m", "raw", "raw"]
+    assert table.column("price").to_pylist() == [92.0, 98.0, 100.0, 101.0]
+    assert table.column("time").to_pylist()[0] == datetime(2029, 12, 1)
@@ -0,0 +1,40 @@
+import asyncio
+import gzip
+
+from compression import CompressionMiddleware
+
+
+def json_app(bodies, etag=b'W/"same"'):
+    """ASGI app answering each request with the next body, always under the same ETag"""
+    async def app(scope, receive, send):
+        await send({"type": "http.response.start", "status": 200, "headers": [
+            (b"content-type", b"application/json"), (b"etag", etag),
+        ]})
+        await send({"type": "http.response.body", "body": bodies.pop(0)})
+    return app
+
+
+def request(middleware):
+    messages = []
+
+    async def send(message):
+        messages.append(message)
+
+    scope = {"type": "http", "path": "/api/x", "query_string": b"", "headers": [(b"accept-encoding", b"gzip")]}
+    asyncio.run(middleware(scope, None, send))
+    return dict(messages[0]["headers"]), messages[1]["body"]
+
+
+def test_cache_follows_body_not_etag():
+    first, second = b'{"v": "%s"}' % (b"a" * 2000), b'{"v": "%s"}' % (b"b" * 2000)
+    middleware = CompressionMiddleware(json_app([first, second, second]), minimum_size=100)
+
+    headers, body = request(middleware)
+    assert headers[b"content-encoding"] == b"gzip"
+    assert gzip.decompress(body) == first
+    # Same ETag, different body: the new body is compressed, not the cached one replayed
+    assert gzip.decompress(request(middleware)[1]) == second
+    assert len(middleware.cache) == 2
+    # An identical body reuses the cached variant
+    assert gzip.decompress(request(middleware)[1]) == second
+    assert len(middleware.cache) == 2
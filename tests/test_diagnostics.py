@@ -0,0 +1,56 @@
+import asyncio
+
+from diagnostics import SlowQueryListener, command_options
+
+COLLATION = {"locale": "en", "strength": 2}
+
+
+class Event:
+    def __init__(self, command_name, command, request_id=1):
+        self.command_name = command_name
+        self.command = command
+        self.database_name = "test"
+        self.connection_id = ("localhost", 27017)
+        self.request_id = request_id
+        self.duration_micros = 500_000
+
+
+class RecordingClient:
+    def __init__(self):
+        self.commands = []
+
+    def __getitem__(self, name):
+        return self
+
+    async def command(self, name, target, verbosity=None):
+        self.commands.append(target)
+        return {"queryPlanner": {"winningPlan": {"stage": "FETCH", "inputStage": {"stage": "IXSCAN"}}}}
+
+
+def test_command_options_from_top_level_and_statements():
+    assert command_options("find", {"find": "airdrops", "filter": {}, "collation": COLLATION, "hint": "project_ci"}) == {
+        "collation": COLLATION, "hint": "project_ci",
+    }
+    assert command_options("update", {"update": "airdrops", "updates": [{"q": {}, "collation": COLLATION}]}) == {"collation": COLLATION}
+    assert command_options("find", {"find": "airdrops", "filter": {}}) == {}
+
+
+def test_explain_reuses_collation_and_hint():
+    listener = SlowQueryListener(threshold_ms=100)
+    for request_id, command in enumerate((
+        {"find": "airdrops", "filter": {"project": "Alpha"}, "collation": COLLATION, "hint": "project_ci"},
+        {"find": "airdrops", "filter": {"project": "Beta"}},
+    )):
+        event = Event("find", command, request_id)
+        listener.started(event)
+        listener.succeeded(event)
+    # Same filter shape, but the collation makes it a separate plan
+    assert len(listener.shapes) == 2
+
+    client = RecordingClient()
+    assert asyncio.run(listener.explain_pending(client)) == 2
+    assert client.commands[0] == {
+        "find": "airdrops", "filter": {"project": "Alpha"}, "collation": COLLATION, "hint": "project_ci",
+    }
+    assert client.commands[1] == {"find": "airdrops", "filter": {"project": "Beta"}}
+    assert [entry["collscan"] for entry in listener.report()] == [False, False]
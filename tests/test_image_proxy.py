@@ -0,0 +1,112 @@
+import io
+import socket
+import threading
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+import pytest
+from PIL import Image
+
+import image_proxy as image_proxy_module
+from image_proxy import DiskLRUCache, image_proxy
+
+SVG = b'<svg xmlns="http://www.w3.org/2000/svg"><script>alert(1)</script></svg>'
+
+
+def png_bytes(width: int = 64, height: int = 32) -> bytes:
+    output = io.BytesIO()
+    Image.new("RGB", (width, height), (200, 30, 30)).save(output, format="PNG")
+    return output.getvalue()
+
+
+@pytest.fixture
+def origin():
+    """Stub image origin on localhost counting the requests it serves"""
+    files = {"/logo.png": ("image/png", png_bytes()), "/logo.svg": ("image/svg+xml", SVG)}
+    hits = []
+
+    class Handler(BaseHTTPRequestHandler):
+        def do_GET(self):
+            hits.append((self.path, self.headers.get("Host")))
+            content_type, body = files.get(self.path, ("text/plain", b"missing"))
+            self.send_response(200 if self.path in files else 404)
+            self.send_header("Content-Type", content_type)
+            self.send_header("Content-Length", str(len(body)))
+            self.end_headers()
+            self.wfile.write(body)
+
+        def log_message(self, *args):
+            pass
+
+    server = ThreadingHTTPServer(("127.0.0.1", 0), Handler)
+    thread = threading.Thread(target=server.serve_forever, daemon=True)
+    thread.start()
+    yield f"127.0.0.1:{server.server_address[1]}", hits
+    server.shutdown()
+    server.server_close()
+
+
+@pytest.fixture
+def proxy(monkeypatch, tmp_path):
+    monkeypatch.setattr(image_proxy, "cache", DiskLRUCache(str(tmp_path), 10 * 1024 * 1024))
+    monkeypatch.setattr(image_proxy, "allow_private", True)
+    return image_proxy
+
+
+def test_png_is_served_with_security_headers_and_resized(client, origin, proxy):
+    netloc, hits = origin
+    response = client.get("/api/images", params={"url": f"http://{netloc}/logo.png"})
+    assert response.status_code == 200
+    assert response.headers["content-type"] == "image/png"
+    assert response.headers["x-content-type-options"] == "nosniff"
+    assert response.headers["content-security-policy"] == "sandbox"
+
+    resized = client.get("/api/images", params={"url": f"http://{netloc}/logo.png", "w": 32})
+    assert resized.status_code == 200
+    assert Image.open(io.BytesIO(resized.content)).size == (32, 16)
+    # The original was fetched once and the variant was derived from the cache
+    assert len(hits) == 1
+
+
+def test_svg_is_refused(client, origin, proxy):
+    netloc, _ = origin
+    response = client.get("/api/images", params={"url": f"http://{netloc}/logo.svg"})
+    assert response.status_code == 502
+
+
+def test_if_none_match_skips_fetch(client, origin, proxy):
+    netloc, hits = origin
+    url = f"http://{netloc}/logo.png"
+    etag = proxy.etag(url, 100)
+    response = client.get("/api/images", params={"url": url, "w": 100}, headers={"If-None-Match": etag})
+    assert response.status_code == 304
+    assert response.headers["etag"] == etag
+    assert hits == []
+
+
+def test_connection_is_pinned_to_the_checked_address(client, origin, proxy, monkeypatch):
+    netloc, hits = origin
+    port = netloc.rpartition(":")[2]
+    lookups = []
+    real_getaddrinfo = socket.getaddrinfo
+
+    def rebinding_getaddrinfo(host, *args, **kwargs):
+        # First answer passes the check; any later lookup would point elsewhere
+        if host == "images.example.test":
+            lookups.append(host)
+            address = "127.0.0.1" if len(lookups) == 1 else "10.255.255.1"
+            return [(socket.AF_INET, socket.SOCK_STREAM, 6, "", (address, 0))]
+        return real_getaddrinfo(host, *args, **kwargs)
+
+    monkeypatch.setattr(image_proxy_module.socket, "getaddrinfo", rebinding_getaddrinfo)
+    response = client.get("/api/images", params={"url": f"http://images.example.test:{port}/logo.png"})
+    assert response.status_code == 200
+    assert lookups == ["images.example.test"]
+    assert hits == [("/logo.png", f"images.example.test:{port}")]
+
+
+def test_private_hosts_are_rejected(client, origin, proxy, monkeypatch):
+    netloc, hits = origin
+    monkeypatch.setattr(proxy, "allow_private", False)
+    response = client.get("/api/images", params={"url": f"http://{netloc}/logo.png"})
+    assert response.status_code == 400
+    assert hits == []
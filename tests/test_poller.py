@@ -0,0 +1,110 @@
+"""Token poller against a stub price server, on the app's in-memory store"""
+import asyncio
+import json
+import threading
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+import pytest
+
+import poller as poller_module
+from database import get_coin_collection, get_token_collection
+from poller import TokenPoller
+
+
+@pytest.fixture
+def price_server():
+    """Serves {"price": "2.5"} at /price; /flaky answers 503 before succeeding"""
+    hits = []
+
+    class Handler(BaseHTTPRequestHandler):
+        def do_GET(self):
+            hits.append(self.path)
+            if self.path == "/flaky" and hits.count("/flaky") == 1:
+                status, body = 503, b"{}"
+            else:
+                status, body = 200, json.dumps({"data": {"price": "2.5"}}).encode()
+            self.send_response(status)
+            self.send_header("Content-Type", "application/json")
+            self.send_header("Content-Length", str(len(body)))
+            self.end_headers()
+            self.wfile.write(body)
+
+        def log_message(self, *args):
+            pass
+
+    server = ThreadingHTTPServer(("127.0.0.1", 0), Handler)
+    thread = threading.Thread(target=server.serve_forever, daemon=True)
+    thread.start()
+    yield f"http://127.0.0.1:{server.server_address[1]}", hits
+    server.shutdown()
+    server.server_close()
+
+
+def test_poll_applies_multiplier_and_retries(client, price_server):
+    base, hits = price_server
+
+    async def run():
+        poller = TokenPoller(backoff=0, flush_interval=60)
+        await poller.start()
+        try:
+            docs = [
+                await poller.poll_once({"name": "ONE", "apiUrl": f"{base}/price"}),
+                await poller.poll_once({"name": "ZERO", "apiUrl": f"{base}/price", "multiplier": 0}),
+                await poller.poll_once({"name": "TWO", "apiUrl": f"{base}/flaky", "multiplier": 2}),
+            ]
+            assert await poller.flush() == 3
+        finally:
+            await poller.stop()
+        stored = await get_coin_collection().find({}).to_list(length=None)
+        return docs, stored
+
+    docs, stored = client.portal.call(run)
+    assert [(doc["coin_id"], doc["price"]) for doc in docs] == [("ONE", 2.5), ("ZERO", 0.0), ("TWO", 5.0)]
+    assert sorted(doc["coin_id"] for doc in stored) == ["ONE", "TWO", "ZERO"]
+    assert hits.count("/flaky") == 2
+
+
+def test_failed_flush_requeues_batch(client, monkeypatch):
+    real_collection = get_coin_collection
+    failures = []
+
+    class Unavailable:
+        async def insert_many(self, docs, ordered=True):
+            failures.append(len(docs))
+            raise ConnectionError("primary unavailable")
+
+    async def run():
+        poller = TokenPoller(max_pending=3)
+        poller._pending = [{"coin_id": "A", "price": float(i)} for i in range(2)]
+        monkeypatch.setattr(poller_module, "get_coin_collection", lambda: Unavailable())
+        assert await poller.flush() == 0
+        assert len(poller._pending) == 2
+        # Newer ticks queue behind the retried batch; the oldest overflow is dropped
+        poller._pending += [{"coin_id": "A", "price": float(i)} for i in range(2, 4)]
+        assert await poller.flush() == 0
+        assert [doc["price"] for doc in poller._pending] == [1.0, 2.0, 3.0]
+        assert poller.dropped == 1
+
+        monkeypatch.setattr(poller_module, "get_coin_collection", real_collection)
+        assert await poller.flush() == 3
+        return await real_collection().count_documents({})
+
+    assert client.portal.call(run) == 3
+    assert failures == [2, 4]
+
+
+def test_concurrent_reloads_do_not_orphan_tasks(client):
+    async def run():
+        await get_token_collection().insert_many([
+            {"name": name, "apiUrl": "http://127.0.0.1:9/p", "staggerDelay": 60_000} for name in ("A", "B")
+        ])
+        poller = TokenPoller(flush_interval=60)
+        await poller.start()
+        try:
+            await asyncio.gather(poller.reload(), poller.reload(), poller.reload())
+            polling = [task for task in asyncio.all_tasks() if task.get_coro().__name__ == "_poll_loop"]
+            return len(poller._tasks), len(polling)
+        finally:
+            await poller.stop()
+
+    assert client.portal.call(run) == (2, 2)
@@ -0,0 +1,124 @@
+"""Every declared endpoint budget holds (the suite runs with QUERY_BUDGET_MODE=enforce)"""
+import time
+
+import pytest
+
+import changelog
+from conftest import airdrop_payload
+from query_budget import DEFAULT_BUDGETS, Budget, query_budgets
+
+
+@pytest.fixture
+def monitor():
+    query_budgets.stats.clear()
+    query_budgets.violations.clear()
+    yield query_budgets
+    query_budgets.budgets = DEFAULT_BUDGETS
+
+
+def exercise_all_routes(client):
+    """One request to every budgeted endpoint, with data so reads return documents"""
+    for project in ("Alpha", "Beta", "Gamma"):
+        client.post("/api/airdrops", json=airdrop_payload(project))
+    client.post("/api/airdrops", json=airdrop_payload("ALPHA", event_time="12:00"))
+    airdrop_id = client.get("/api/airdrops").json()["items"][0]["id"]
+    client.put(f"/api/airdrops/{airdrop_id}", json=airdrop_payload("Alpha", event_date="2030-03-01"))
+    client.get("/api/airdrops/calendar", params={"from": "2030-01-01", "to": "2030-03-31"})
+    client.get("/api/airdrops/autocomplete", params={"q": "al"})
+    client.get("/api/airdrops/changes")
+    client.get("/api/admin/airdrops")
+    client.get("/api/admin/airdrops/deleted")
+    client.get("/api/admin/reminders")
+    client.get("/api/admin/diagnostics/loop-lag")
+    client.get("/api/admin/diagnostics/rate-limits")
+
+    for minute in range(3):
+        client.post("/api/coins", json={"coin_id": "BTC", "time": f"2030-01-01T00:0{minute}:00", "price": 100 + minute})
+    client.get("/api/coins/BTC")
+    client.get("/api/export/coins/BTC")
+
+    alert = client.post("/api/alerts", json={"coin_id": "BTC", "threshold": 150}).json()
+    client.get("/api/alerts")
+    client.get("/api/alerts/events")
+    client.delete(f"/api/alerts/{alert['id']}")
+
+    token = client.post("/api/tokens", json={"name": "ABC", "apiUrl": "http://127.0.0.1:9/p", "staggerDelay": 0, "multiplier": 1}).json()
+    client.get("/api/tokens")
+    client.put(f"/api/tokens/{token['id']}", json={"multiplier": 2})
+    client.delete(f"/api/tokens/{token['id']}")
+
+    insight = client.post("/api/alpha-insights", json={
+        "title": "T", "category": "c", "token": "t", "platform": "p", "raised": "1", "description": "d", "date": "2030-01-01",
+    }).json()
+    client.get("/api/alpha-insights")
+    client.get("/api/alpha-insights/search", params={"q": "t"})
+    client.put(f"/api/alpha-insights/{insight['id']}", json={"title": "T2"})
+    client.delete(f"/api/alpha-insights/{insight['id']}")
+
+    account = client.post("/api/accounts", json={"name": "A", "balance": 1, "alphaPoints": 1}).json()
+    client.get("/api/accounts")
+    client.get("/api/accounts/valuation")
+    client.get(f"/api/accounts/{account['id']}/valuation")
+    transaction = client.post("/api/transactions", json={
+        "accountId": account["id"], "date": "2030-01-01", "alphaPoints": 1, "initialBalance": 1,
+        "finalBalance": 2, "tradeFee": 0, "pnl": 1, "alphaReward": 0, "totalClaim": 0,
+    }).json()
+    client.get("/api/transactions")
+    client.get("/api/export/transactions")
+    client.put(f"/api/transactions/{transaction['id']}", json={"finalBalance": 3})
+    client.delete(f"/api/transactions/{transaction['id']}")
+    client.put(f"/api/accounts/{account['id']}", json={"name": "B"})
+    client.delete(f"/api/accounts/{account['id']}")
+
+    client.get("/api/images", params={"url": "http://127.0.0.1/x.png"})
+    client.post("/api/batch", json={"requests": [{"path": "/api/airdrops"}, {"path": "/api/tokens"}]})
+    client.delete(f"/api/airdrops/{airdrop_id}")
+    client.get("/api/admin/diagnostics/query-budgets")
+
+
+def test_every_declared_budget_holds(client, monitor):
+    exercise_all_routes(client)
+    report = monitor.report()
+
+    assert report["violations"] == []
+    assert report["unbudgeted"] == []
+    # Budgets for routes that no longer exist (or are not exercised) would silently rot
+    assert {item["endpoint"] for item in report["endpoints"]} == set(DEFAULT_BUDGETS)
+
+
+def test_read_over_budget_fails_in_enforce_mode(client, monitor):
+    monitor.budgets = {**DEFAULT_BUDGETS, "public.get_airdrops": Budget(commands=0)}
+
+    response = client.get("/api/airdrops")
+    assert response.status_code == 500
+    assert response.json()["error"] == "query_budget_exceeded"
+
+
+def test_write_over_budget_is_flagged_not_failed(client, monitor):
+    monitor.budgets = {**DEFAULT_BUDGETS, "admin.create_airdrop": Budget(commands=1)}
+
+    response = client.post("/api/airdrops", json=airdrop_payload("Committed"))
+    assert response.status_code == 201
+    assert response.headers["x-query-budget"] == "exceeded"
+    assert [item["project"] for item in client.get("/api/airdrops").json()["items"]] == ["Committed"]
+    assert [item["endpoint"] for item in monitor.violations] == ["admin.create_airdrop"]
+
+
+def test_change_log_compaction_stays_off_the_write_budget(client, monitor, monkeypatch):
+    monkeypatch.setattr(changelog, "COMPACT_EVERY", 2)
+
+    created = client.post("/api/airdrops", json=airdrop_payload("Often")).json()
+    for hour in range(10, 15):
+        response = client.put(f"/api/airdrops/{created['id']}", json=airdrop_payload("Often", event_time=f"{hour}:00"))
+        assert response.status_code == 200
+        assert "x-query-budget" not in response.headers
+    assert list(monitor.violations) == []
+
+    # Seq 6 triggered a background compaction that keeps only the newest entry
+    for _ in range(50):
+        changes = client.get("/api/airdrops/changes").json()["changes"]
+        if len(changes) == 1:
+            break
+        time.sleep(0.01)
+    assert [change["id"] for change in changes] == [created["id"]]
+
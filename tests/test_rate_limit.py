@@ -0,0 +1,79 @@
+import pytest
+
+from rate_limit import Quota, RateLimiter, parse_route_quotas, rate_limiter
+
+
+def test_bucket_refills_at_rate_up_to_burst():
+    limiter = RateLimiter(default_quota=Quota(2, 3))
+    slot, _, quota = limiter.quota_for("GET", "/api/airdrops")
+    assert [limiter.take(slot, "a", quota, now=0.0)[0] for _ in range(4)] == [True, True, True, False]
+
+    allowed, _, wait = limiter.take(slot, "a", quota, now=0.0)
+    assert not allowed and wait == pytest.approx(0.5)
+    # Half a second buys one token back
+    assert limiter.take(slot, "a", quota, now=0.5)[0]
+    assert not limiter.take(slot, "a", quota, now=0.5)[0]
+    # A long idle period refills only up to the burst
+    assert [limiter.take(slot, "a", quota, now=100.0)[0] for _ in range(4)] == [True, True, True, False]
+
+
+def test_route_quotas_have_their_own_buckets():
+    limiter = RateLimiter(default_quota=Quota(1, 1), route_quotas=parse_route_quotas("POST /api/coins=1/2"))
+    coins = limiter.quota_for("POST", "/api/coins")
+    default = limiter.quota_for("GET", "/api/coins/BTC")
+    assert coins[1] == "POST /api/coins" and coins[2] == Quota(1, 2)
+    assert default[1] == "default"
+    assert limiter.take(coins[0], "a", coins[2], now=0.0)[0]
+    assert limiter.take(default[0], "a", default[2], now=0.0)[0]
+    assert not limiter.take(default[0], "a", default[2], now=0.0)[0]
+
+
+def test_idle_buckets_are_evicted():
+    limiter = RateLimiter(default_quota=Quota(1, 2))
+    assert limiter.idle_ttl == 2.0
+    limiter.take(-1, "a", limiter.default_quota, now=0.0)
+    limiter.take(-1, "b", limiter.default_quota, now=1.0)
+    limiter.take(-1, "c", limiter.default_quota, now=2.5)
+    assert [client for _, client in limiter.buckets] == ["b", "c"]
+
+
+def test_bucket_count_is_bounded_least_recently_used_first():
+    limiter = RateLimiter(default_quota=Quota(1, 100), max_buckets=2)
+    for client in ("a", "b"):
+        limiter.take(-1, client, limiter.default_quota, now=0.0)
+    limiter.take(-1, "a", limiter.default_quota, now=0.1)
+    limiter.take(-1, "c", limiter.default_quota, now=0.2)
+    assert [client for _, client in limiter.buckets] == ["a", "c"]
+
+
+def scope(forwarded=(), client="10.0.0.1", api_key=None):
+    headers = [(b"x-forwarded-for", value.encode()) for value in forwarded]
+    if api_key:
+        headers.append((b"x-api-key", api_key.encode()))
+    return {"headers": headers, "client": (client, 1234)}
+
+
+def test_client_key_uses_trusted_forwarded_hops():
+    assert RateLimiter().client_key(scope(["1.1.1.1"])) == "10.0.0.1"
+    one_hop = RateLimiter(forwarded_hops=1)
+    # A spoofed leading entry is ignored; the proxy appended the real address last
+    assert one_hop.client_key(scope(["6.6.6.6, 2.2.2.2"])) == "2.2.2.2"
+    assert one_hop.client_key(scope(["6.6.6.6", "2.2.2.2"])) == "2.2.2.2"
+    two_hops = RateLimiter(forwarded_hops=2)
+    assert two_hops.client_key(scope(["6.6.6.6, 2.2.2.2, 10.0.0.9"])) == "2.2.2.2"
+    # Fewer entries than trusted proxies: fall back to the peer address
+    assert two_hops.client_key(scope(["2.2.2.2"])) == "10.0.0.1"
+    assert RateLimiter(api_keys=("k",)).client_key(scope(api_key="k")) == "key:k"
+
+
+def test_rejections_carry_cors_headers(client, monkeypatch):
+    monkeypatch.setattr(rate_limiter, "default_quota", Quota(0.001, 1))
+    monkeypatch.setattr(rate_limiter, "idle_ttl", 1000.0)
+    rate_limiter.buckets.clear()
+    headers = {"Origin": "https://app.example"}
+    assert client.get("/api/tokens", headers=headers).status_code == 200
+    limited = client.get("/api/tokens", headers=headers)
+    assert limited.status_code == 429
+    assert limited.headers["access-control-allow-origin"] == "*"
+    assert "retry-after" in limited.headers["access-control-expose-headers"].lower()
+    rate_limiter.buckets.clear()
@@ -0,0 +1,87 @@
+import asyncio
+from datetime import datetime, timedelta
+
+from reminders import LogSink, ReminderScheduler, parse_lead_minutes
+
+NOW = datetime(2030, 1, 1, 12, 0)
+
+
+def airdrop(airdrop_id: str, starts_in: timedelta, project: str = "Alpha"):
+    return {"id": airdrop_id, "project": project, "alias": project.lower(), "time_iso": (NOW + starts_in).isoformat() + "Z"}
+
+
+def test_parse_lead_minutes():
+    assert parse_lead_minutes("10,60,10") == [60, 10]
+    assert parse_lead_minutes("") == []
+
+
+def test_due_reminders_pop_in_order():
+    scheduler = ReminderScheduler([60, 10])
+    assert scheduler.schedule(airdrop("a", timedelta(hours=2)), NOW) == 2
+    # The 60-minute reminder is already past, so only the 10-minute one is pending
+    assert scheduler.schedule(airdrop("b", timedelta(minutes=30), "Beta"), NOW) == 1
+    assert scheduler.schedule(airdrop("c", timedelta(minutes=-5)), NOW) == 0
+
+    assert [(item["airdrop_id"], item["lead_minutes"]) for item in scheduler.upcoming()] == [("b", 10), ("a", 60), ("a", 10)]
+    assert [item["airdrop_id"] for item in scheduler.pop_due(NOW + timedelta(minutes=20))] == ["b"]
+    assert scheduler.pop_due(NOW + timedelta(minutes=59)) == []
+    assert [item["lead_minutes"] for item in scheduler.pop_due(NOW + timedelta(hours=2))] == [60, 10]
+    # Fired events are forgotten
+    assert scheduler._events == {} and scheduler._pending == {} and scheduler._live == 0
+
+
+def test_rescheduled_and_cancelled_entries_go_stale():
+    scheduler = ReminderScheduler([10])
+    scheduler.schedule(airdrop("a", timedelta(hours=1)), NOW)
+    scheduler.schedule(airdrop("a", timedelta(hours=3)), NOW)
+    scheduler.schedule(airdrop("b", timedelta(hours=2)), NOW)
+    scheduler.cancel("b")
+    assert len(scheduler._heap) == 3
+    assert scheduler._live == 1
+
+    # The superseded and cancelled entries are skipped when popped
+    assert scheduler.pop_due(NOW + timedelta(hours=2, minutes=30)) == []
+    due = scheduler.pop_due(NOW + timedelta(hours=3))
+    assert [(item["airdrop_id"], item["due_at"]) for item in due] == [("a", NOW + timedelta(hours=2, minutes=50))]
+    assert scheduler._heap == []
+
+
+def test_heap_is_compacted_when_stale_entries_dominate():
+    scheduler = ReminderScheduler([10])
+    for i in range(100):
+        scheduler.schedule(airdrop(f"a{i}", timedelta(hours=1)), NOW)
+    for i in range(60):
+        scheduler.cancel(f"a{i}")
+    # The 51st cancel left 49 live of 100 entries, so the heap was rebuilt from
+    # the live ones; the later cancels leave a small heap alone
+    assert len(scheduler._heap) == 49
+    assert sum(scheduler._is_live(entry) for entry in scheduler._heap) == 40 == scheduler._live
+    assert len(scheduler.upcoming(limit=1000)) == 40
+
+
+def test_stop_drains_in_flight_deliveries():
+    class SlowSink(LogSink):
+        def __init__(self):
+            self.delivered = []
+            self.closed = False
+
+        async def send(self, reminder):
+            await asyncio.sleep(0.05)
+            assert not self.closed
+            self.delivered.append(reminder["airdrop_id"])
+
+        async def close(self):
+            self.closed = True
+
+    async def run():
+        sink = SlowSink()
+        scheduler = ReminderScheduler([0], sink=sink)
+        scheduler.start()
+        now = datetime.utcnow()
+        scheduler.schedule({"id": "a", "project": "Alpha", "time_iso": (now + timedelta(milliseconds=20)).isoformat()}, now)
+        while not scheduler._deliveries:
+            await asyncio.sleep(0.005)
+        await scheduler.stop()
+        return sink.delivered, len(scheduler._deliveries), sink.closed
+
+    assert asyncio.run(run()) == (["a"], 0, True)
@@ -0,0 +1,82 @@
+from datetime import datetime, timedelta
+
+from database import get_coin_collection
+import retention
+from retention import CoinCompactor, get_hour_collection, get_minute_collection
+
+NOW = datetime(2030, 1, 2, 12, 0)
+MINUTE = datetime(2029, 12, 31, 10, 0)
+
+
+def ticks(*rows):
+    return [{"coin_id": coin_id, "time": MINUTE + timedelta(seconds=seconds), "price": price} for coin_id, seconds, price in rows]
+
+
+def minute_bars(client):
+    async def read():
+        return await get_minute_collection().find({}).sort([("coin_id", 1), ("time", 1)]).to_list(length=None)
+    return client.portal.call(read)
+
+
+def test_compaction_runs_in_bounded_chunks(client, monkeypatch):
+    compactor = CoinCompactor(batch_size=2)
+    calls = []
+
+    async def run():
+        coins = get_coin_collection()
+        monkeypatch.setattr(retention, "get_coin_collection", lambda: coins)
+        await coins.insert_many(ticks(("BTC", 5, 100.0), ("BTC", 40, 105.0), ("BTC", 59, 101.0), ("BTC", 70, 99.0), ("ETH", 10, 10.0)))
+        # A recent tick stays raw
+        await coins.insert_one({"coin_id": "BTC", "time": NOW, "price": 120.0})
+        real_find = coins.find
+
+        def find(query, *args, **kwargs):
+            calls.append(query)
+            return real_find(query, *args, **kwargs)
+        coins.find = find
+        stats = await compactor.compact(NOW)
+        remaining = await get_coin_collection().count_documents({})
+        return stats, remaining
+
+    stats, remaining = client.portal.call(run)
+    assert stats["minute"]["deleted"] == 5 and remaining == 1
+    # Three chunks of at most two rows, then an empty read ends the pass
+    assert len(calls) == 4
+    bars = [(bar["coin_id"], bar["time"].minute, bar["open"], bar["high"], bar["low"], bar["close"], bar["count"]) for bar in minute_bars(client)]
+    assert bars == [("BTC", 0, 100.0, 105.0, 100.0, 101.0, 3), ("BTC", 1, 99.0, 99.0, 99.0, 99.0, 1), ("ETH", 0, 10.0, 10.0, 10.0, 10.0, 1)]
+
+
+def test_late_tick_merges_open_and_close_by_time(client):
+    compactor = CoinCompactor()
+
+    async def run():
+        await get_coin_collection().insert_many(ticks(("BTC", 20, 100.0), ("BTC", 40, 101.0)))
+        await compactor.compact(NOW)
+        # Late ticks before the bar's open and between its open and close
+        await get_coin_collection().insert_many(ticks(("BTC", 1, 90.0), ("BTC", 30, 150.0)))
+        await compactor.compact(NOW)
+
+    client.portal.call(run)
+    [bar] = minute_bars(client)
+    assert (bar["open"], bar["high"], bar["low"], bar["close"], bar["count"]) == (90.0, 150.0, 90.0, 101.0, 4)
+
+
+def test_rerun_after_interrupted_delete_does_not_double_count(client):
+    compactor = CoinCompactor()
+
+    async def run():
+        coins = get_coin_collection()
+        await coins.insert_many(ticks(("BTC", 5, 100.0), ("BTC", 50, 102.0)))
+        rows = await coins.find({}).sort("_id", 1).to_list(length=None)
+        # Bars written, then the process died before the source rows were deleted
+        await compactor._merge_chunk(get_minute_collection(), rows, "minute", False)
+        stats = await compactor.compact(NOW)
+        hours = await compactor.compact(NOW + timedelta(days=60))
+        hour_bars = await get_hour_collection().find({}).to_list(length=None)
+        return stats, hours, hour_bars
+
+    stats, hours, hour_bars = client.portal.call(run)
+    assert stats["minute"]["deleted"] == 2
+    assert hours["hour"] == {"bars": 1, "deleted": 1}
+    [bar] = hour_bars
+    assert (bar["open"], bar["close"], bar["count"]) == (100.0, 102.0, 2)
@@ -0,0 +1,113 @@
+"""Route smoke tests through the in-memory storage backend"""
+from conftest import airdrop_payload
+
+
+def test_airdrop_crud_and_feed(client):
+    created = client.post("/api/airdrops", json=airdrop_payload("Alpha"))
+    assert created.status_code == 201
+    airdrop_id = created.json()["id"]
+
+    # Same project (case-insensitive) upserts instead of creating a duplicate
+    again = client.post("/api/airdrops", json=airdrop_payload("ALPHA", event_time="11:00"))
+    assert again.json()["id"] == airdrop_id
+
+    feed = client.get("/api/airdrops")
+    assert feed.status_code == 200
+    items = feed.json()["items"]
+    assert [item["project"] for item in items] == ["ALPHA"]
+    assert items[0]["event_time"] == "11:00:00"
+
+    cached = client.get("/api/airdrops", headers={"If-None-Match": feed.headers["etag"]})
+    assert cached.status_code == 304
+
+    updated = client.put(f"/api/airdrops/{airdrop_id}", json=airdrop_payload("Alpha", event_date="2030-02-01"))
+    assert updated.json()["event_date"] == "2030-02-01"
+    assert client.get("/api/airdrops", headers={"If-None-Match": feed.headers["etag"]}).status_code == 200
+
+    assert client.delete(f"/api/airdrops/{airdrop_id}").status_code == 204
+    assert client.get("/api/airdrops").json()["items"] == []
+    assert client.delete(f"/api/airdrops/{airdrop_id}").status_code == 404
+
+
+def test_airdrop_fields_calendar_and_autocomplete(client):
+    client.post("/api/airdrops", json=airdrop_payload("Orbit Swap", event_date="2030-01-15"))
+    client.post("/api/airdrops", json=airdrop_payload("Nova", event_date="2030-01-20"))
+
+    items = client.get("/api/airdrops", params={"fields": "project"}).json()["items"]
+    assert all(set(item) <= {"id", "project", "time_iso"} for item in items)
+    assert client.get("/api/airdrops", params={"fields": "nope"}).status_code == 400
+
+    calendar = client.get("/api/airdrops/calendar", params={"tz": "UTC", "from": "2030-01-01", "to": "2030-01-31"}).json()
+    assert [day["date"] for day in calendar["days"]] == ["2030-01-15", "2030-01-20"]
+
+    suggestions = client.get("/api/airdrops/autocomplete", params={"q": "sw"}).json()
+    assert [item["project"] for item in suggestions] == ["Orbit Swap"]
+
+
+def test_airdrop_changes(client):
+    first = client.post("/api/airdrops", json=airdrop_payload("One")).json()
+    client.post("/api/airdrops", json=airdrop_payload("Two"))
+    client.delete(f"/api/airdrops/{first['id']}")
+
+    changes = client.get("/api/airdrops/changes", params={"since": 0}).json()
+    assert [(change["op"], change["id"]) for change in changes["changes"]][-1] == ("delete", first["id"])
+    latest = changes["latest_seq"]
+    assert client.get("/api/airdrops/changes", params={"since": latest}).json()["changes"] == []
+
+
+def test_coin_ticks_and_series(client):
+    for minute, price in enumerate((100.0, 101.5, 99.0)):
+        response = client.post("/api/coins", json={"coin_id": "BTC", "time": f"2030-01-01T00:0{minute}:00", "price": price})
+        assert response.status_code == 201
+
+    rows = client.get("/api/coins/BTC").json()
+    assert [row["price"] for row in rows] == [100.0, 101.5, 99.0]
+
+    columnar = client.get("/api/coins/BTC", params={"format": "columnar", "delta": True}).json()
+    assert columnar["times"][1:] == [60000, 60000]
+
+    binary = client.get("/api/coins/BTC", params={"format": "binary"})
+    assert binary.content[:4] == b"CPS1"
+
+
+def test_tokens_accounts_and_transactions(client):
+    token = client.post("/api/tokens", json={"name": "ABC", "apiUrl": "http://127.0.0.1:9/p", "staggerDelay": 0, "multiplier": 2}).json()
+    assert client.put(f"/api/tokens/{token['id']}", json={"multiplier": 3}).json()["multiplier"] == 3
+    assert [item["name"] for item in client.get("/api/tokens").json()] == ["ABC"]
+
+    account = client.post("/api/accounts", json={"name": "Main", "balance": 100, "alphaPoints": 5}).json()
+    transaction = client.post("/api/transactions", json={
+        "accountId": account["id"], "date": "2030-01-01", "alphaPoints": 7, "initialBalance": 100,
+        "finalBalance": 120, "tradeFee": 1, "pnl": 20, "alphaReward": 0, "totalClaim": 0,
+    })
+    assert transaction.status_code == 201
+    assert client.get("/api/accounts").json()[0]["balance"] == 120
+
+    export = client.get("/api/export/transactions", params={"format": "csv"})
+    assert export.status_code == 200
+    assert len(export.text.strip().splitlines()) == 2
+
+    assert client.delete(f"/api/transactions/{transaction.json()['id']}").status_code == 204
+    assert client.delete(f"/api/tokens/{token['id']}").status_code == 204
+
+
+def test_alpha_insight_search(client):
+    payload = {"title": "Restaking summer", "category": "defi", "token": "RST", "platform": "eth", "raised": "5M", "description": "liquid restaking", "date": "2030-01-01"}
+    insight = client.post("/api/alpha-insights", json=payload).json()
+
+    result = client.get("/api/alpha-insights/search", params={"q": "restaking"}).json()
+    assert [item["id"] for item in result["items"]] == [insight["id"]]
+
+    assert client.delete(f"/api/alpha-insights/{insight['id']}").status_code == 204
+    assert client.get("/api/alpha-insights/search", params={"q": "restaking"}).json()["items"] == []
+
+
+def test_batch(client):
+    client.post("/api/airdrops", json=airdrop_payload("Batched"))
+    response = client.post("/api/batch", json={"requests": [
+        {"id": "feed", "path": "/api/airdrops"},
+        {"id": "bad", "path": "/api/export/transactions"},
+    ]}).json()
+    results = {item["id"]: item for item in response["results"]}
+    assert results["feed"]["status"] == 200
+    assert results["bad"]["status"] == 400
@@ -0,0 +1,101 @@
+from search import InsightSearchIndex
+
+
+def insight(doc_id, category, platform, token="T", date="2030-01-01", title="Insight"):
+    return {"id": doc_id, "title": title, "category": category, "platform": platform, "token": token, "date": date}
+
+
+def test_browse_facets_track_add_replace_and_remove():
+    index = InsightSearchIndex()
+    index.add(insight("a", "defi", "eth"))
+    index.add(insight("b", "defi", "sol", date="2030-02-01"))
+    index.add(insight("c", "nft", "eth", token=None))
+
+    result = index.search()
+    assert result["total"] == 3
+    assert [item["id"] for item in result["items"]] == ["b", "c", "a"]
+    assert result["facets"] == {
+        "category": {"defi": 2, "nft": 1},
+        "platform": {"eth": 2, "sol": 1},
+        "token": {"T": 2},
+    }
+
+    # Replacing moves the counts; removing an absent id is a no-op
+    index.add(insight("a", "nft", "eth"))
+    index.remove("missing")
+    index.remove("b")
+    assert index.search()["facets"] == {"category": {"nft": 2}, "platform": {"eth": 2}, "token": {"T": 1}}
+    # The cached counts agree with the filtered path
+    filtered = index.search(filters={"category": "nft"})["facets"]
+    assert filtered["category"] == index.facet_counts["category"]
+
+    index.clear()
+    assert index.search()["facets"] == {"category": {}, "platform": {}, "token": {}}
+
+
+def test_delete_by_uppercase_id_drops_insight_from_search(client):
+    payload = {"title": "Restaking summer", "category": "defi", "token": "RST", "platform": "eth", "raised": "5M", "description": "liquid restaking", "date": "2030-01-01"}
+    created = client.post("/api/alpha-insights", json=payload).json()
+    assert client.get("/api/alpha-insights/search").json()["facets"]["category"] == {"defi": 1}
+
+    assert client.delete(f"/api/alpha-insights/{created['id'].upper()}").status_code == 204
+    result = client.get("/api/alpha-insights/search", params={"q": "restaking"}).json()
+    assert result["total"] == 0
+    assert client.get("/api/alpha-insights/search").json()["facets"]["category"] == {}
+
+
+def test_filtered_facets_count_only_matching_docs():
+    index = InsightSearchIndex()
+    index.add(insight("a", "defi", "eth", title="Restaking vault"))
+    index.add(insight("b", "defi", "sol", title="Restaking pool"))
+    index.add(insight("c", "nft", "eth", title="Restaking mint", token=None))
+    index.add(insight("d", "nft", "sol", title="Bridge"))
+
+    result = index.search("restaking", filters={"platform": "eth"})
+    assert sorted(item["id"] for item in result["items"]) == ["a", "c"]
+    assert result["facets"] == {
+        "category": {"defi": 1, "nft": 1},
+        # The platform facet ignores its own filter but keeps the text match
+        "platform": {"eth": 2, "sol": 1},
+        "token": {"T": 1},
+    }
+
+
+def test_concurrent_first_searches_share_one_rebuild(client, monkeypatch):
+    import asyncio
+    import routes.alpha_insight as alpha_insight
+    from search import insight_index
+
+    payload = {"title": "Restaking summer", "category": "defi", "token": "RST", "platform": "eth", "raised": "5M", "description": "liquid restaking", "date": "2030-01-01"}
+    for _ in range(3):
+        client.post("/api/alpha-insights", json=payload)
+    collection = alpha_insight.get_alpha_insight_collection()
+    scans = []
+
+    class SlowCollection:
+        def find(self, query):
+            scans.append(query)
+
+            async def rows():
+                async for doc in collection.find(query):
+                    # Yield between documents so overlapping rebuilds would interleave
+                    await asyncio.sleep(0)
+                    yield doc
+            return rows()
+
+    monkeypatch.setattr(alpha_insight, "get_alpha_insight_collection", lambda: SlowCollection())
+
+    async def race():
+        insight_index.clear()
+        return await asyncio.gather(*(
+            alpha_insight.search_alpha_insights(
+                q=None, category=None, platform=None, token=None,
+                page=1, limit=20, proxy_images=False, image_width=None,
+            )
+            for _ in range(4)
+        ))
+
+    results = client.portal.call(race)
+    assert len(scans) == 1
+    assert [result["total"] for result in results] == [3, 3, 3, 3]
+    assert all(result["facets"]["category"] == {"defi": 3} for result in results)
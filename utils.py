@@ -2,7 +2,7 @@ from datetime import datetime, date, time as dt_time
 import pytz
 import hashlib
 import json
-from typing import List, Dict, Any, Tuple, Optional
+from typing import List, Dict, Any, Tuple, Optional, Iterable
 from pytz.tzinfo import BaseTzInfo
 
 
@@ -53,6 +53,14 @@ def compute_time_fields(event_date: Any, event_time: Any, timezone: Optional[str
     )
 
 
+def utc_instant(time_iso: str) -> datetime:
+    """Naive UTC datetime for an ISO string, as stored in `event_at`"""
+    dt = datetime.fromisoformat(time_iso.replace('Z', '+00:00'))
+    if dt.tzinfo is None:
+        return dt
+    return dt.astimezone(pytz.utc).replace(tzinfo=None)
+
+
 def _coerce_datetime(time_iso: Optional[str], event_date: Any, event_time: Any, timezone: Optional[str]) -> Tuple[datetime, BaseTzInfo]:
     """Resolve the stored schedule fields to a timezone-aware datetime for filtering."""
     tz_name = timezone or "UTC"
@@ -78,6 +86,51 @@ def _coerce_datetime(time_iso: Optional[str], event_date: Any, event_time: Any,
     raise ValueError("Missing event schedule information")
 
 
+def parse_fields(fields: Optional[str], model: Any, extra: Iterable[str] = ()) -> Optional[List[str]]:
+    """Parse a comma separated `fields` parameter, validated against a response model"""
+    if fields is None:
+        return None
+    requested = []
+    for name in fields.split(","):
+        name = name.strip()
+        if name and name not in requested:
+            requested.append(name)
+    if not requested:
+        return None
+
+    allowed = set(model.model_fields) | set(extra)
+    unknown = [name for name in requested if name not in allowed]
+    if unknown:
+        raise ValueError(f"Unknown fields: {', '.join(unknown)}")
+
+    if "id" not in requested:
+        requested.insert(0, "id")
+    return requested
+
+
+def build_projection(selected: Optional[List[str]], required: Iterable[str] = ()) -> Optional[Dict[str, int]]:
+    """Translate selected response fields into a Mongo projection (None means whole documents)"""
+    if selected is None:
+        return None
+    projection = {"_id": 1}
+    for name in list(selected) + list(required):
+        if name != "id":
+            projection[name] = 1
+    return projection
+
+
+def select_fields(doc: Dict, selected: Optional[List[str]]) -> Dict:
+    """Keep only the selected fields of a serialized document"""
+    if selected is None:
+        return doc
+    return {name: doc[name] for name in selected if name in doc}
+
+
+def rewrite_image_urls(items: List[Dict], field: str, rewrite) -> List[Dict]:
+    """Copy items with their image URL field passed through `rewrite` (shared results stay untouched)"""
+    return [{**item, field: rewrite(item[field])} if item.get(field) else item for item in items]
+
+
 def generate_etag(data: Any) -> str:
     """Generate ETag from data"""
     json_str = json.dumps(data, sort_keys=True, default=str)
@@ -159,6 +212,8 @@ def filter_by_range(items: List[Dict], range_type: str) -> List[Dict]:
 def serialize_airdrop(doc: Dict) -> Dict:
     """Convert MongoDB document to API response format"""
     doc["id"] = str(doc.pop("_id"))
+    # Internal UTC instant used by the calendar aggregation
+    doc.pop("event_at", None)
     if "event_date" in doc and doc["event_date"]:
         value = doc["event_date"]
         if isinstance(value, (datetime, date)):
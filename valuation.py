@@ -0,0 +1,119 @@
+from typing import Dict, Iterable, List, Optional
+
+from bson import ObjectId
+
+from database import get_collection, get_coin_collection
+from retention import get_hour_collection, get_minute_collection
+
+
+def holdings_pipeline(account_ids: Optional[List[str]] = None) -> List[Dict]:
+    """Aggregate per-account, per-token airdrop holdings from transactions"""
+    pipeline: List[Dict] = []
+    if account_ids is not None:
+        pipeline.append({"$match": {"accountId": {"$in": account_ids}}})
+    pipeline.extend([
+        # Prefer the airdrops list; fall back to the legacy single-token fields
+        {"$project": {
+            "accountId": 1,
+            "items": {"$cond": [
+                {"$gt": [{"$size": {"$ifNull": ["$airdrops", []]}}, 0]},
+                "$airdrops",
+                {"$cond": [
+                    {"$and": [{"$ifNull": ["$airdropToken", False]}, {"$ifNull": ["$airdropAmount", False]}]},
+                    [{
+                        "token": "$airdropToken",
+                        "amount": "$airdropAmount",
+                        "price": {"$ifNull": ["$airdropTokenPrice", 0]},
+                        "value": {"$ifNull": ["$airdropValue", None]},
+                    }],
+                    [],
+                ]},
+            ]},
+        }},
+        {"$unwind": "$items"},
+        {"$group": {
+            "_id": {"accountId": "$accountId", "token": "$items.token"},
+            "amount": {"$sum": "$items.amount"},
+            "entry_value": {"$sum": {"$ifNull": [
+                "$items.value",
+                {"$multiply": ["$items.amount", {"$ifNull": ["$items.price", 0]}]},
+            ]}},
+        }},
+        {"$sort": {"_id.accountId": 1, "_id.token": 1}},
+    ])
+    return pipeline
+
+
+async def latest_prices(tokens: Iterable[str]) -> Dict[str, Dict]:
+    """
+    Most recent price per token, one aggregation per tier: raw ticks first,
+    then the newest 1-minute and hourly bar close for coins whose ticks
+    have all been compacted away
+    """
+    tokens = sorted(set(tokens))
+    prices: Dict[str, Dict] = {}
+    for collection, field in ((get_coin_collection(), "$price"), (get_minute_collection(), "$close"), (get_hour_collection(), "$close")):
+        missing = [token for token in tokens if token not in prices]
+        if not missing:
+            break
+        cursor = collection.aggregate([
+            {"$match": {"coin_id": {"$in": missing}}},
+            {"$sort": {"coin_id": 1, "time": -1}},
+            {"$group": {"_id": "$coin_id", "price": {"$first": field}, "time": {"$first": "$time"}}},
+        ])
+        for doc in await cursor.to_list(length=None):
+            prices[doc["_id"]] = {"price": doc["price"], "time": doc["time"]}
+    return prices
+
+
+async def value_accounts(account_ids: Optional[List[str]] = None) -> List[Dict]:
+    """Price every account's holdings against the latest coin ticks"""
+    accounts_query = {}
+    if account_ids is not None:
+        # Transactions store the canonical (lowercase) id, so match on that
+        account_ids = [str(ObjectId(account_id)) for account_id in account_ids]
+        accounts_query = {"_id": {"$in": [ObjectId(account_id) for account_id in account_ids]}}
+    accounts = await get_collection("accounts").find(accounts_query, {"name": 1}).to_list(length=None)
+
+    groups = await get_collection("transactions").aggregate(holdings_pipeline(account_ids)).to_list(length=None)
+    prices = await latest_prices(group["_id"]["token"] for group in groups if group["_id"].get("token"))
+
+    valuations: Dict[str, Dict] = {
+        str(account["_id"]): {
+            "accountId": str(account["_id"]),
+            "name": account.get("name"),
+            "holdings": [],
+            "total_entry_value": 0.0,
+            "total_market_value": 0.0,
+            "unpriced_tokens": [],
+        }
+        for account in accounts
+    }
+
+    for group in groups:
+        account_id = group["_id"]["accountId"]
+        token = group["_id"].get("token")
+        valuation = valuations.get(account_id)
+        if valuation is None or not token:
+            continue
+
+        latest = prices.get(token)
+        amount = group["amount"] or 0.0
+        entry_value = group["entry_value"] or 0.0
+        market_value = amount * latest["price"] if latest else None
+        valuation["holdings"].append({
+            "token": token,
+            "amount": amount,
+            "entry_value": entry_value,
+            "latest_price": latest["price"] if latest else None,
+            "price_time": latest["time"] if latest else None,
+            "market_value": market_value,
+            "pnl": market_value - entry_value if market_value is not None else None,
+        })
+        valuation["total_entry_value"] += entry_value
+        if market_value is None:
+            valuation["unpriced_tokens"].append(token)
+        else:
+            valuation["total_market_value"] += market_value
+
+    return list(valuations.values())
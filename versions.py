@@ -0,0 +1,62 @@
+import hashlib
+import os
+import time
+from typing import Dict, Iterable, Optional
+
+from fastapi import Request, Response
+
+
+class CollectionVersions:
+    """
+    In-process version counters, bumped by every write path of a collection.
+    The process epoch is part of every ETag, so counters restarting at zero
+    after a deploy never collide with ETags handed out before it.
+    """
+
+    def __init__(self):
+        self.epoch = f"{int(time.time()):x}{os.getpid():x}"
+        self._versions: Dict[str, int] = {}
+
+    def bump(self, *names: str) -> None:
+        for name in names:
+            self._versions[name] = self._versions.get(name, 0) + 1
+
+    def get(self, name: str) -> int:
+        return self._versions.get(name, 0)
+
+    def etag(self, names: Iterable[str], request: Optional[Request] = None, *parts: object) -> str:
+        """Weak ETag derived from collection versions, the normalized query and extra parts"""
+        key = [self.epoch]
+        key.extend(f"{name}:{self.get(name)}" for name in names)
+        if request is not None:
+            key.append(request.url.path)
+            key.extend(f"{k}={v}" for k, v in sorted(request.query_params.multi_items()))
+        key.extend(str(part) for part in parts)
+        digest = hashlib.md5("|".join(key).encode()).hexdigest()
+        return f'W/"{digest}"'
+
+
+collection_versions = CollectionVersions()
+
+
+def etag_matches(if_none_match: Optional[str], etag: str) -> bool:
+    """Weak comparison of an If-None-Match header against an ETag"""
+    if not if_none_match:
+        return False
+    if if_none_match.strip() == "*":
+        return True
+    opaque = etag[2:] if etag.startswith("W/") else etag
+    for candidate in if_none_match.split(","):
+        candidate = candidate.strip()
+        if candidate.startswith("W/"):
+            candidate = candidate[2:]
+        if candidate == opaque:
+            return True
+    return False
+
+
+def not_modified(request: Request, etag: str, cache_control: str) -> Optional[Response]:
+    """Return a 304 response when the request's If-None-Match matches the ETag"""
+    if etag_matches(request.headers.get("if-none-match"), etag):
+        return Response(status_code=304, headers={"ETag": etag, "Cache-Control": cache_control})
+    return None